@@ -6,6 +6,7 @@ from services.image_service import ImageService
 from services.favorite_service import FavoriteService
 from services.rating_service import RatingService
 from services.album_service import AlbumService
+from services.scan_service import ScanService
 
 class Api:
     def __init__(self):
@@ -14,6 +15,7 @@ class Api:
         self.favorite_service = FavoriteService()
         self.rating_service = RatingService()
         self.album_service = AlbumService()
+        self.scan_service = ScanService()
     
     def get_directories(self) -> Dict[str, Any]:
         """获取所有已保存的目录"""
@@ -27,16 +29,17 @@ class Api:
         """移除目录"""
         return self.directory_service.remove_directory(directory_path)
     
-    def get_all_images(self, limit: int = None, offset: int = 0) -> Dict[str, Any]:
-        """获取所有图片 - 支持分页"""
-        return self.image_service.get_all_images(limit, offset)
+    def get_all_images(self, limit: int = None, offset: int = 0, cursor: str = None) -> Dict[str, Any]:
+        """获取所有图片 - 支持分页，cursor为上一页返回的next_cursor"""
+        return self.image_service.get_all_images(limit, offset, cursor)
 
-    def get_images_in_directory(self, directory_path: str, limit: int = None, offset: int = 0) -> Dict[str, Any]:
-        """获取指定目录中的图片 - 支持分页"""
+    def get_images_in_directory(self, directory_path: str, limit: int = None, offset: int = 0,
+                                cursor: str = None) -> Dict[str, Any]:
+        """获取指定目录中的图片 - 支持分页，cursor为上一页返回的next_cursor"""
         try:
             limit = int(limit)
             offset = int(offset)
-            return self.image_service.get_images_in_directory(directory_path, limit, offset)
+            return self.image_service.get_images_in_directory(directory_path, limit, offset, cursor)
         except Exception as e:
             return {"error": str(e), "images": [], "total": 0}
     
@@ -75,14 +78,25 @@ class Api:
         """获取各类照片计数"""
         return self.image_service.get_photo_counts()
     
+    def get_thumbnail_cache_stats(self) -> Dict[str, Any]:
+        """获取缩略图缓存命中、未命中和淘汰计数"""
+        return self.image_service.get_thumbnail_cache_stats()
+    
     def trigger_background_scan(self) -> Dict[str, Any]:
-        """手动触发后台扫描"""
-        try:
-            from background_scanner import background_scanner
-            total_processed = background_scanner.force_full_scan()
-            return {"success": True, "processed": total_processed}
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+        """手动触发后台全量扫描，立即返回任务ID，通过get_scan_job_progress查询进度"""
+        return self.scan_service.start_full_scan()
+    
+    def get_scan_job_progress(self, job_id: str = None) -> Dict[str, Any]:
+        """获取全量扫描任务进度"""
+        return self.scan_service.get_scan_job_progress(job_id)
+    
+    def cancel_scan_job(self, job_id: str) -> Dict[str, Any]:
+        """取消全量扫描任务"""
+        return self.scan_service.cancel_scan_job(job_id)
+    
+    def resume_scan_job(self, job_id: str) -> Dict[str, Any]:
+        """从检查点继续全量扫描任务"""
+        return self.scan_service.resume_scan_job(job_id)
 
     # 相册相关接口
     def create_album(self, name: str, description: str = "", cover_image_id: Optional[int] = None) -> Dict[str, Any]:
@@ -160,14 +174,14 @@ class Api:
             return {"success": False, "error": f"参数格式错误: {str(e)}"}
 
     def get_album_images(self, album_id: int, limit: int = None, offset: int = 0,
-                        sort_by: str = "added_at", sort_order: str = "asc") -> Dict[str, Any]:
-        """获取相册中的图片"""
+                        sort_by: str = "added_at", sort_order: str = "asc", cursor: str = None) -> Dict[str, Any]:
+        """获取相册中的图片，cursor为上一页返回的next_cursor"""
         try:
             album_id = int(album_id)
             limit = int(limit)
             offset = int(offset)
             
-            return self.album_service.get_album_images(album_id, limit, offset, sort_by, sort_order)
+            return self.album_service.get_album_images(album_id, limit, offset, sort_by, sort_order, cursor or None)
         except ValueError:
             return {"success": False, "error": "参数必须是数字"}
         except Exception as e:
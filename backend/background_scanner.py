@@ -1,15 +1,19 @@
+import bisect
 import os
 import threading
 import time
 import logging
-from pathlib import Path
-from typing import List, Dict
-import hashlib
-
-from PIL import Image
+import uuid
+from collections import deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Dict, Optional, Tuple
 
 from container import dependencies
-from image_utils import ImageProcessor
+from db.scan_job_manager import JOB_CANCELLED, JOB_COMPLETED, JOB_FAILED, JOB_RUNNING
+from fs_watcher import INOTIFY_AVAILABLE, InotifyWatcher
+from image_utils import ImageProcessor, analyze_image_file
+from scan_queue import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, ScanQueue
 from exceptions import DatabaseException, ImageProcessingException, format_error_response
 
 # 配置日志
@@ -19,27 +23,241 @@ logger = logging.getLogger(__name__)
 class BackgroundScanner:
     """智能后台图片扫描器 - 支持增量扫描和文件系统监控"""
     
-    def __init__(self):
+    def __init__(self, worker_count: Optional[int] = None, parallel_ingest: bool = True,
+                 watch_mode: bool = True, embedded_preview: bool = True):
+        """初始化扫描器
+        
+        Args:
+            worker_count: 并行入库的进程数，为None时使用CPU核心数
+            parallel_ingest: 是否启用进程池并行入库
+            watch_mode: 是否启用inotify实时监控，不可用时自动回退到轮询
+            embedded_preview: 入库时优先用EXIF内嵌预览图生成小尺寸缩略图，跳过主图解码，
+                              更大的尺寸在首次请求时按需生成
+        """
         self.db_manager = dependencies.get_db_manager()
         self.supported_formats = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'}
         self.scan_thread = None
         self.is_running = False
-        self.file_checksums = {}  # 缓存文件校验和
         self.last_scan_times = {}  # 记录每个目录的最后扫描时间
+        self.worker_count = max(1, worker_count or os.cpu_count() or 1)
+        self.parallel_ingest = parallel_ingest
+        self.last_ingest_stats = {}  # 最近一次入库的吞吐统计
+        self.flush_batch_size = 500  # 入库线程跨队列批次累计N条结果批量写入一次
+        self.flush_interval = 2.0  # 距累积开始超过T秒或队列已取空时也会写入
+        # 目录mtime剪枝发现不了原地改写的文件（父目录mtime不变），距上次不剪枝的完整遍历超过该秒数时再做一次。
+        # 轮询模式下等待时间不超过到期时间，原地改写最迟在full_walk_interval秒（加一次扫描耗时）后被发现；
+        # 实时监控生效时原地改写由监控捕获，完整遍历随对账进行，最迟为full_walk_interval + reconcile_interval秒
+        self.full_walk_interval = 600
+        self._last_full_walk = None  # 上次完整遍历的time.monotonic()，None表示尚未执行
+        self._pending_directory_states = {}  # 本轮遍历得到、待入库后持久化的目录状态
+        self.parallel_threshold = 16  # 文件数达到该值才启动进程池
+        self.watch_mode = watch_mode
+        self.watcher = None
+        self.reconcile_interval = 1800  # 实时监控生效时，轮询仅作为对账，间隔拉长到30分钟
+        self._ingest_lock = threading.Lock()  # 保证轮询线程和监控线程中只有一个写入者
+        self._wake_event = threading.Event()
+        self._full_walk_requested = False
+        self.last_reconcile_stats = {}  # 最近一次清理已删除文件的统计
+        self.scan_queue = ScanQueue()  # 待入库文件的优先级队列
+        self.ingest_thread = None
+        self._ingest_running = False
+        self._executor = None  # 入库线程复用的进程池
+        self._boost_requests = deque()  # 待处理的目录优先请求 (directory_path, recursive)
+        self._last_boost_times = {}
+        self.boost_cooldown = 10.0  # 同一目录在该时间内重复请求优先时忽略
+        self.checkpoint_every = 256  # 全量扫描每处理N个文件保存一次检查点
+        self._job_lock = threading.Lock()
+        self._job_thread = None
+        self._active_job_id = None
+        self._job_cancel_event = threading.Event()
+        self.embedded_preview = embedded_preview
+    
+    def set_worker_count(self, worker_count: int):
+        """设置并行入库的进程数"""
+        self.worker_count = max(1, int(worker_count))
+        # 进程池在下一批文件入库时按新的进程数重建
+        with self._ingest_lock:
+            self._shutdown_executor()
+    
+    @property
+    def ingest_batch_size(self) -> int:
+        """入库线程每次从队列取出的文件数，决定高优先级文件最多等待多久"""
+        return max(self.parallel_threshold, self.worker_count * 8)
         
     def start_scanning(self):
         """启动智能后台扫描线程"""
         if self.scan_thread is None or not self.scan_thread.is_alive():
             self.is_running = True
+            self._ensure_ingest_thread()
+            self._start_watcher()
             self.scan_thread = threading.Thread(target=self._scan_worker, daemon=True)
             self.scan_thread.start()
             logger.info("智能后台扫描线程已启动")
+            self._resume_interrupted_jobs()
     
     def stop_scanning(self):
         """停止后台扫描"""
         self.is_running = False
+        self._wake_event.set()
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self._ingest_running = False
+        self.scan_queue.wake()
         logger.info("后台扫描线程已停止")
     
+    def _ensure_ingest_thread(self):
+        """确保入库线程在运行，所有入库都经由它从优先级队列中取文件"""
+        if self.ingest_thread is None or not self.ingest_thread.is_alive():
+            self._ingest_running = True
+            self.ingest_thread = threading.Thread(target=self._ingest_worker, daemon=True)
+            self.ingest_thread.start()
+    
+    def _ingest_worker(self):
+        """入库工作线程：先处理目录优先请求，再按优先级分批分析入库
+        
+        队列每次只取ingest_batch_size个文件以便高优先级文件及时插队，分析结果则跨批次累积：
+        累计flush_batch_size条、距上次写入超过flush_interval秒或队列已取空时，在一个事务内批量写入。
+        """
+        pending = []  # 已分析、待写入的记录
+        worker_stats: Dict[int, Dict[str, float]] = {}
+        window_start = time.time()
+        try:
+            while self._ingest_running:
+                self._process_boost_requests()
+                
+                batch = self.scan_queue.pop_batch(self.ingest_batch_size, timeout=1.0)
+                if batch:
+                    if not pending:
+                        window_start = time.time()
+                    pending.extend(self._analyze_batch(batch, worker_stats))
+                
+                # 队列取空时立即写入，等待中的提交方（增量扫描、全量扫描检查点）不必再等flush_interval
+                if pending and (len(pending) >= self.flush_batch_size
+                                or time.time() - window_start >= self.flush_interval
+                                or len(self.scan_queue) == 0):
+                    self._flush_pending(pending, worker_stats, window_start)
+                    pending, worker_stats = [], {}
+        finally:
+            self._flush_pending(pending, worker_stats, window_start)
+            with self._ingest_lock:
+                self._shutdown_executor()
+    
+    def enqueue_files(self, file_paths: List[str], priority: int = PRIORITY_NORMAL):
+        """将文件提交到入库队列，返回可等待的ScanTicket"""
+        self._ensure_ingest_thread()
+        return self.scan_queue.push_many(file_paths, priority)
+    
+    def _wait_ticket(self, ticket):
+        """等待提交的文件全部入库，入库线程停止时不再等待"""
+        while not ticket.wait(1.0):
+            if not self._ingest_running:
+                break
+    
+    def _refresh_statistics(self):
+        """图库规模变化后刷新查询规划器的统计信息，失败不影响扫描结果"""
+        try:
+            self.db_manager.refresh_statistics()
+        except DatabaseException as e:
+            logger.warning(f"刷新数据库统计信息失败: {e}")
+    
+    def boost_directory(self, directory_path: str, recursive: bool = False) -> bool:
+        """请求优先入库某个目录（用户正在浏览或刚添加的目录）
+        
+        请求在入库线程中异步处理：列出目录中有变化的文件以最高优先级入队，
+        并提升该目录下已在队列中的文件。
+        
+        Args:
+            directory_path: 目录路径
+            recursive: 是否包含子目录
+        
+        Returns:
+            是否接受了请求（冷却时间内的重复请求会被忽略）
+        """
+        if not directory_path:
+            return False
+        
+        key = (directory_path, recursive)
+        now = time.time()
+        if now - self._last_boost_times.get(key, 0) < self.boost_cooldown:
+            return False
+        self._last_boost_times[key] = now
+        
+        self._boost_requests.append(key)
+        self._ensure_ingest_thread()
+        self.scan_queue.wake()
+        return True
+    
+    def _process_boost_requests(self):
+        """处理目录优先请求"""
+        while self._boost_requests:
+            directory_path, recursive = self._boost_requests.popleft()
+            try:
+                if not os.path.isdir(directory_path):
+                    continue
+                
+                boosted = self.scan_queue.boost_directory(directory_path, recursive)
+                
+                if recursive:
+                    # 新添加的根目录同时纳入实时监控
+                    self._sync_watch_roots()
+                    files = self._get_directory_files(directory_path)
+                else:
+                    files = self._list_directory_files(directory_path)
+                
+                path_index = self.db_manager.get_path_index(directory_path, recursive)
+                changed = [file_path for file_path in files if self._is_file_changed(file_path, path_index)]
+                if changed:
+                    self.scan_queue.push_many(changed, PRIORITY_HIGH)
+                
+                if changed or boosted:
+                    logger.info(f"优先入库目录 {directory_path}: 新增 {len(changed)} 个文件，提升 {boosted} 个排队文件")
+            except DatabaseException as e:
+                logger.error(f"数据库错误 - 优先入库目录失败: {directory_path} - {e}")
+            except Exception as e:
+                logger.error(f"优先入库目录失败: {directory_path} - {e}")
+    
+    def _start_watcher(self):
+        """启动inotify实时监控，不可用时保持纯轮询模式"""
+        if not self.watch_mode or not INOTIFY_AVAILABLE or self.watcher is not None:
+            return
+        try:
+            self.watcher = InotifyWatcher(
+                on_changes=self._handle_fs_events,
+                extensions=self.supported_formats,
+                on_overflow=self.request_full_walk
+            )
+            self.watcher.start()
+            self._sync_watch_roots()
+            logger.info("inotify实时监控已启动，轮询降级为对账模式")
+        except OSError as e:
+            logger.warning(f"inotify实时监控启动失败，使用轮询模式: {e}")
+            self.watcher = None
+    
+    def _sync_watch_roots(self):
+        """让监控的根目录与已注册目录保持一致"""
+        if self.watcher is None:
+            return
+        roots = [directory['path'] for directory in self.db_manager.get_directories() if 'path' in directory]
+        self.watcher.set_roots(roots)
+    
+    def request_full_walk(self):
+        """请求尽快执行一次不剪枝的完整遍历（用于监控事件丢失后的对账）"""
+        self._full_walk_requested = True
+        self._wake_event.set()
+    
+    def _handle_fs_events(self, changed_paths, deleted_paths):
+        """处理监控线程合并后的文件变化，只把受影响的文件送入入库流程"""
+        file_paths = sorted(path for path in changed_paths if os.path.isfile(path))
+        if file_paths:
+            logger.info(f"实时监控发现 {len(file_paths)} 个变化的文件")
+            self.enqueue_files(file_paths, PRIORITY_NORMAL)
+        # 删除事件可能与随后的重建合并，只清理确实已不存在的路径
+        vanished = [path for path in deleted_paths if not os.path.exists(path)]
+        if vanished:
+            image_ids = self.db_manager.find_image_ids_by_paths(vanished)
+            self._purge_images(image_ids)
+    
     def _scan_worker(self):
         """智能扫描工作线程"""
         scan_count = 0
@@ -47,14 +265,23 @@ class BackgroundScanner:
             try:
                 start_time = time.time()
                 
-                # 智能扫描：只处理有变化的文件
-                changed_files = self._get_changed_files()
+                self._sync_watch_roots()
+                
+                # 智能扫描：只处理有变化的文件，按时间定期执行一次完整遍历以发现原地修改的文件
+                full_walk = self._full_walk_due() or self._full_walk_requested
+                self._full_walk_requested = False
+                if full_walk:
+                    self._last_full_walk = time.monotonic()
+                changed_files = self._get_changed_files(full_walk=full_walk)
                 if changed_files:
                     logger.info(f"发现 {len(changed_files)} 个变化的文件")
                     self._process_changed_files(changed_files)
                 else:
                     logger.debug("未发现文件变化")
                 
+                # 文件入库后再记录目录mtime，避免中途失败导致目录被错误跳过
+                self._commit_directory_states()
+                
                 scan_duration = time.time() - start_time
                 scan_count += 1
                 
@@ -62,60 +289,232 @@ class BackgroundScanner:
                     logger.info(f"第{scan_count}次增量扫描完成，处理了 {len(changed_files)} 个文件，耗时{scan_duration:.2f}秒")
                 
                 # 动态调整扫描间隔：有变化时快速响应，无变化时降低频率
-                if changed_files:
-                    time.sleep(30)  # 有变化时30秒后再次检查
+                if self.watcher is not None:
+                    self._wait(self.reconcile_interval)  # 实时监控负责新变化，轮询只做对账
+                elif changed_files:
+                    self._wait(min(30, self._seconds_until_full_walk()))  # 有变化时30秒后再次检查
                 else:
-                    time.sleep(300)  # 无变化时5分钟后检查
+                    self._wait(min(300, self._seconds_until_full_walk()))  # 无变化时5分钟后检查，完整遍历到期时提前
                     
             except DatabaseException as e:
                 logger.error(f"数据库错误: {e}")
-                time.sleep(300)
+                self._wait(300)
             except ImageProcessingException as e:
                 logger.error(f"图片处理错误: {e}")
-                time.sleep(60)
+                self._wait(60)
             except Exception as e:
                 logger.error(f"后台扫描出错: {e}")
-                time.sleep(300)
+                self._wait(300)
+    
+    def _seconds_until_full_walk(self) -> float:
+        """距下次完整遍历到期的秒数"""
+        if self._last_full_walk is None:
+            return 0.0
+        return max(0.0, self._last_full_walk + self.full_walk_interval - time.monotonic())
+    
+    def _full_walk_due(self) -> bool:
+        return self._seconds_until_full_walk() <= 0
     
-    def _get_changed_files(self) -> List[Dict[str, str]]:
-        """获取有变化的文件列表"""
+    def _wait(self, seconds: float):
+        """等待下一轮扫描，可被停止或对账请求提前唤醒"""
+        self._wake_event.wait(seconds)
+        self._wake_event.clear()
+    
+    def _get_changed_files(self, full_walk: bool = False) -> List[Dict[str, str]]:
+        """获取有变化的文件列表
+        
+        Args:
+            full_walk: 为True时列出所有目录的文件，否则跳过mtime未变化的目录
+        """
         changed_files = []
         directories = self.db_manager.get_directories()
         
+        # 一次查询加载路径索引，变化检测不再逐文件访问数据库
+        path_index = self.db_manager.get_path_index()
+        # 内容未变、仅stat信息变化的文件，批量刷新数据库中的stat信息
+        touched_files = []
+        # 磁盘上已不存在的图片ID，按目录比对后统一批量清理
+        vanished_ids = []
+        images_by_dir = None
+        
         for directory in directories:
             directory_path = directory['path']
             if not os.path.exists(directory_path):
                 continue
                 
-            # 获取该目录下的所有图片文件
-            current_files = self._get_directory_files(directory_path)
+            # 获取该目录下mtime有变化的子目录中的图片文件
+            known_states = self.db_manager.get_directory_states(directory_path)
+            current_files, states, listed_dirs = self._walk_directory(directory_path, known_states, full=full_walk)
+            removed_dirs = [path for path in known_states if path not in states]
+            self._pending_directory_states[directory_path] = (states, removed_dirs)
+            self.last_scan_times[directory_path] = time.time()
+            
+            # 对列出的目录比对磁盘与数据库，找出已删除的文件
+            if listed_dirs or removed_dirs:
+                if images_by_dir is None:
+                    images_by_dir = self._group_by_directory(path_index)
+                vanished_ids.extend(self._find_vanished_images(
+                    directory_path, current_files, listed_dirs, removed_dirs, full_walk, images_by_dir
+                ))
             
             # 检查新增或修改的文件
             for file_path in current_files:
-                if self._is_file_changed(file_path):
+                if self._is_file_changed(file_path, path_index, touched_files):
                     changed_files.append({
                         'path': file_path,
                         'directory': directory_path
                     })
         
+        if touched_files:
+            self.db_manager.update_file_stats(touched_files)
+        
+        self._purge_images(vanished_ids)
+        
         return changed_files
     
+    @staticmethod
+    def _group_by_directory(path_index: Dict[str, Tuple]) -> Dict[str, List[Tuple[str, int]]]:
+        """将路径索引按所在目录分组 directory -> [(file_path, image_id)]"""
+        images_by_dir = {}
+        for file_path, indexed in path_index.items():
+            images_by_dir.setdefault(os.path.dirname(file_path), []).append((file_path, indexed[0]))
+        return images_by_dir
+    
+    def _find_vanished_images(self, root_path: str, current_files: List[str], listed_dirs: List[str],
+                              removed_dirs: List[str], full_walk: bool,
+                              images_by_dir: Dict[str, List[Tuple[str, int]]]) -> List[int]:
+        """按目录比对磁盘文件集合与数据库记录，返回已不存在的图片ID
+        
+        只比对本轮实际列出的目录；未列出的目录只有在确认已不存在时才整体清理，
+        避免因权限错误或临时无法访问而误删记录。
+        """
+        on_disk = set(current_files)
+        vanished_ids = []
+        
+        for dir_path in listed_dirs:
+            vanished_ids.extend(
+                image_id for file_path, image_id in images_by_dir.get(dir_path, ())
+                if file_path not in on_disk
+            )
+        
+        candidates = set(removed_dirs)
+        if full_walk:
+            # 完整遍历时，根目录下未被访问到的目录均视为候选
+            prefix = root_path.rstrip(os.sep) + os.sep
+            candidates.update(dir_path for dir_path in images_by_dir if dir_path.startswith(prefix))
+        candidates.difference_update(listed_dirs)
+        
+        for dir_path in candidates:
+            if dir_path in images_by_dir and not os.path.isdir(dir_path):
+                vanished_ids.extend(image_id for _, image_id in images_by_dir[dir_path])
+        
+        return vanished_ids
+    
+    def _purge_images(self, image_ids: List[int]) -> int:
+        """批量清理已删除文件的数据库记录和缩略图"""
+        if not image_ids:
+            return 0
+        try:
+            removed = self.db_manager.delete_images_by_ids(image_ids)
+        except DatabaseException as e:
+            logger.error(f"数据库错误 - 清理已删除文件失败: {e}")
+            return 0
+        
+        self.last_reconcile_stats = {'removed': removed, 'finished_at': time.time()}
+        logger.info(f"清理了 {removed} 个已从磁盘删除的图片记录")
+        return removed
+    
     def _get_directory_files(self, directory_path: str) -> List[str]:
         """获取目录下的所有图片文件"""
+        files, _, _ = self._walk_directory(directory_path, {}, full=True)
+        return files
+    
+    def _list_directory_files(self, directory_path: str) -> List[str]:
+        """获取目录下的图片文件（不包括子目录）"""
         files = []
         try:
-            for root, dirs, filenames in os.walk(directory_path):
-                for filename in filenames:
-                    if Path(filename).suffix.lower() in self.supported_formats:
-                        files.append(os.path.join(root, filename))
-        except DatabaseException as e:
-            logger.error(f"数据库错误 - 获取目录文件列表失败: {directory_path} - {e}")
-        except Exception as e:
+            with os.scandir(directory_path) as entries:
+                for entry in entries:
+                    if os.path.splitext(entry.name)[1].lower() in self.supported_formats and entry.is_file():
+                        files.append(entry.path)
+        except OSError as e:
             logger.error(f"获取目录文件列表失败: {directory_path} - {e}")
         return files
     
-    def _is_file_changed(self, file_path: str) -> bool:
-        """检查文件是否有变化"""
+    def _walk_directory(self, root_path: str, known_states: Dict[str, Tuple[Optional[str], float]],
+                        full: bool = False) -> Tuple[List[str], Dict[str, Tuple[Optional[str], float]], List[str]]:
+        """基于os.scandir遍历目录树，跳过mtime未变化的目录
+        
+        目录的mtime只在其直接子项增删或重命名时变化。mtime与上次记录一致的目录
+        不再列出文件，子目录直接取自上次记录，因此增量遍历的开销只与变化的目录数量相关。
+        
+        Args:
+            root_path: 已注册的根目录
+            known_states: 上次记录的目录状态 path -> (parent_path, mtime)
+            full: 为True时不做剪枝，列出所有目录
+        
+        Returns:
+            (变化目录中的图片文件列表, 本次遍历得到的目录状态, 实际列出文件的目录列表)
+        """
+        files = []
+        states = {}
+        listed_dirs = []
+        
+        children = {}
+        for path, (parent_path, _) in known_states.items():
+            children.setdefault(parent_path, []).append(path)
+        
+        stack = [(root_path, None)]
+        while stack:
+            dir_path, parent_path = stack.pop()
+            try:
+                mtime = os.stat(dir_path).st_mtime
+            except OSError:
+                # 目录已被删除或无法访问
+                continue
+            
+            known = known_states.get(dir_path)
+            if not full and known is not None and known[1] == mtime:
+                states[dir_path] = (parent_path, mtime)
+                stack.extend((child, dir_path) for child in children.get(dir_path, ()))
+                continue
+            
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, dir_path))
+                        elif os.path.splitext(entry.name)[1].lower() in self.supported_formats and entry.is_file():
+                            files.append(entry.path)
+                states[dir_path] = (parent_path, mtime)
+                listed_dirs.append(dir_path)
+            except OSError as e:
+                # 列目录失败时不记录状态，下一轮重试
+                logger.error(f"获取目录文件列表失败: {dir_path} - {e}")
+        
+        return files, states, listed_dirs
+    
+    def _commit_directory_states(self):
+        """持久化本轮遍历得到的目录mtime"""
+        pending, self._pending_directory_states = self._pending_directory_states, {}
+        for root_path, (states, removed_dirs) in pending.items():
+            try:
+                self.db_manager.save_directory_states(root_path, states, removed_dirs)
+            except DatabaseException as e:
+                logger.error(f"数据库错误 - 保存目录状态失败: {root_path} - {e}")
+    
+    def _is_file_changed(self, file_path: str, path_index: Dict[str, Tuple[int, int, float, Optional[str]]],
+                         touched_files: Optional[List[Tuple[int, float, str]]] = None) -> bool:
+        """检查文件是否有变化
+        
+        stat信息（大小和修改时间）与数据库一致时直接判定未变化，不读取文件；
+        stat信息变化时才计算内容指纹，指纹一致说明只是被touch过。
+        
+        Args:
+            file_path: 文件路径
+            path_index: 扫描开始时加载的路径索引 path -> (id, file_size, modified_at, fingerprint)
+            touched_files: 收集内容未变但stat信息变化的文件 (file_size, modified_at, file_path)
+        """
         try:
             if not os.path.exists(file_path):
                 return False
@@ -123,35 +522,26 @@ class BackgroundScanner:
             # 获取文件状态
             stat = os.stat(file_path)
             
-            # 计算文件校验和
-            hasher = hashlib.md5()
-            with open(file_path, 'rb') as f:
-                buf = f.read(8192)  # 只读取前8KB用于校验
-                hasher.update(buf)
-            current_checksum = hasher.hexdigest()
-            
-            # 获取数据库中的记录
-            existing_image = self.db_manager.get_image_by_path(file_path)
+            # 从路径索引中获取数据库记录
+            indexed = path_index.get(file_path)
             
-            if not existing_image:
+            if not indexed:
                 # 新文件
                 return True
             
             # 检查修改时间和文件大小
-            db_modified_time = existing_image.get('modified_at', 0)
-            db_file_size = existing_image.get('file_size', 0)
+            _, db_file_size, db_modified_time, db_fingerprint = indexed
             
-            file_changed = (
-                abs(stat.st_mtime - db_modified_time) > 1 or  # 1秒容差
-                stat.st_size != db_file_size or
-                current_checksum != self.file_checksums.get(file_path)
-            )
+            if abs(stat.st_mtime - db_modified_time) <= 1 and stat.st_size == db_file_size:  # 1秒容差
+                return False
             
-            # 更新缓存
-            if file_changed:
-                self.file_checksums[file_path] = current_checksum
+            # stat信息变化时才读取文件计算指纹
+            if db_fingerprint and ImageProcessor.compute_fingerprint(file_path, stat.st_size) == db_fingerprint:
+                if touched_files is not None:
+                    touched_files.append((stat.st_size, stat.st_mtime, file_path))
+                return False
             
-            return file_changed
+            return True
             
         except DatabaseException as e:
             logger.error(f"数据库错误 - 检查文件变化失败: {file_path} - {e}")
@@ -161,134 +551,285 @@ class BackgroundScanner:
             return True  # 出错时假设文件有变化
     
     def _process_changed_files(self, changed_files: List[Dict[str, str]]):
-        """批量处理变化的文件"""
-        total_processed = 0
-        
-        for file_info in changed_files:
-            try:
-                if self._process_single_image(file_info['path']):
-                    total_processed += 1
-            except DatabaseException as e:
-                logger.error(f"数据库错误 - 处理文件失败: {file_info['path']} - {e}")
-            except ImageProcessingException as e:
-                logger.error(f"图片处理错误 - 处理文件失败: {file_info['path']} - {e}")
-            except Exception as e:
-                logger.error(f"处理文件失败: {file_info['path']} - {e}")
+        """批量处理变化的文件：提交到入库队列并等待处理完毕"""
+        ticket = self.enqueue_files([file_info['path'] for file_info in changed_files], PRIORITY_NORMAL)
+        self._wait_ticket(ticket)
         
-        if total_processed > 0:
-            logger.info(f"成功处理 {total_processed} 个变化的文件")
+        if ticket.processed > 0:
+            logger.info(f"成功处理 {ticket.processed} 个变化的文件")
     
     def force_full_scan(self):
-        """强制全量扫描（用于手动触发）"""
-        logger.info("开始强制全量扫描...")
-        start_time = time.time()
-        
-        directories = self.db_manager.get_directories()
-        total_processed = 0
+        """强制全量扫描（用于手动触发），阻塞直到扫描任务结束"""
+        job_id = self.start_full_scan_job()
+        job_thread = self._job_thread
+        if job_thread is not None:
+            job_thread.join()
+        job = self.db_manager.get_scan_job(job_id)
+        return job['processed'] if job else 0
+    
+    def start_full_scan_job(self) -> str:
+        """以后台任务方式启动全量扫描，立即返回任务ID；已有任务在运行时返回该任务ID"""
+        with self._job_lock:
+            if self._is_job_active():
+                return self._active_job_id
+            
+            job_id = uuid.uuid4().hex
+            roots = sorted(directory['path'] for directory in self.db_manager.get_directories() if 'path' in directory)
+            self.db_manager.create_scan_job(job_id, roots)
+            self._launch_job(job_id)
+            return job_id
+    
+    def resume_full_scan_job(self, job_id: str) -> bool:
+        """从检查点继续一个已取消、失败或被进程退出中断的扫描任务"""
+        with self._job_lock:
+            if self._is_job_active():
+                return self._active_job_id == job_id
+            
+            job = self.db_manager.get_scan_job(job_id)
+            if not job or job['status'] == JOB_COMPLETED:
+                return False
+            
+            self.db_manager.update_scan_job(job_id, status=JOB_RUNNING, error=None)
+            self._launch_job(job_id)
+            return True
+    
+    def cancel_full_scan_job(self, job_id: str) -> bool:
+        """取消扫描任务，已保存的检查点保留，之后可以继续"""
+        with self._job_lock:
+            job = self.db_manager.get_scan_job(job_id)
+            if not job or job['status'] != JOB_RUNNING:
+                return False
+            
+            if self._is_job_active() and self._active_job_id == job_id:
+                self._job_cancel_event.set()
+            else:
+                # 上次进程退出时遗留的任务，直接标记为已取消
+                self.db_manager.update_scan_job(job_id, status=JOB_CANCELLED)
+            return True
+    
+    def get_full_scan_job(self, job_id: str = None) -> Optional[Dict[str, Any]]:
+        """获取扫描任务进度，job_id为None时返回最近的任务"""
+        if job_id:
+            job = self.db_manager.get_scan_job(job_id)
+        else:
+            jobs = self.db_manager.get_scan_jobs(limit=1)
+            job = jobs[0] if jobs else None
+        if job:
+            job['is_active'] = self._is_job_active() and self._active_job_id == job['id']
+        return job
+    
+    def _is_job_active(self) -> bool:
+        return self._job_thread is not None and self._job_thread.is_alive()
+    
+    def _launch_job(self, job_id: str):
+        """在后台线程中执行扫描任务（调用方需持有_job_lock）"""
+        self._job_cancel_event = threading.Event()
+        self._active_job_id = job_id
+        self._job_thread = threading.Thread(
+            target=self._run_full_scan_job,
+            args=(job_id, self._job_cancel_event),
+            daemon=True
+        )
+        self._job_thread.start()
+    
+    def _resume_interrupted_jobs(self):
+        """启动时继续上次进程退出时仍在运行的扫描任务"""
+        try:
+            interrupted = self.db_manager.get_scan_jobs(status=JOB_RUNNING)
+        except DatabaseException as e:
+            logger.error(f"数据库错误 - 获取未完成的扫描任务失败: {e}")
+            return
         
-        for directory in directories:
-            directory_path = directory['path']
-            if not os.path.exists(directory_path):
-                continue
-                
-            files = self._get_directory_files(directory_path)
-            for file_path in files:
-                if self._process_single_image(file_path):
-                    total_processed += 1
+        if not interrupted:
+            return
         
-        scan_duration = time.time() - start_time
-        logger.info(f"全量扫描完成，共处理 {total_processed} 个文件，耗时{scan_duration:.2f}秒")
+        # 只继续最近的一个任务，更早的任务标记为已取消，仍可手动继续
+        latest, stale = interrupted[0], interrupted[1:]
+        for job in stale:
+            self.db_manager.update_scan_job(job['id'], status=JOB_CANCELLED)
         
-        return total_processed
+        with self._job_lock:
+            if not self._is_job_active():
+                logger.info(f"继续未完成的全量扫描任务 {latest['id']}，已扫描 {latest['scanned']}/{latest['total']}")
+                self._launch_job(latest['id'])
     
-    def _process_single_image(self, file_path: str) -> bool:
-        """处理单个图片文件，优化版本"""
+    def _run_full_scan_job(self, job_id: str, cancel_event: threading.Event) -> int:
+        """执行全量扫描任务
+        
+        每个根目录的文件按路径排序后分块以低优先级入队，每块处理完毕后保存检查点
+        (current_root, last_path)，续扫时从检查点之后的文件开始。
+        """
+        logger.info(f"开始全量扫描任务 {job_id}...")
+        start_time = time.time()
+        job = self.db_manager.get_scan_job(job_id)
+        if not job:
+            return 0
+        
+        scanned = job['scanned']
+        processed = job['processed']
         try:
-            # 快速检查文件是否存在和可读
-            if not os.path.exists(file_path):
-                return False
-                
-            # 获取文件信息
-            stat = os.stat(file_path)
+            roots = job['roots']
+            current_root = job['current_root']
+            start_index = roots.index(current_root) if current_root in roots else 0
             
-            # 检查文件大小，跳过异常大的文件（可能损坏或不是图片）
-            if stat.st_size == 0 or stat.st_size > 100 * 1024 * 1024:  # 100MB限制
-                return False
+            # 先列出所有待扫描的文件，以便报告总进度
+            plan = []
+            for root_path in roots[start_index:]:
+                if not os.path.exists(root_path):
+                    continue
+                files = sorted(self._get_directory_files(root_path))
+                if root_path == current_root and job['last_path']:
+                    files = files[bisect.bisect_right(files, job['last_path']):]
+                plan.append((root_path, files))
             
-            # 获取图片信息 - 使用更轻量的方式
-            with Image.open(file_path) as img:
-                width, height = img.size
-                format_name = img.format
-                
-                # 验证图片格式
-                if format_name not in ['JPEG', 'PNG', 'GIF', 'BMP', 'TIFF', 'WEBP']:
-                    return False
+            self.db_manager.update_scan_job(job_id, total=scanned + sum(len(files) for _, files in plan))
             
-            # 获取EXIF数据 - 添加错误处理
-            try:
-                exif_result = ImageProcessor.get_exif_data(file_path)
-                exif_data = exif_result.get('exif', {}) if 'error' not in exif_result else None
-            except Exception:
-                exif_data = None
+            for root_path, files in plan:
+                for i in range(0, len(files), self.checkpoint_every):
+                    if cancel_event.is_set():
+                        self.db_manager.update_scan_job(job_id, status=JOB_CANCELLED)
+                        logger.info(f"全量扫描任务 {job_id} 已取消，已扫描 {scanned} 个文件")
+                        return processed
+                    
+                    chunk = files[i:i + self.checkpoint_every]
+                    # 全量扫描以低优先级排队，用户正在浏览的目录可以插队
+                    ticket = self.enqueue_files(chunk, PRIORITY_LOW)
+                    self._wait_ticket(ticket)
+                    if ticket.remaining > 0:
+                        # 入库线程已停止（如程序退出），保持running状态，下次启动时从检查点继续
+                        return processed
+                    
+                    scanned += len(chunk)
+                    processed += ticket.processed
+                    self.db_manager.update_scan_job(
+                        job_id, current_root=root_path, last_path=chunk[-1],
+                        scanned=scanned, processed=processed
+                    )
             
-            # 获取现有评分，如果图片已存在则保留原有评分
-            existing_image = self.db_manager.get_image_by_path(file_path)
-            rating = existing_image.get('rating', 0) if existing_image else 0
-
-            # 生成缩略图 - 只在需要时生成
-            should_generate_thumbnail = (
-                not existing_image or 
-                abs(stat.st_mtime - existing_image.get('modified_at', 0)) > 1
+            self.db_manager.update_scan_job(
+                job_id, status=JOB_COMPLETED, current_root=None, last_path=None, scanned=scanned
             )
-            
-            thumbnail = None
-            if should_generate_thumbnail:
-                thumbnail = ImageProcessor.generate_thumbnail(file_path, (400, 400))
-            elif existing_image:
-                # 复用现有缩略图
-                thumbnail = existing_image.get('thumbnail')
-            
-            # 准备图片数据
-            image_data = {
-                'filename': os.path.basename(file_path),
-                'file_path': file_path,
-                'file_size': stat.st_size,
-                'created_at': stat.st_ctime,
-                'modified_at': stat.st_mtime,
-                'directory_path': os.path.dirname(file_path),
-                'width': width,
-                'height': height,
-                'format': format_name,
-                'thumbnail': thumbnail,
-                'exif_data': exif_data,
-                'rating': rating
-            }
-            
-            # 批量操作：更新或插入
-            if existing_image:
-                self.db_manager.update_image(file_path, image_data)
-            else:
-                self.db_manager.add_image(**image_data)
-                
-            return True
-            
+            scan_duration = time.time() - start_time
+            logger.info(f"全量扫描完成，共处理 {processed} 个文件，耗时{scan_duration:.2f}秒")
+            self._refresh_statistics()
+            return processed
+        except Exception as e:
+            logger.error(f"全量扫描任务 {job_id} 失败: {e}")
+            try:
+                self.db_manager.update_scan_job(job_id, status=JOB_FAILED, error=str(e))
+            except DatabaseException:
+                pass
+            return processed
+    
+    def _analyze_batch(self, file_paths: List[str], worker_stats: Dict[int, Dict[str, float]]) -> List[Dict[str, Any]]:
+        """分析一批文件，返回分析结果；未能分析的文件直接标记为处理失败
+        
+        分析结果不在这里写入，由入库线程跨批次累积后交给_flush_pending。
+        """
+        records = []
+        with self._ingest_lock:
+            try:
+                for image_data in self._analyze_files(file_paths):
+                    if not image_data:
+                        continue
+                    
+                    stats = worker_stats.setdefault(image_data.pop('worker_pid'), {'files': 0, 'busy_seconds': 0.0})
+                    stats['files'] += 1
+                    stats['busy_seconds'] += image_data.pop('elapsed')
+                    records.append(image_data)
+            except Exception as e:
+                logger.error(f"入库失败: {e}")
+                # 进程池可能已损坏（如子进程崩溃），下一批重建
+                self._shutdown_executor()
+        
+        analyzed = {record['file_path'] for record in records}
+        for file_path in file_paths:
+            if file_path not in analyzed:
+                self.scan_queue.task_done(file_path, False)
+        return records
+    
+    def _flush_pending(self, records: List[Dict[str, Any]], worker_stats: Dict[int, Dict[str, float]],
+                       start_time: float):
+        """把累积的分析结果在一个事务内写入，写入后才把这些文件标记为处理完毕"""
+        if not records:
+            return
+        with self._ingest_lock:
+            persisted = set(self._flush_images(records))
+        for record in records:
+            self.scan_queue.task_done(record['file_path'], record['file_path'] in persisted)
+        self._record_ingest_stats(worker_stats, len(persisted), time.time() - start_time)
+    
+    def _analyze_files(self, file_paths: List[str]):
+        """逐个产出文件分析结果，文件较多且启用并行时由进程池完成解码、EXIF和缩略图"""
+        if self.parallel_ingest and self.worker_count > 1 and len(file_paths) >= self.parallel_threshold:
+            chunksize = max(1, min(32, len(file_paths) // (self.worker_count * 4)))
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.worker_count)
+            analyze = partial(analyze_image_file, embedded_preview=self.embedded_preview)
+            yield from self._executor.map(analyze, file_paths, chunksize=chunksize)
+        else:
+            for file_path in file_paths:
+                yield analyze_image_file(file_path, embedded_preview=self.embedded_preview)
+    
+    def _shutdown_executor(self):
+        """关闭复用的进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def _record_ingest_stats(self, worker_stats: Dict[int, Dict[str, float]], total_processed: int, duration: float):
+        """记录并输出每个工作进程的吞吐量"""
+        workers = []
+        for pid, stats in sorted(worker_stats.items()):
+            busy = stats['busy_seconds']
+            throughput = stats['files'] / busy if busy > 0 else 0.0
+            workers.append({
+                'pid': pid,
+                'files': stats['files'],
+                'busy_seconds': round(busy, 3),
+                'files_per_second': round(throughput, 2)
+            })
+            logger.debug(f"工作进程 {pid}: 处理 {stats['files']} 个文件，{throughput:.2f} 文件/秒")
+        
+        overall = total_processed / duration if duration > 0 else 0.0
+        self.last_ingest_stats = {
+            'worker_count': self.worker_count,
+            'processed': total_processed,
+            'duration': round(duration, 3),
+            'files_per_second': round(overall, 2),
+            'workers': workers
+        }
+        logger.info(f"入库完成: {total_processed} 个文件，{overall:.2f} 文件/秒，{len(workers)} 个工作进程")
+    
+    def _flush_images(self, records: List[Dict[str, Any]]) -> List[str]:
+        """将累积的分析结果在一个事务内批量写入数据库，返回写入成功的文件路径"""
+        if not records:
+            return []
+        try:
+            self.db_manager.bulk_upsert_images(records)
+            return [record['file_path'] for record in records]
         except DatabaseException as e:
-            logger.error(f"数据库错误 - 跳过文件 {file_path}: {str(e)}")
-            return False
+            logger.error(f"数据库错误 - 批量写入 {len(records)} 个文件失败: {str(e)}")
         except ImageProcessingException as e:
-            logger.warning(f"图片处理错误 - 跳过文件 {file_path}: {str(e)}")
-            return False
+            logger.warning(f"图片处理错误 - 批量写入 {len(records)} 个文件失败: {str(e)}")
         except Exception as e:
-            logger.debug(f"跳过文件 {file_path}: {str(e)}")
-            return False
+            logger.error(f"批量写入 {len(records)} 个文件失败: {str(e)}")
+        return []
     
     def get_scan_status(self) -> Dict[str, any]:
         """获取扫描器状态"""
         return {
             'is_running': self.is_running,
             'supported_formats': list(self.supported_formats),
-            'cached_checksums': len(self.file_checksums),
-            'last_scan_times': self.last_scan_times
+            'last_scan_times': self.last_scan_times,
+            'worker_count': self.worker_count,
+            'parallel_ingest': self.parallel_ingest,
+            'embedded_preview': self.embedded_preview,
+            'watch_mode': 'inotify' if self.watcher is not None else 'polling',
+            'last_ingest_stats': self.last_ingest_stats,
+            'last_reconcile_stats': self.last_reconcile_stats,
+            'queue': self.scan_queue.get_stats(),
+            'active_job_id': self._active_job_id if self._is_job_active() else None
         }
 
 # 全局扫描器实例
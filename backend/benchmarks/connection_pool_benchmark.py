@@ -0,0 +1,133 @@
+"""
+连接池基准 - 对比每次调用新建连接（旧行为）与线程内复用连接的查询延迟
+
+用法（在backend目录下运行）:
+    python benchmarks/connection_pool_benchmark.py [--images 5000] [--requests 500]
+
+在临时目录中生成一个带缩略图的合成图库，分别测量：
+  - query_images 分页查询（网格翻页）
+  - /api/thumbnail 接口（关闭内存缓存，每次都走数据库）
+旧行为通过把BaseDB.get_connection替换为直接sqlite3.connect来复现。
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from container import Container
+from db import DatabaseManager
+from db.base import BaseDB
+
+
+def unpooled_connection(self):
+    """旧行为：每次调用都新建连接"""
+    return sqlite3.connect(self.db_path)
+
+
+def build_library(db_manager: DatabaseManager, count: int):
+    """批量写入合成图片记录，每张带128/256两级缩略图"""
+    buffer = BytesIO()
+    Image.linear_gradient('L').resize((256, 192)).convert('RGB').save(buffer, format='JPEG', quality=90)
+    thumbnail = buffer.getvalue()
+    
+    now = datetime.now().timestamp()
+    records = []
+    for i in range(count):
+        directory = f"/library/album_{i % 20:02d}"
+        records.append({
+            'filename': f"IMG_{i:06d}.jpg",
+            'file_path': f"{directory}/IMG_{i:06d}.jpg",
+            'file_size': 4_000_000 + i,
+            'created_at': now - i * 60,
+            'modified_at': now - i * 60,
+            'directory_path': directory,
+            'width': 6000,
+            'height': 4000,
+            'format': 'JPEG',
+            'thumbnails': {128: thumbnail, 256: thumbnail}
+        })
+    for start in range(0, count, 1000):
+        db_manager.bulk_upsert_images(records[start:start + 1000])
+
+
+def measure(func, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'mean': statistics.fmean(samples),
+        'p50': samples[len(samples) // 2],
+        'p95': samples[int(len(samples) * 0.95) - 1]
+    }
+
+
+def run(db_manager: DatabaseManager, client, image_ids, page_size: int, requests: int):
+    total = len(image_ids)
+    
+    def query_page():
+        offset = random.randrange(0, max(1, total - page_size))
+        db_manager.image_manager.query_images(limit=page_size, offset=offset)
+    
+    def thumbnail_request():
+        response = client.get(f"/api/thumbnail/{random.choice(image_ids)}?size=256")
+        assert response.status_code == 200
+    
+    return {
+        'query_images': measure(query_page, requests),
+        'thumbnail': measure(thumbnail_request, requests)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite连接池基准")
+    parser.add_argument('--images', type=int, default=5000, help="合成图库的图片数量")
+    parser.add_argument('--page-size', type=int, default=100, help="query_images每页数量")
+    parser.add_argument('--requests', type=int, default=500, help="每项测量的请求次数")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(os.path.join(tmp, 'benchmark.db'))
+        Container._db_manager = db_manager
+        print(f"生成合成图库: {args.images} 张图片...")
+        build_library(db_manager, args.images)
+        image_ids = [image['id'] for image in db_manager.image_manager.query_images()]
+        
+        from fastapi.testclient import TestClient
+        import fastapi_server
+        # 关闭内存缓存，让每次请求都查库
+        fastapi_server.thumbnail_cache.resize(0)
+        client = TestClient(fastapi_server.app)
+        
+        pooled_connection = BaseDB.get_connection
+        results = {}
+        for label, get_connection in (('unpooled', unpooled_connection), ('pooled', pooled_connection)):
+            BaseDB.get_connection = get_connection
+            random.seed(0)
+            run(db_manager, client, image_ids, args.page_size, 20)
+            results[label] = run(db_manager, client, image_ids, args.page_size, args.requests)
+        BaseDB.get_connection = pooled_connection
+    
+    print(f"每项 {args.requests} 次请求，单位毫秒")
+    for name in ('query_images', 'thumbnail'):
+        before, after = results['unpooled'][name], results['pooled'][name]
+        print(f"  {name}")
+        for label, stats in (('unpooled', before), ('pooled', after)):
+            print(f"    {label:<9} 平均 {stats['mean']:7.3f}  p50 {stats['p50']:7.3f}  p95 {stats['p95']:7.3f}")
+        print(f"    加速比: {before['mean'] / after['mean']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
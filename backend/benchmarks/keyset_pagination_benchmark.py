@@ -0,0 +1,87 @@
+"""
+深翻页基准 - 对比OFFSET分页与游标（keyset）分页在不同翻页深度下的单页查询延迟
+
+用法（在backend目录下运行）:
+    python benchmarks/keyset_pagination_benchmark.py [--images 100000] [--page-size 100]
+
+在临时目录中生成合成图库，按默认排序（modified_at降序）连续翻页到末尾，
+分别记录OFFSET方式和游标方式在各深度处的取页耗时。OFFSET需要逐行跳过前面的全部记录，
+耗时随深度线性增长；游标方式每页都从上一页末尾直接定位，耗时应与深度无关。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import DatabaseManager
+
+
+def build_library(db_manager: DatabaseManager, count: int):
+    """批量写入合成图片记录，不带缩略图"""
+    now = datetime.now().timestamp()
+    for start in range(0, count, 5000):
+        db_manager.bulk_upsert_images([{
+            'filename': f"IMG_{i:07d}.jpg",
+            'file_path': f"/library/album_{i % 50:02d}/IMG_{i:07d}.jpg",
+            'file_size': 4_000_000 + i,
+            'created_at': now - i,
+            'modified_at': now - i,
+            'directory_path': f"/library/album_{i % 50:02d}",
+            'width': 6000,
+            'height': 4000,
+            'format': 'JPEG',
+            'thumbnails': {}
+        } for i in range(start, min(count, start + 5000))])
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OFFSET与游标分页的深翻页基准")
+    parser.add_argument('--images', type=int, default=100000, help="合成图库的图片数量")
+    parser.add_argument('--page-size', type=int, default=100, help="每页数量")
+    parser.add_argument('--samples', type=int, default=10, help="输出的深度采样点数量")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(os.path.join(tmp, 'benchmark.db'))
+        images = db_manager.image_manager
+        print(f"生成合成图库: {args.images} 张图片...")
+        build_library(db_manager, args.images)
+        
+        pages = (args.images + args.page_size - 1) // args.page_size
+        offset_ms, cursor_ms = [], []
+        cursor = None
+        for page in range(pages):
+            offset_page, elapsed = timed(lambda: images.query_images_page(
+                limit=args.page_size, offset=page * args.page_size))
+            offset_ms.append(elapsed)
+            cursor_page, elapsed = timed(lambda: images.query_images_page(
+                limit=args.page_size, cursor=cursor))
+            cursor_ms.append(elapsed)
+            # 两种方式必须返回相同的页
+            assert [i['id'] for i in offset_page['images']] == [i['id'] for i in cursor_page['images']]
+            cursor = cursor_page['next_cursor']
+        images.pool.close_all()
+    
+    print(f"共 {pages} 页，每页 {args.page_size} 张，单位毫秒")
+    print(f"  {'页码':>8} {'offset':>10} {'cursor':>10}")
+    step = max(1, pages // args.samples)
+    for page in list(range(0, pages, step))[:args.samples] + [pages - 1]:
+        print(f"  {page:>8} {offset_ms[page]:10.3f} {cursor_ms[page]:10.3f}")
+    tail = slice(pages - max(1, pages // 10), pages)
+    offset_tail = sum(offset_ms[tail]) / len(offset_ms[tail])
+    cursor_tail = sum(cursor_ms[tail]) / len(cursor_ms[tail])
+    print(f"  最后10%页平均: offset {offset_tail:.3f}  cursor {cursor_tail:.3f}  加速比 {offset_tail / cursor_tail:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+侧边栏计数基准 - 对比逐项查询计数（旧实现）与读取触发器维护的计数表
+
+用法（在backend目录下运行）:
+    python benchmarks/photo_counts_benchmark.py [--images 100000] [--directories 50] [--requests 50]
+
+在临时目录中生成合成图库并登记目录，分别测量：
+  - 旧实现：COUNT(*)总数 + 取出全部收藏图片后len() + 每个登记目录一次COUNT(*)
+  - 新实现：ImageService.get_photo_counts（一次读取image_counters）
+同时测量触发器给批量入库带来的额外开销。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from container import Container
+from db import DatabaseManager
+from db.counters import ALBUM_TRIGGERS, IMAGE_TRIGGERS
+
+
+def make_records(count: int, directories: int):
+    now = datetime.now().timestamp()
+    return [{
+        'filename': f"IMG_{i:07d}.jpg",
+        'file_path': f"/library/album_{i % directories:03d}/IMG_{i:07d}.jpg",
+        'file_size': 4_000_000 + i,
+        'created_at': now - i,
+        'modified_at': now - i,
+        'directory_path': f"/library/album_{i % directories:03d}",
+        'width': 6000,
+        'height': 4000,
+        'format': 'JPEG',
+        'thumbnails': {}
+    } for i in range(count)]
+
+
+def ingest(db_manager: DatabaseManager, records) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(records), 5000):
+        db_manager.bulk_upsert_images(records[i:i + 5000])
+    return time.perf_counter() - start
+
+
+def legacy_photo_counts(db_manager: DatabaseManager):
+    """旧实现：总数、收藏列表长度和逐目录计数"""
+    images = db_manager.image_manager
+    directories = {
+        info["path"]: images.count_images(directory_path=info["path"])
+        for info in db_manager.get_directories()
+    }
+    return {
+        "all_photos": images.count_images(),
+        "favorites": len(images.get_favorite_images()),
+        "directories": directories
+    }
+
+
+def measure(func, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.fmean(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="侧边栏计数基准")
+    parser.add_argument('--images', type=int, default=100000, help="合成图库的图片数量")
+    parser.add_argument('--directories', type=int, default=50, help="登记的目录数量")
+    parser.add_argument('--requests', type=int, default=50, help="每种实现的调用次数")
+    args = parser.parse_args()
+    records = make_records(args.images, args.directories)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # 去掉触发器入库一次，作为入库开销的对照
+        baseline = DatabaseManager(os.path.join(tmp, 'baseline.db'))
+        with baseline.image_manager.get_write_connection() as conn:
+            for name in (*IMAGE_TRIGGERS, *ALBUM_TRIGGERS):
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        untriggered = ingest(baseline, records)
+        baseline.image_manager.pool.close_all()
+        
+        db_manager = DatabaseManager(os.path.join(tmp, 'benchmark.db'))
+        Container._db_manager = db_manager
+        triggered = ingest(db_manager, records)
+        for d in range(args.directories):
+            db_manager.save_directory(f"/library/album_{d:03d}", f"album_{d:03d}")
+        with db_manager.image_manager.get_write_connection() as conn:
+            conn.execute("UPDATE image_metadata SET is_favorite = 1 WHERE id % 10 = 0")
+        
+        from services.image_service import ImageService
+        service = ImageService()
+        counts = service.get_photo_counts()
+        legacy = legacy_photo_counts(db_manager)
+        assert counts["all_photos"] == legacy["all_photos"]
+        assert counts["favorites"] == legacy["favorites"]
+        assert counts["directories"] == legacy["directories"]
+        
+        legacy_ms = measure(lambda: legacy_photo_counts(db_manager), args.requests)
+        counters_ms = measure(service.get_photo_counts, args.requests)
+        db_manager.image_manager.pool.close_all()
+    
+    print(f"{args.images} 张图片，{args.directories} 个目录，{legacy['favorites']} 张收藏，单位毫秒")
+    print(f"  逐项查询   平均 {legacy_ms[0]:9.3f}  最大 {legacy_ms[1]:9.3f}")
+    print(f"  计数表     平均 {counters_ms[0]:9.3f}  最大 {counters_ms[1]:9.3f}")
+    print(f"  加速比: {legacy_ms[0] / counters_ms[0]:.1f}x")
+    print(f"  批量入库: 无触发器 {untriggered:.2f}s  有触发器 {triggered:.2f}s "
+          f"(+{(triggered - untriggered) / args.images * 1e6:.1f}us/张)")
+
+
+if __name__ == '__main__':
+    main()
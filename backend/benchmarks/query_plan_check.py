@@ -0,0 +1,159 @@
+"""
+查询计划回归检查 - 对query_images/count_images的每种筛选与排序组合执行EXPLAIN QUERY PLAN
+
+用法（在backend目录下运行）:
+    python benchmarks/query_plan_check.py [--images 20000] [--no-analyze] [--verbose]
+
+在临时目录中生成分布接近真实图库的合成数据（多目录、部分收藏、多种评分与格式、若干相册），
+按应用自身的方式收集统计信息后，用trace回调截获每次调用实际执行的SQL（首页和游标续页），
+逐条检查查询计划：出现全表扫描（不经索引的SCAN）或临时B树排序即判为回归，退出码为1。
+
+唯一的例外是"相册 + 图片表字段排序"：相册成员先经 (album_id, ...) 索引定位，再在相册范围内排序，
+开销与相册大小相关而与图库大小无关，要求计划中必须有按album_id的索引查找。
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import DatabaseManager
+from db.image_manager import ALBUM_SORT_FIELDS, IMAGE_SORT_FIELDS
+
+FORMATS = ('JPEG', 'JPEG', 'JPEG', 'PNG', 'HEIC')
+
+
+def build_library(db_manager: DatabaseManager, count: int) -> int:
+    """写入合成图片记录并建立相册，返回用于检查的相册ID"""
+    now = datetime.now().timestamp()
+    for start in range(0, count, 5000):
+        db_manager.bulk_upsert_images([{
+            'filename': f"IMG_{i:07d}.jpg",
+            'file_path': f"/library/album_{i % 50:02d}/IMG_{i:07d}.jpg",
+            'file_size': 4_000_000 + i,
+            'created_at': now - i * 60,
+            'modified_at': now - i * 60,
+            'directory_path': f"/library/album_{i % 50:02d}",
+            'width': 6000,
+            'height': 4000,
+            'format': FORMATS[i % len(FORMATS)],
+            'thumbnails': {}
+        } for i in range(start, min(count, start + 5000))])
+    
+    images = db_manager.image_manager
+    with images.get_write_connection() as conn:
+        conn.execute("UPDATE image_metadata SET is_favorite = 1 WHERE id % 10 = 0")
+        conn.execute("UPDATE image_metadata SET rating = id % 6")
+    
+    album_ids = [db_manager.album_manager.create_album(f"相册{i}") for i in range(20)]
+    for i, album_id in enumerate(album_ids):
+        db_manager.album_manager.add_images_to_album(album_id, list(range(i + 1, count + 1, 97)))
+    return album_ids[0]
+
+
+def filter_combinations(album_id: int):
+    """全部筛选条件的组合（含不筛选）"""
+    filters = {
+        'directory_path': "/library/album_07",
+        'is_favorite': True,
+        'album_id': album_id,
+        'min_rating': 3,
+        'max_rating': 4,
+        'format_filter': 'PNG'
+    }
+    for size in range(len(filters) + 1):
+        for names in itertools.combinations(filters, size):
+            yield {name: filters[name] for name in names}
+
+
+def check_plan(plan, allow_album_sort: bool):
+    """返回计划中的问题列表"""
+    problems = []
+    for detail in plan:
+        if detail.startswith('SCAN ') and 'INDEX' not in detail:
+            problems.append(f"全表扫描: {detail}")
+        elif 'TEMP B-TREE' in detail:
+            if allow_album_sort and any(line.startswith('SEARCH ai') and 'album_id=' in line for line in plan):
+                continue
+            problems.append(f"临时B树排序: {detail}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="query_images/count_images查询计划回归检查")
+    parser.add_argument('--images', type=int, default=20000, help="合成图库的图片数量")
+    parser.add_argument('--no-analyze', action='store_true', help="不收集统计信息，检查默认估算下的计划")
+    parser.add_argument('--verbose', action='store_true', help="输出每条语句的查询计划")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(os.path.join(tmp, 'plans.db'))
+        images = db_manager.image_manager
+        album_id = build_library(db_manager, args.images)
+        if args.no_analyze:
+            with images.get_write_connection() as conn:
+                conn.execute("DROP TABLE IF EXISTS sqlite_stat1")
+        else:
+            db_manager.refresh_statistics()
+        
+        conn = images.get_connection()
+        statements = []
+        
+        def capture(call):
+            """执行一次调用，返回其间执行的SQL"""
+            statements.clear()
+            conn.set_trace_callback(statements.append)
+            try:
+                result = call()
+            finally:
+                conn.set_trace_callback(None)
+            return result, list(statements)
+        
+        checked = 0
+        failures = []
+        
+        def inspect(label, sql, allow_album_sort=False):
+            nonlocal checked
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            checked += 1
+            if args.verbose:
+                print(f"{label}\n    " + "\n    ".join(plan))
+            for problem in check_plan(plan, allow_album_sort):
+                failures.append(f"{label}: {problem}")
+        
+        for filters in filter_combinations(album_id):
+            name = ', '.join(f"{k}={v}" for k, v in filters.items()) or '无筛选'
+            
+            _, sqls = capture(lambda: images.count_images(**filters))
+            for sql in sqls:
+                inspect(f"count_images({name})", sql)
+            
+            sort_fields = list(IMAGE_SORT_FIELDS)
+            if 'album_id' in filters:
+                sort_fields += list(ALBUM_SORT_FIELDS)
+            for sort_by, sort_order in itertools.product(sort_fields, ('desc', 'asc')):
+                allow_album_sort = 'album_id' in filters and sort_by not in ALBUM_SORT_FIELDS
+                query = dict(filters, limit=50, sort_by=sort_by, sort_order=sort_order)
+                page, sqls = capture(lambda: images.query_images_page(**query))
+                for sql in sqls:
+                    inspect(f"query_images({name}; {sort_by} {sort_order})", sql, allow_album_sort)
+                if page['next_cursor']:
+                    _, sqls = capture(lambda: images.query_images_page(cursor=page['next_cursor'], **query))
+                    for sql in sqls:
+                        inspect(f"query_images({name}; {sort_by} {sort_order}; 游标续页)", sql, allow_album_sort)
+        images.pool.close_all()
+    
+    print(f"检查了 {checked} 条语句的查询计划")
+    if failures:
+        print(f"发现 {len(failures)} 处回归:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("全部通过：没有全表扫描或临时B树排序")
+
+
+if __name__ == '__main__':
+    main()
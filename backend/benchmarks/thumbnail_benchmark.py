@@ -0,0 +1,131 @@
+"""
+缩略图生成基准 - 对比全尺寸解码与快速解码（JPEG draft + reduce）的吞吐量和输出质量
+
+用法（在backend目录下运行）:
+    python benchmarks/thumbnail_benchmark.py [图片目录] [--size 400] [--repeat 3]
+
+未指定图片目录时会在临时目录中生成一组大尺寸的合成JPEG/PNG。
+质量以快速解码结果相对旧流程结果的PSNR衡量，一般高于35dB即肉眼难以分辨。
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+from image_utils import ImageProcessor, ORIENTATION_TAG
+
+
+def generate_samples(target_dir: str, count: int = 6):
+    """生成带渐变和细节线条的大尺寸样本，部分带EXIF方向"""
+    sizes = [(6000, 4000), (8000, 6000), (4000, 6000)]
+    paths = []
+    for i in range(count):
+        width, height = sizes[i % len(sizes)]
+        img = Image.linear_gradient('L').resize((width, height))
+        img = Image.merge('RGB', (img, img.transpose(Image.Transpose.ROTATE_90).resize((width, height)), img))
+        draw = ImageDraw.Draw(img)
+        for x in range(0, width, 37):
+            draw.line([(x, 0), (width - x, height)], fill=(255, (x * 7) % 255, 64), width=3)
+        
+        if i % 3 == 2:
+            path = os.path.join(target_dir, f'sample_{i}.png')
+            img.save(path, format='PNG')
+        else:
+            path = os.path.join(target_dir, f'sample_{i}.jpg')
+            exif = Image.Exif()
+            exif[ORIENTATION_TAG] = 6 if i % 2 else 1
+            img.save(path, format='JPEG', quality=92, exif=exif)
+        paths.append(path)
+    return paths
+
+
+def collect_images(directory: str):
+    extensions = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff'}
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in extensions:
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def render(path: str, size: tuple, fast: bool) -> bytes:
+    with Image.open(path) as img:
+        orientation = 1
+        try:
+            exif = img._getexif()
+            if exif is not None:
+                orientation = exif.get(ORIENTATION_TAG, 1)
+        except (AttributeError, KeyError, TypeError):
+            pass
+        return ImageProcessor._render_thumbnail(img, size, orientation, fast=fast)
+
+
+def psnr(reference: bytes, candidate: bytes) -> float:
+    ref = Image.open(BytesIO(reference)).convert('RGB')
+    cand = Image.open(BytesIO(candidate)).convert('RGB')
+    if cand.size != ref.size:
+        # 两条流程的取整可能相差1像素，对齐后再比较
+        cand = cand.resize(ref.size, Image.Resampling.LANCZOS)
+    rms = ImageStat.Stat(ImageChops.difference(ref, cand)).rms
+    mse = sum(value * value for value in rms) / len(rms)
+    if mse == 0:
+        return float('inf')
+    return 10 * math.log10(255 * 255 / mse)
+
+
+def run(paths, size: tuple, repeat: int):
+    results = {}
+    outputs = {}
+    for fast in (False, True):
+        label = 'fast' if fast else 'legacy'
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            outputs[label] = [render(path, size, fast) for path in paths]
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = best
+    
+    print(f"图片数量: {len(paths)}  缩略图尺寸: {size[0]}x{size[1]}  重复: {repeat}")
+    for label, elapsed in results.items():
+        print(f"  {label:<7} {elapsed:8.3f}s  {len(paths) / elapsed:8.2f} 张/秒")
+    print(f"  加速比: {results['legacy'] / results['fast']:.2f}x")
+    
+    scores = [psnr(ref, cand) for ref, cand in zip(outputs['legacy'], outputs['fast'])]
+    finite = [score for score in scores if math.isfinite(score)]
+    if finite:
+        print(f"  PSNR(快速 vs 旧流程): 最低 {min(finite):.2f}dB  平均 {sum(finite) / len(finite):.2f}dB")
+    else:
+        print("  PSNR(快速 vs 旧流程): 输出完全一致")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缩略图快速解码基准")
+    parser.add_argument('directory', nargs='?', help="图片目录，省略时生成合成样本")
+    parser.add_argument('--size', type=int, default=400, help="缩略图最大边长")
+    parser.add_argument('--repeat', type=int, default=3, help="每种流程重复次数，取最快一次")
+    args = parser.parse_args()
+    
+    size = (args.size, args.size)
+    if args.directory:
+        paths = collect_images(args.directory)
+        if not paths:
+            print(f"目录中没有图片: {args.directory}")
+            return
+        run(paths, size, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            print("生成合成样本...")
+            run(generate_samples(tmp), size, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+按需生成取消检查 - 共享同一次缩略图/预览图生成的并发请求中，一个请求被取消不能影响其他请求
+
+用法（在backend目录下运行）:
+    python benchmarks/thumbnail_cancellation_check.py
+
+在临时目录中写入一张大于预览尺寸且没有缩略图的图片，把生成器限制为单线程并先用一个阻塞任务占住，
+使按需生成的任务停在线程池队列中；两个并发请求共享这次生成，取消其中一个（相当于客户端断开），
+放行后检查另一个请求仍拿到图片、生成没有被记为失败。/api/thumbnail和/api/preview各检查一次。
+另外检查关闭线程池时被丢弃的任务不会被记为失败。任一检查不通过时退出码为1。
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from starlette.requests import Request
+
+from container import Container
+from db import DatabaseManager
+from image_utils import PREVIEW_SIZE
+from thumbnail_generator import ThumbnailGenerator
+
+
+def make_request() -> Request:
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': [], 'query_string': b''})
+
+
+def add_image(db_manager: DatabaseManager, directory: str) -> int:
+    """写入一张需要生成预览图的原图和不带缩略图的记录，返回图片ID"""
+    path = os.path.join(directory, 'IMG_0001.jpg')
+    width, height = PREVIEW_SIZE * 3 // 2, PREVIEW_SIZE
+    Image.linear_gradient('L').resize((width, height)).convert('RGB').save(path, format='JPEG', quality=90)
+    now = datetime.now().timestamp()
+    db_manager.bulk_upsert_images([{
+        'filename': 'IMG_0001.jpg',
+        'file_path': path,
+        'file_size': os.path.getsize(path),
+        'created_at': now,
+        'modified_at': now,
+        'directory_path': directory,
+        'width': width,
+        'height': height,
+        'format': 'JPEG',
+        'thumbnails': {}
+    }])
+    return db_manager.get_image_by_path(path)['id']
+
+
+async def run_concurrent(generator: ThumbnailGenerator, call) -> list:
+    """两个请求共享一次排队中的生成，取消第一个后放行，返回问题列表"""
+    release = threading.Event()
+    blocker = generator._get_executor().submit(release.wait)
+    problems = []
+    
+    cancelled = asyncio.create_task(call())
+    survivor = asyncio.create_task(call())
+    await asyncio.sleep(0.05)
+    if generator.get_stats()['in_flight'] != 1:
+        problems.append(f"两个请求没有共享同一次生成: {generator.get_stats()}")
+    cancelled.cancel()
+    await asyncio.sleep(0.05)
+    release.set()
+    
+    try:
+        response = await asyncio.wait_for(survivor, timeout=30)
+        if response.status_code != 200:
+            problems.append(f"未取消的请求返回了 {response.status_code}")
+    except asyncio.CancelledError:
+        problems.append("取消一个请求连带取消了另一个请求")
+    except Exception as e:
+        problems.append(f"未取消的请求失败: {e!r}")
+    if not cancelled.cancelled():
+        problems.append("被取消的请求没有收到取消")
+    blocker.result()
+    
+    if generator._failed:
+        problems.append(f"生成被记为失败: {generator._failed}")
+    return problems
+
+
+def check_shutdown(db_manager: DatabaseManager, image_id: int) -> list:
+    """关闭线程池时丢弃排队中的任务，不应记为失败"""
+    generator = ThumbnailGenerator(db_manager, max_workers=1)
+    release = threading.Event()
+    blocker = generator._get_executor().submit(release.wait)
+    future = generator.submit(image_id)
+    generator.shutdown()
+    release.set()
+    blocker.result()
+    
+    problems = []
+    if not future.cancelled():
+        problems.append("关闭线程池后排队中的任务没有被取消")
+    if generator._failed or generator.get_stats()['in_flight']:
+        problems.append(f"被取消的任务留下了失败记录或在途记录: {generator.get_stats()}")
+    retry = generator.submit(image_id)
+    if retry is None:
+        problems.append("被取消的图片随后无法重新提交生成")
+    else:
+        retry.result()
+    generator.shutdown()
+    return problems
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(os.path.join(tmp, 'cancel.db'))
+        Container._db_manager = db_manager
+        image_id = add_image(db_manager, tmp)
+        
+        import fastapi_server
+        fastapi_server.thumbnail_cache.resize(0)
+        generator = fastapi_server.thumbnail_generator = ThumbnailGenerator(db_manager, max_workers=1)
+        
+        failures = []
+        thumbnail = lambda: fastapi_server.get_thumbnail(make_request(), image_id, size=256, v=None)
+        failures += [f"缩略图: {p}" for p in asyncio.run(run_concurrent(generator, thumbnail))]
+        preview = lambda: fastapi_server.get_preview(make_request(), image_id, v=None)
+        failures += [f"预览图: {p}" for p in asyncio.run(run_concurrent(generator, preview))]
+        failures += [f"关闭线程池: {p}" for p in check_shutdown(db_manager, image_id)]
+        generator.shutdown()
+        db_manager.image_manager.pool.close_all()
+    
+    if failures:
+        print(f"发现 {len(failures)} 处问题:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("全部通过：取消一个请求不影响共享同一次生成的其他请求")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+并发读写压力测试 - 批量入库进行时，界面查询是否仍然畅通
+
+用法（在backend目录下运行）:
+    python benchmarks/wal_stress.py [--batches 30] [--batch-size 1000] [--readers 4] [--interval 5]
+
+一个写线程模拟后台扫描，连续执行bulk_upsert_images大事务；若干读线程模拟FastAPI和pywebview Api线程，
+按固定间隔执行query_images分页和缩略图读取（模拟界面请求节奏），记录延迟与"database is locked"错误。
+分别在旧的回滚日志模式（journal_mode=DELETE）和当前存储配置（WAL）下各运行一次。
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from db import DatabaseManager
+import db.base as base
+from exceptions import DatabaseException
+
+# 旧存储配置：回滚日志模式，连接只设置busy_timeout
+LEGACY_PROFILE = ("DELETE", ("PRAGMA busy_timeout = 5000",))
+CURRENT_PROFILE = (base.JOURNAL_MODE, base.CONNECTION_PRAGMAS)
+
+
+def make_records(start: int, count: int, thumbnail: bytes):
+    now = datetime.now().timestamp()
+    return [{
+        'filename': f"IMG_{i:07d}.jpg",
+        'file_path': f"/library/album_{i % 50:02d}/IMG_{i:07d}.jpg",
+        'file_size': 4_000_000 + i,
+        'created_at': now - i,
+        'modified_at': now - i,
+        'directory_path': f"/library/album_{i % 50:02d}",
+        'width': 6000,
+        'height': 4000,
+        'format': 'JPEG',
+        'thumbnails': {128: thumbnail, 256: thumbnail}
+    } for i in range(start, start + count)]
+
+
+def percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(profile, args, thumbnail: bytes):
+    journal_mode, pragmas = profile
+    base.JOURNAL_MODE = journal_mode
+    base.CONNECTION_PRAGMAS = pragmas
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager = DatabaseManager(os.path.join(tmp, 'stress.db'))
+        images = db_manager.image_manager
+        # 预先写入一批数据，读线程一开始就有内容可查
+        images.bulk_upsert_images(make_records(0, args.batch_size, thumbnail))
+        
+        stop = threading.Event()
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        
+        def reader(seed: int):
+            rng = random.Random(seed)
+            local_latencies = []
+            local_errors = 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    if rng.random() < 0.5:
+                        images.query_images(limit=100, offset=rng.randrange(0, args.batch_size - 100))
+                    else:
+                        images.get_thumbnail_variant(rng.randrange(1, args.batch_size), 256)
+                except (DatabaseException, sqlite3.OperationalError):
+                    local_errors += 1
+                local_latencies.append((time.perf_counter() - start) * 1000)
+                stop.wait(args.interval / 1000)
+            with lock:
+                latencies.extend(local_latencies)
+                errors.append(local_errors)
+        
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        
+        write_start = time.perf_counter()
+        write_errors = 0
+        for batch in range(1, args.batches + 1):
+            try:
+                images.bulk_upsert_images(make_records(batch * args.batch_size, args.batch_size, thumbnail))
+            except DatabaseException:
+                write_errors += 1
+        write_elapsed = time.perf_counter() - write_start
+        
+        stop.set()
+        for thread in threads:
+            thread.join()
+        db_manager.image_manager.pool.close_all()
+    
+    return {
+        'write_elapsed': write_elapsed,
+        'write_errors': write_errors,
+        'reads': len(latencies),
+        'read_errors': sum(errors),
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'max': max(latencies) if latencies else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WAL并发读写压力测试")
+    parser.add_argument('--batches', type=int, default=30, help="写线程执行的批量入库次数")
+    parser.add_argument('--batch-size', type=int, default=1000, help="每次批量入库的图片数量")
+    parser.add_argument('--readers', type=int, default=4, help="并发读线程数")
+    parser.add_argument('--interval', type=float, default=5, help="每个读线程两次请求之间的间隔（毫秒）")
+    args = parser.parse_args()
+    
+    buffer = BytesIO()
+    Image.linear_gradient('L').resize((256, 192)).convert('RGB').save(buffer, format='JPEG', quality=90)
+    thumbnail = buffer.getvalue()
+    
+    print(f"写入 {args.batches} 批 x {args.batch_size} 张，{args.readers} 个读线程，延迟单位毫秒")
+    for label, profile in (('rollback', LEGACY_PROFILE), ('wal', CURRENT_PROFILE)):
+        result = run(profile, args, thumbnail)
+        print(f"  {label:<9} 入库 {result['write_elapsed']:6.2f}s  写失败 {result['write_errors']}  "
+              f"读 {result['reads']:6d} 次  读失败 {result['read_errors']}  "
+              f"p50 {result['p50']:7.2f}  p99 {result['p99']:8.2f}  最大 {result['max']:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
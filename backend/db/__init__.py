@@ -2,6 +2,7 @@ from .base import BaseDB
 from .directory_manager import DirectoryManager
 from .image_manager import ImageManager
 from .album_manager import AlbumManager
+from .scan_job_manager import ScanJobManager
 
 class DatabaseManager:
     """向后兼容的数据库管理器，组合了目录、图片和相册管理功能"""
@@ -10,6 +11,7 @@ class DatabaseManager:
         self.directory_manager = DirectoryManager(db_path)
         self.image_manager = ImageManager(db_path)
         self.album_manager = AlbumManager(db_path)
+        self.scan_job_manager = ScanJobManager(db_path)
     
     # 目录相关方法（代理到directory_manager）
     def save_directory(self, dir_path: str, dir_name: str) -> bool:
@@ -21,6 +23,12 @@ class DatabaseManager:
     def remove_directory(self, directory_path: str):
         return self.directory_manager.remove_directory(directory_path)
     
+    def get_directory_states(self, *args, **kwargs):
+        return self.directory_manager.get_directory_states(*args, **kwargs)
+    
+    def save_directory_states(self, *args, **kwargs):
+        return self.directory_manager.save_directory_states(*args, **kwargs)
+    
     # 图片相关方法（代理到image_manager）
     def add_image(self, *args, **kwargs):
         return self.image_manager.add_image(*args, **kwargs)
@@ -28,6 +36,12 @@ class DatabaseManager:
     def get_image_by_path(self, *args, **kwargs):
         return self.image_manager.get_image_by_path(*args, **kwargs)
 
+    def get_path_index(self, *args, **kwargs):
+        return self.image_manager.get_path_index(*args, **kwargs)
+    
+    def update_file_stats(self, *args, **kwargs):
+        return self.image_manager.update_file_stats(*args, **kwargs)
+
     def get_images_in_directory(self, *args, **kwargs):
         return self.image_manager.get_images_in_directory(*args, **kwargs)
 
@@ -36,13 +50,25 @@ class DatabaseManager:
 
     def get_all_images(self, *args, **kwargs):
         return self.image_manager.get_all_images(*args, **kwargs)
+    
+    def query_images_page(self, *args, **kwargs):
+        return self.image_manager.query_images_page(*args, **kwargs)
 
     def get_total_image_count(self, *args, **kwargs):
         return self.image_manager.get_total_image_count(*args, **kwargs)
+    
+    def get_image_counters(self, *args, **kwargs):
+        return self.image_manager.get_image_counters(*args, **kwargs)
 
     def delete_image(self, *args, **kwargs):
         return self.image_manager.delete_image(*args, **kwargs)
 
+    def delete_images_by_ids(self, *args, **kwargs):
+        return self.image_manager.delete_images_by_ids(*args, **kwargs)
+    
+    def find_image_ids_by_paths(self, *args, **kwargs):
+        return self.image_manager.find_image_ids_by_paths(*args, **kwargs)
+    
     def update_image_favorite(self, *args, **kwargs):
         return self.image_manager.update_image_favorite(*args, **kwargs)
 
@@ -55,6 +81,9 @@ class DatabaseManager:
     def update_image(self, *args, **kwargs):
         return self.image_manager.update_image(*args, **kwargs)
 
+    def bulk_upsert_images(self, *args, **kwargs):
+        return self.image_manager.bulk_upsert_images(*args, **kwargs)
+    
     def get_favorite_images(self, *args, **kwargs):
         return self.image_manager.get_favorite_images(*args, **kwargs)
 
@@ -65,4 +94,47 @@ class DatabaseManager:
         return self.image_manager.get_thumbnail(*args, **kwargs)
 
     def get_thumbnail_by_id(self, *args, **kwargs):
-        return self.image_manager.get_thumbnail_by_id(*args, **kwargs)
\ No newline at end of file
+        return self.image_manager.get_thumbnail_by_id(*args, **kwargs)
+    
+    def get_thumbnail_variant(self, *args, **kwargs):
+        return self.image_manager.get_thumbnail_variant(*args, **kwargs)
+    
+    def get_thumbnail_variants(self, *args, **kwargs):
+        return self.image_manager.get_thumbnail_variants(*args, **kwargs)
+    
+    def get_setting(self, *args, **kwargs):
+        return self.image_manager.get_setting(*args, **kwargs)
+    
+    def refresh_statistics(self, *args, **kwargs):
+        return self.image_manager.refresh_statistics(*args, **kwargs)
+    
+    def add_thumbnail_listener(self, *args, **kwargs):
+        return self.image_manager.add_thumbnail_listener(*args, **kwargs)
+    
+    def get_preview_path(self, *args, **kwargs):
+        return self.image_manager.get_preview_path(*args, **kwargs)
+    
+    def save_preview(self, *args, **kwargs):
+        return self.image_manager.save_preview(*args, **kwargs)
+    
+    def save_thumbnails(self, *args, **kwargs):
+        return self.image_manager.save_thumbnails(*args, **kwargs)
+    
+    def migrate_thumbnails(self, *args, **kwargs):
+        return self.image_manager.migrate_thumbnails(*args, **kwargs)
+    
+    def collect_thumbnail_garbage(self, *args, **kwargs):
+        return self.image_manager.collect_thumbnail_garbage(*args, **kwargs)
+    
+    # 扫描任务相关方法（代理到scan_job_manager）
+    def create_scan_job(self, *args, **kwargs):
+        return self.scan_job_manager.create_scan_job(*args, **kwargs)
+    
+    def update_scan_job(self, *args, **kwargs):
+        return self.scan_job_manager.update_scan_job(*args, **kwargs)
+    
+    def get_scan_job(self, *args, **kwargs):
+        return self.scan_job_manager.get_scan_job(*args, **kwargs)
+    
+    def get_scan_jobs(self, *args, **kwargs):
+        return self.scan_job_manager.get_scan_jobs(*args, **kwargs)
\ No newline at end of file
@@ -3,6 +3,7 @@ import json
 from typing import Any, Dict, List, Optional
 from datetime import datetime
 from .base import BaseDB
+from .counters import SCOPE_ALBUM, install_album_counters
 from exceptions import DatabaseException, ImageProcessingException
 
 
@@ -11,6 +12,7 @@ class AlbumManager(BaseDB):
     
     def __init__(self, db_path: str = None):
         super().__init__(db_path)
+        self._image_manager = None
         self.init_album_tables()
     
     def init_album_tables(self):
@@ -46,10 +48,19 @@ class AlbumManager(BaseDB):
         
         # 创建索引
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_albums_name ON albums(name)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_album_images_album ON album_images(album_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_album_images_image ON album_images(image_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_album_images_sort ON album_images(sort_order)')
+        # 按相册内排序字段取页：(album_id, 排序列, image_id) 直接给出 (排序值, id) 的游标顺序
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_album_images_album_sort ON album_images(album_id, sort_order, image_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_album_images_album_added ON album_images(album_id, added_at, image_id)')
+        # album_id单列索引已被主键 (album_id, image_id) 覆盖，sort_order单列索引被上面的复合索引取代
+        cursor.execute('DROP INDEX IF EXISTS idx_album_images_album')
+        cursor.execute('DROP INDEX IF EXISTS idx_album_images_sort')
         
+        conn.commit()
+        
+        # 相册图片计数触发器，首次创建时按现有数据回填
+        cursor.execute("BEGIN IMMEDIATE")
+        install_album_counters(cursor)
         conn.commit()
         conn.close()
     
@@ -65,7 +76,7 @@ class AlbumManager(BaseDB):
             新创建的相册ID
         """
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO albums (name, description, cover_image_id)
@@ -96,7 +107,7 @@ class AlbumManager(BaseDB):
             是否更新成功
         """
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 
                 updates = []
@@ -141,11 +152,14 @@ class AlbumManager(BaseDB):
             是否删除成功
         """
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('DELETE FROM albums WHERE id = ?', (album_id,))
+                deleted = cursor.rowcount > 0
+                # 连接未开启外键约束，级联删除不会生效，手动清理关联记录（触发器随之更新相册计数）
+                cursor.execute('DELETE FROM album_images WHERE album_id = ?', (album_id,))
                 conn.commit()
-                return cursor.rowcount > 0
+                return deleted
         except sqlite3.Error as e:
             raise DatabaseException(
                 operation="delete_album",
@@ -262,7 +276,7 @@ class AlbumManager(BaseDB):
             成功添加的图片数量
         """
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 
                 # 获取当前最大排序值
@@ -305,7 +319,7 @@ class AlbumManager(BaseDB):
             成功移除的图片数量
         """
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 
                 placeholders = ','.join(['?' for _ in image_ids])
@@ -323,6 +337,15 @@ class AlbumManager(BaseDB):
                 details={"album_id": album_id, "image_ids": image_ids}
             )
     
+    @property
+    def image_manager(self):
+        """查询相册图片用的ImageManager，与本管理器使用同一个数据库文件"""
+        if self._image_manager is None:
+            # 导入image_manager来查询相册图片
+            from .image_manager import ImageManager
+            self._image_manager = ImageManager(self.db_path)
+        return self._image_manager
+    
     def get_album_images(self, album_id: int, limit: int = None, offset: int = 0,
                         sort_by: str = "sort_order", sort_order: str = "asc") -> List[Dict[str, Any]]:
         """获取相册中的图片列表
@@ -331,22 +354,32 @@ class AlbumManager(BaseDB):
             album_id: 相册ID
             limit: 返回数量限制
             offset: 偏移量
-            sort_by: 排序字段（sort_order, album_added_at, filename, created_at, file_size）
+            sort_by: 排序字段（sort_order, album_added_at, filename, created_at, modified_at, added_at）
             sort_order: 排序方式（asc, desc）
         
         Returns:
             相册中的图片列表
         """
-        # 导入image_manager来查询相册图片
-        from .image_manager import ImageManager
-        image_manager = ImageManager()
+        return self.get_album_images_page(album_id, limit, offset, sort_by, sort_order)["images"]
+    
+    def get_album_images_page(self, album_id: int, limit: int = None, offset: int = 0,
+                              sort_by: str = "sort_order", sort_order: str = "asc",
+                              cursor: str = None) -> Dict[str, Any]:
+        """分页获取相册中的图片，参数同get_album_images
+        
+        Args:
+            cursor: 上一页返回的next_cursor，传入时忽略offset
         
-        return image_manager.query_images(
+        Returns:
+            {"images": 图片列表, "next_cursor": 下一页游标}
+        """
+        return self.image_manager.query_images_page(
             album_id=album_id,
             sort_by=sort_by,
             sort_order=sort_order,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor
         )
     
     def get_album_image_count(self, album_id: int) -> int:
@@ -356,25 +389,9 @@ class AlbumManager(BaseDB):
             album_id: 相册ID
             
         Returns:
-            相册中的图片数量
+            相册中的图片数量（读取触发器维护的计数）
         """
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT COUNT(*) 
-                    FROM album_images 
-                    WHERE album_id = ?
-                ''', (album_id,))
-                
-                result = cursor.fetchone()
-                return result[0] if result else 0
-        except sqlite3.Error as e:
-            raise DatabaseException(
-                operation="get_album_image_count",
-                message=f"获取相册图片数量失败: {str(e)}",
-                details={"album_id": album_id}
-            )
+        return self.get_counter(SCOPE_ALBUM, album_id)
     
     def update_album_image_sort_order(self, album_id: int, image_orders: List[Dict[str, int]]) -> bool:
         """更新相册中图片的排序顺序
@@ -387,7 +404,7 @@ class AlbumManager(BaseDB):
             是否更新成功
         """
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 
                 for item in image_orders:
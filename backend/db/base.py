@@ -1,7 +1,166 @@
+import logging
 import os
 import sqlite3
-from typing import Any, Dict, List, Optional
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
 from exceptions import DatabaseException
+from .counters import COUNTERS_TABLE, install_image_counters
+
+# 存储配置：扫描线程、FastAPI线程和pywebview Api线程并发访问同一个数据库文件。
+# WAL模式下读不阻塞写、写不阻塞读，长时间的批量入库不再让界面查询报"database is locked"。
+# journal_mode写入数据库文件后持久生效，在init_database中设置一次
+JOURNAL_MODE = "WAL"
+# 每个连接创建时执行一次的PRAGMA：WAL下synchronous=NORMAL只在检查点时fsync，掉电最多丢最后几个事务，不会损坏数据库
+CONNECTION_PRAGMAS = (
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16384",
+    "PRAGMA mmap_size = 268435456",
+    # INSERT OR REPLACE删除冲突行时也触发DELETE触发器，image_counters计数才不会漏减
+    "PRAGMA recursive_triggers = ON",
+)
+# 每个连接缓存的预编译语句数量，连接长期复用后跨调用生效
+CACHED_STATEMENTS = 256
+# ANALYZE时每个索引最多抽样的行数，统计信息只需反映数据分布，大图库上也能在毫秒级完成
+ANALYSIS_LIMIT = 1000
+
+# image_metadata上的复合索引：(筛选列, 排序列)，query_images按目录/收藏筛选后直接沿索引顺序取页，
+# 不再把筛选结果整体放进临时B树排序。排序列后隐含rowid（即id），正好对应 (排序值, id) 的游标顺序
+IMAGE_FILTER_COLUMNS = ("directory_path", "is_favorite", "format")
+IMAGE_SORT_COLUMNS = ("modified_at", "created_at", "filename", "added_at")
+# 被复合索引或唯一约束覆盖、不再需要的旧索引
+SUPERSEDED_INDEXES = (
+    "idx_image_metadata_directory",
+    "idx_image_metadata_favorite",
+    "idx_image_metadata_path",
+)
+
+
+class PooledConnection:
+    """连接池中的连接句柄
+    
+    行为与sqlite3.Connection一致（with语句提交/回滚），但close只回滚未提交的事务并归还连接，
+    不真正关闭，原有的 conn = get_connection() ... conn.close() 写法无需修改。
+    底层连接由ConnectionPool登记并负责关闭。
+    """
+    
+    __slots__ = ('_conn',)
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+    
+    def close(self):
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+
+class ConnectionPool:
+    """SQLite连接池：每个线程一个读写连接，外加一个由锁串行化的专用写连接
+    
+    连接在线程内长期复用，页缓存和预编译语句不再随每次调用丢弃；
+    PRAGMA只在创建连接时执行一次。同一数据库文件的各个管理类共用一个连接池。
+    池创建的每个连接都登记在_connections中（值为所属线程，写连接为None），不依赖垃圾回收关闭：
+    所属线程结束的连接在下次创建连接时关闭，close_all关闭全部连接。
+    """
+    
+    _pools: Dict[str, "ConnectionPool"] = {}
+    _pools_lock = threading.Lock()
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Dict[sqlite3.Connection, Optional[threading.Thread]] = {}
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self.stats = {'connections': 0}
+    
+    @classmethod
+    def for_path(cls, db_path: str) -> "ConnectionPool":
+        """获取数据库文件对应的连接池，不存在时创建"""
+        key = os.path.abspath(db_path)
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls._pools[key] = cls(db_path)
+            return pool
+    
+    def _connect(self, owner: threading.Thread = None) -> sqlite3.Connection:
+        """创建连接并登记到池中
+        
+        连接都以check_same_thread=False打开，close_all可以在任意线程关闭它们；
+        线程连接仍只由所属线程使用（经线程局部变量取得），写连接由写锁串行化。
+        """
+        conn = sqlite3.connect(self.db_path, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+        try:
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        with self._lock:
+            self._close_orphans()
+            self._connections[conn] = owner
+            self.stats['connections'] += 1
+        return conn
+    
+    def _close_orphans(self):
+        """关闭所属线程已结束的线程连接，调用方需持有self._lock"""
+        for conn, owner in list(self._connections.items()):
+            if owner is not None and not owner.is_alive():
+                del self._connections[conn]
+                _close_quietly(conn)
+    
+    def connection(self) -> PooledConnection:
+        """获取当前线程的连接，线程结束后由池在下次创建连接或close_all时关闭"""
+        handle = getattr(self._local, 'handle', None)
+        if handle is None:
+            handle = self._local.handle = PooledConnection(self._connect(threading.current_thread()))
+        return handle
+    
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """在专用写连接上执行一个事务：正常结束时提交，异常时回滚"""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            with self._writer:
+                yield self._writer
+    
+    def close_all(self):
+        """关闭池中登记的全部连接（用于退出和测试），之后再次使用会重新建立连接"""
+        with self._write_lock, self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+            self._writer = None
+            # 换掉线程局部变量，各线程下次取连接时重建，不会拿到已关闭的句柄
+            self._local = threading.local()
+            for conn in connections:
+                _close_quietly(conn)
+    
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, 'open': len(self._connections)}
+
+
+def _close_quietly(conn: sqlite3.Connection):
+    try:
+        conn.close()
+    except sqlite3.Error as e:
+        logging.getLogger(__name__).warning(f"关闭数据库连接失败: {str(e)}")
+
 
 class BaseDB:
     """基础数据库连接类"""
@@ -10,17 +169,27 @@ class BaseDB:
         if db_path is None:
             db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'directories.db')
         self.db_path = db_path
+        self.pool = ConnectionPool.for_path(db_path)
         self.init_database()
     
-    def get_connection(self) -> sqlite3.Connection:
-        """获取数据库连接"""
-        return sqlite3.connect(self.db_path)
+    def get_connection(self) -> PooledConnection:
+        """获取当前线程复用的数据库连接"""
+        return self.pool.connection()
+    
+    def get_write_connection(self):
+        """获取专用写连接的事务上下文，进程内的写入串行化，不再在多个连接之间争抢写锁
+        
+        用法: with self.get_write_connection() as conn: ...
+        """
+        return self.pool.writer()
     
     def init_database(self):
         """初始化数据库表结构"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
+        self.apply_storage_profile(cursor)
+        
         # 创建目录表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS directories (
@@ -48,6 +217,9 @@ class BaseDB:
                 is_favorite BOOLEAN DEFAULT 0,
                 rating REAL DEFAULT 0,
                 added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                fingerprint TEXT,
+                thumbnail_version INTEGER DEFAULT 0,
+                thumbnail_updated_at REAL,
                 FOREIGN KEY (directory_path) REFERENCES directories(path) ON DELETE CASCADE
             )
         ''')
@@ -61,6 +233,51 @@ class BaseDB:
             )
         ''')
         
+        # 创建多尺寸缩略图表（每张图片按边长存多级缩略图，旧的image_thumbnails仅作回退）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS image_thumbnail_variants (
+                image_id INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                thumbnail BLOB NOT NULL,
+                PRIMARY KEY (image_id, size),
+                FOREIGN KEY (image_id) REFERENCES image_metadata(id) ON DELETE CASCADE
+            )
+        ''')
+        
+        # 创建文件系统缩略图引用表（filesystem后端：缩略图文件按内容哈希存放，这里只记录引用）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS thumbnail_refs (
+                image_id INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (image_id, size)
+            )
+        ''')
+        
+        # 创建应用设置表（键值对）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS app_settings (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        
+        # 创建目录扫描状态表（记录每个子目录的mtime，用于增量扫描剪枝）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS directory_scan_state (
+                path TEXT PRIMARY KEY,
+                root_path TEXT NOT NULL,
+                parent_path TEXT,
+                mtime REAL,
+                scanned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 为旧版本数据库补充新增列
+        self.ensure_column(cursor, 'image_metadata', 'fingerprint', 'TEXT')
+        self.ensure_column(cursor, 'image_metadata', 'thumbnail_version', 'INTEGER DEFAULT 0')
+        self.ensure_column(cursor, 'image_metadata', 'thumbnail_updated_at', 'REAL')
+        
         # 创建旧表迁移检查
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='images'")
         if cursor.fetchone():
@@ -68,16 +285,116 @@ class BaseDB:
             self.migrate_old_table(cursor, conn)
         
         # 创建索引
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_metadata_directory ON image_metadata(directory_path)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_metadata_path ON image_metadata(file_path)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_metadata_filename ON image_metadata(filename)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_metadata_favorite ON image_metadata(is_favorite)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_metadata_modified ON image_metadata(modified_at)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_metadata_created ON image_metadata(created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_metadata_added ON image_metadata(added_at)')
+        # 评分只用于范围筛选，无法与排序列组成有序的复合索引，单列索引供count_images使用
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_metadata_rating ON image_metadata(rating)')
+        for filter_column in IMAGE_FILTER_COLUMNS:
+            for sort_column in IMAGE_SORT_COLUMNS:
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS idx_image_metadata_{filter_column}_{sort_column} '
+                    f'ON image_metadata({filter_column}, {sort_column})'
+                )
+        for index in SUPERSEDED_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS {index}')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_directory_scan_state_root ON directory_scan_state(root_path)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_thumbnail_refs_digest ON thumbnail_refs(digest)')
         
         conn.commit()
+        
+        # 计数表和触发器在同一个写事务中创建并回填，期间其他连接的写入不会漏计
+        cursor.execute("BEGIN IMMEDIATE")
+        install_image_counters(cursor)
+        conn.commit()
+        
+        # 没有统计信息时（新库或旧版本升级）先收集一次，之后由全量扫描完成时刷新
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'")
+        if not cursor.fetchone():
+            self.refresh_statistics(cursor)
+            conn.commit()
         conn.close()
     
+    def refresh_statistics(self, cursor=None):
+        """抽样收集索引统计信息（ANALYZE），让查询规划器在多个候选索引之间按数据分布选择
+        
+        图库规模变化较大后（如全量扫描完成）调用；传入cursor时在调用方的连接上执行。
+        """
+        if cursor is not None:
+            cursor.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+            cursor.execute("ANALYZE")
+            return
+        try:
+            with self.get_write_connection() as conn:
+                conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+                conn.execute("ANALYZE")
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="refresh_statistics",
+                message=f"收集统计信息失败: {str(e)}"
+            )
+    
+    def apply_storage_profile(self, cursor):
+        """设置数据库文件的日志模式，不支持WAL的文件系统（如部分网络盘）会保留原模式"""
+        cursor.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+        mode = cursor.fetchone()[0]
+        if mode.upper() != JOURNAL_MODE:
+            logging.getLogger(__name__).warning(f"数据库日志模式设置为{JOURNAL_MODE}失败，当前为{mode}: {self.db_path}")
+    
+    def get_counter(self, scope: str, key: Any = '') -> int:
+        """读取触发器维护的计数（见db/counters.py），计数行不存在时为0"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT count FROM {COUNTERS_TABLE} WHERE scope = ? AND key = ?", (scope, key))
+                row = cursor.fetchone()
+                return row[0] if row else 0
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="get_counter",
+                message=f"读取计数失败: {str(e)}",
+                details={"scope": scope, "key": key}
+            )
+    
+    def get_setting(self, key: str, default: str = None) -> Optional[str]:
+        """读取应用设置"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT value FROM app_settings WHERE key = ?", (key,))
+                row = cursor.fetchone()
+                return row[0] if row else default
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="get_setting",
+                message=f"读取设置失败: {str(e)}",
+                details={"key": key}
+            )
+    
+    def set_setting(self, key: str, value: str, cursor=None):
+        """写入应用设置，传入cursor时加入调用方的事务"""
+        sql = "INSERT OR REPLACE INTO app_settings (key, value) VALUES (?, ?)"
+        if cursor is not None:
+            cursor.execute(sql, (key, value))
+            return
+        try:
+            with self.get_write_connection() as conn:
+                conn.execute(sql, (key, value))
+                conn.commit()
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="set_setting",
+                message=f"写入设置失败: {str(e)}",
+                details={"key": key}
+            )
+    
+    def ensure_column(self, cursor, table: str, column: str, definition: str):
+        """列不存在时通过ALTER TABLE补充"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
     def migrate_old_table(self, cursor, conn):
         """从旧表迁移数据到新表结构"""
         try:
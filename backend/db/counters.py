@@ -0,0 +1,180 @@
+"""
+图片计数表 - 由SQLite触发器维护的汇总计数，侧边栏计数只需读取一张小表
+
+image_counters按 (scope, key) 存放计数：
+  - total / favorite: key为空字符串
+  - directory: key为图片的directory_path（不含子目录）
+  - rating: key为评分值
+  - album: key为相册ID
+image_metadata和album_images上的每次增删改都由触发器在同一事务中更新对应计数，
+表的大小只与目录、评分和相册的数量有关，与图库大小无关。
+"""
+
+COUNTERS_TABLE = "image_counters"
+
+SCOPE_TOTAL = "total"
+SCOPE_FAVORITE = "favorite"
+SCOPE_DIRECTORY = "directory"
+SCOPE_RATING = "rating"
+SCOPE_ALBUM = "album"
+
+# 按列值分组计数的维度：scope -> (image_metadata列, 列为NULL时归入的key)
+_IMAGE_DIMENSIONS = {
+    SCOPE_DIRECTORY: ("directory_path", "''"),
+    SCOPE_RATING: ("rating", "0"),
+}
+
+
+def _key(scope: str, row: str) -> str:
+    """维度在一行上的key表达式，row为NEW、OLD或表名"""
+    column, default = _IMAGE_DIMENSIONS[scope]
+    return f"COALESCE({row}.{column}, {default})"
+
+
+def _bump(scope: str, key: str, delta: str) -> str:
+    """触发器中给一个计数加上delta（SQL表达式），计数行不存在时创建"""
+    return (
+        f"INSERT INTO {COUNTERS_TABLE} (scope, key, count) VALUES ('{scope}', {key}, {delta}) "
+        f"ON CONFLICT(scope, key) DO UPDATE SET count = count + excluded.count;"
+    )
+
+
+def _image_row_bumps(row: str, sign: str) -> str:
+    """一行image_metadata计入（sign为空）或移出（sign为'-'）全部计数维度"""
+    return "\n".join([
+        _bump(SCOPE_TOTAL, "''", f"{sign}1"),
+        _bump(SCOPE_FAVORITE, "''", f"{sign}({row}.is_favorite IS 1)"),
+        *(_bump(scope, _key(scope, row), f"{sign}1") for scope in _IMAGE_DIMENSIONS),
+    ])
+
+
+def _image_triggers():
+    """image_metadata上的触发器：名称 -> 定义"""
+    triggers = {
+        "trg_image_counters_insert": f'''
+            CREATE TRIGGER trg_image_counters_insert AFTER INSERT ON image_metadata
+            BEGIN
+                {_image_row_bumps("NEW", "")}
+            END
+        ''',
+        "trg_image_counters_delete": f'''
+            CREATE TRIGGER trg_image_counters_delete AFTER DELETE ON image_metadata
+            BEGIN
+                {_image_row_bumps("OLD", "-")}
+            END
+        ''',
+        # 收藏状态变化：只在真正变化时触发，批量upsert重复写入相同值时不产生额外写入
+        "trg_image_counters_favorite": f'''
+            CREATE TRIGGER trg_image_counters_favorite AFTER UPDATE OF is_favorite ON image_metadata
+            WHEN (OLD.is_favorite IS 1) IS NOT (NEW.is_favorite IS 1)
+            BEGIN
+                {_bump(SCOPE_FAVORITE, "''", "(NEW.is_favorite IS 1) - (OLD.is_favorite IS 1)")}
+            END
+        ''',
+    }
+    for scope, (column, _) in _IMAGE_DIMENSIONS.items():
+        triggers[f"trg_image_counters_{scope}"] = f'''
+            CREATE TRIGGER trg_image_counters_{scope} AFTER UPDATE OF {column} ON image_metadata
+            WHEN {_key(scope, "OLD")} IS NOT {_key(scope, "NEW")}
+            BEGIN
+                {_bump(scope, _key(scope, "OLD"), "-1")}
+                {_bump(scope, _key(scope, "NEW"), "1")}
+            END
+        '''
+    return triggers
+
+
+ALBUM_TRIGGERS = {
+    "trg_album_counters_insert": f'''
+        CREATE TRIGGER trg_album_counters_insert AFTER INSERT ON album_images
+        BEGIN
+            {_bump(SCOPE_ALBUM, "NEW.album_id", "1")}
+        END
+    ''',
+    "trg_album_counters_delete": f'''
+        CREATE TRIGGER trg_album_counters_delete AFTER DELETE ON album_images
+        BEGIN
+            {_bump(SCOPE_ALBUM, "OLD.album_id", "-1")}
+        END
+    ''',
+    "trg_album_counters_move": f'''
+        CREATE TRIGGER trg_album_counters_move AFTER UPDATE OF album_id ON album_images
+        WHEN OLD.album_id IS NOT NEW.album_id
+        BEGIN
+            {_bump(SCOPE_ALBUM, "OLD.album_id", "-1")}
+            {_bump(SCOPE_ALBUM, "NEW.album_id", "1")}
+        END
+    ''',
+}
+
+IMAGE_TRIGGERS = _image_triggers()
+
+# 从现有数据重建计数（首次创建触发器时回填）
+_IMAGE_BACKFILL = (
+    f"INSERT INTO {COUNTERS_TABLE} (scope, key, count) "
+    f"SELECT '{SCOPE_TOTAL}', '', COUNT(*) FROM image_metadata",
+    f"INSERT INTO {COUNTERS_TABLE} (scope, key, count) "
+    f"SELECT '{SCOPE_FAVORITE}', '', COUNT(*) FROM image_metadata WHERE is_favorite IS 1",
+    *(
+        f"INSERT INTO {COUNTERS_TABLE} (scope, key, count) "
+        f"SELECT '{scope}', {_key(scope, 'image_metadata')}, COUNT(*) FROM image_metadata GROUP BY 2"
+        for scope in _IMAGE_DIMENSIONS
+    ),
+)
+_ALBUM_BACKFILL = (
+    f"INSERT INTO {COUNTERS_TABLE} (scope, key, count) "
+    f"SELECT '{SCOPE_ALBUM}', album_id, COUNT(*) FROM album_images GROUP BY album_id",
+)
+
+
+def create_counters_table(cursor):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {COUNTERS_TABLE} (
+            scope TEXT NOT NULL,
+            key NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, key)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _install(cursor, triggers, scopes, backfill) -> bool:
+    """创建缺失的触发器；有触发器缺失时（新库或旧版本升级）按现有数据重建这些维度的计数
+    
+    需在调用方开启的写事务中执行，回填与触发器生效之间不会漏掉写入。
+    
+    Returns:
+        是否进行了回填
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_%_counters_%'")
+    existing = {row[0] for row in cursor.fetchall()}
+    missing = [name for name in triggers if name not in existing]
+    if not missing:
+        return False
+    
+    # 部分触发器缺失时计数已不可信，整组重建
+    for name in triggers:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    placeholders = ",".join("?" * len(scopes))
+    cursor.execute(f"DELETE FROM {COUNTERS_TABLE} WHERE scope IN ({placeholders})", scopes)
+    for sql in backfill:
+        cursor.execute(sql)
+    for sql in triggers.values():
+        cursor.execute(sql)
+    return True
+
+
+def install_image_counters(cursor) -> bool:
+    """创建计数表和image_metadata上的计数触发器"""
+    create_counters_table(cursor)
+    return _install(
+        cursor, IMAGE_TRIGGERS,
+        (SCOPE_TOTAL, SCOPE_FAVORITE, *_IMAGE_DIMENSIONS),
+        _IMAGE_BACKFILL
+    )
+
+
+def install_album_counters(cursor) -> bool:
+    """创建album_images上的计数触发器"""
+    create_counters_table(cursor)
+    return _install(cursor, ALBUM_TRIGGERS, (SCOPE_ALBUM,), _ALBUM_BACKFILL)
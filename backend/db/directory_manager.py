@@ -1,7 +1,8 @@
 import sqlite3
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from .base import BaseDB
+from exceptions import DatabaseException
 
 class DirectoryManager(BaseDB):
     """目录管理类"""
@@ -9,7 +10,7 @@ class DirectoryManager(BaseDB):
     def save_directory(self, dir_path: str, dir_name: str) -> bool:
         """保存目录到数据库"""
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     "INSERT OR IGNORE INTO directories (path, name) VALUES (?, ?)",
@@ -35,7 +36,7 @@ class DirectoryManager(BaseDB):
     def remove_directory(self, directory_path: str) -> Dict[str, Any]:
         """从数据库中移除目录记录"""
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM directories WHERE path = ?", (directory_path,))
                 deleted_count = cursor.rowcount
@@ -57,4 +58,54 @@ class DirectoryManager(BaseDB):
                 cursor.execute("SELECT 1 FROM directories WHERE path = ?", (directory_path,))
                 return cursor.fetchone() is not None
         except Exception:
-            return False
\ No newline at end of file
+            return False
+    
+    def get_directory_states(self, root_path: str) -> Dict[str, Tuple[Optional[str], float]]:
+        """获取根目录下所有子目录上次扫描时记录的mtime
+        
+        Returns:
+            path -> (parent_path, mtime) 的映射
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT path, parent_path, mtime FROM directory_scan_state WHERE root_path = ?",
+                    (root_path,)
+                )
+                return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="get_directory_states",
+                message=f"获取目录扫描状态失败: {str(e)}",
+                details={"root_path": root_path}
+            )
+    
+    def save_directory_states(self, root_path: str, states: Dict[str, Tuple[Optional[str], float]],
+                              removed_paths: List[str] = None) -> bool:
+        """保存根目录下子目录的mtime，并清除已不存在的目录记录"""
+        try:
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO directory_scan_state (path, root_path, parent_path, mtime, scanned_at)
+                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(path) DO UPDATE SET
+                        root_path = excluded.root_path,
+                        parent_path = excluded.parent_path,
+                        mtime = excluded.mtime,
+                        scanned_at = excluded.scanned_at
+                ''', [(path, root_path, parent_path, mtime) for path, (parent_path, mtime) in states.items()])
+                if removed_paths:
+                    cursor.executemany(
+                        "DELETE FROM directory_scan_state WHERE path = ?",
+                        [(path,) for path in removed_paths]
+                    )
+                conn.commit()
+            return True
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="save_directory_states",
+                message=f"保存目录扫描状态失败: {str(e)}",
+                details={"root_path": root_path, "count": len(states)}
+            )
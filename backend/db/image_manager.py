@@ -1,11 +1,30 @@
 import json
+import logging
 import os
 import sqlite3
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from .base import BaseDB
-from exceptions import DatabaseException, ImageProcessingException
+from .counters import COUNTERS_TABLE, SCOPE_ALBUM, SCOPE_DIRECTORY, SCOPE_FAVORITE, SCOPE_RATING, SCOPE_TOTAL
+from .pagination import decode_cursor, encode_cursor, query_scope
+from .preview_store import PreviewStore
+from .thumbnail_store import BACKEND_SQLITE, LEGACY_THUMBNAIL_SIZE, create_thumbnail_stores
+from exceptions import DatabaseException, ImageProcessingException, ValidationException
+from image_utils import DEFAULT_THUMBNAIL_SIZE
+
+# 可排序字段白名单：排序参数 -> SQL表达式，每个字段都有对应的（复合）索引，见base.IMAGE_SORT_COLUMNS
+IMAGE_SORT_FIELDS = {
+    "filename": "m.filename",
+    "created_at": "m.created_at",
+    "modified_at": "m.modified_at",
+    "added_at": "m.added_at"
+}
+# 查询相册图片时额外可用的排序字段，由album_images上的 (album_id, 排序列, image_id) 索引提供顺序
+ALBUM_SORT_FIELDS = {
+    "sort_order": "ai.sort_order",
+    "album_added_at": "ai.added_at"
+}
 
 class ImageManager(BaseDB):
     """图片管理类"""
@@ -21,6 +40,18 @@ class ImageManager(BaseDB):
             project_root = os.path.dirname(os.path.dirname(current_dir))
             db_path = os.path.join(project_root, 'directories.db')
         super().__init__(db_path)
+        
+        # 缩略图存储后端：写入当前后端，读取时当前后端未命中再查其他后端（迁移过程中两边都可能有数据）
+        default_root = os.path.join(os.path.dirname(os.path.abspath(db_path)), 'thumbnails')
+        self.thumbnail_stores = create_thumbnail_stores(self.get_setting('thumbnail_root', default_root))
+        self.thumbnail_backend = self.get_setting('thumbnail_backend', BACKEND_SQLITE)
+        if self.thumbnail_backend not in self.thumbnail_stores:
+            self.thumbnail_backend = BACKEND_SQLITE
+        self._thumbnail_listeners: List[Callable[[List[int]], None]] = []
+        
+        # 查看器使用的显示预览图，与缩略图一样按版本号失效
+        default_preview_root = os.path.join(os.path.dirname(os.path.abspath(db_path)), 'previews')
+        self.preview_store = PreviewStore(self.get_setting('preview_root', default_preview_root))
     
     def add_image(self, filename: str, file_path: str, file_size: int = None, 
                   created_at: datetime = None, modified_at: datetime = None,
@@ -30,7 +61,7 @@ class ImageManager(BaseDB):
 
         """添加图片到数据库"""
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 exif_json = json.dumps(exif_data) if exif_data else None
                 
@@ -48,14 +79,13 @@ class ImageManager(BaseDB):
                 # 获取插入的ID
                 image_id = cursor.lastrowid
                 
-                # 插入缩略图到image_thumbnails表
+                # 写入缩略图
+                released = {}
                 if thumbnail:
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO image_thumbnails (image_id, thumbnail)
-                        VALUES (?, ?)
-                    ''', (image_id, thumbnail))
+                    released = self._save_thumbnails(cursor, [(image_id, LEGACY_THUMBNAIL_SIZE, thumbnail)])
                 
                 conn.commit()
+            self._release_thumbnails(released, [image_id])
             return True
         except sqlite3.Error as e:
             raise DatabaseException(
@@ -87,12 +117,8 @@ class ImageManager(BaseDB):
                     image_id = row[0]
                     
                     # 获取缩略图
-                    cursor.execute('''
-                        SELECT thumbnail FROM image_thumbnails
-                        WHERE image_id = ?
-                    ''', (image_id,))
-                    thumbnail_row = cursor.fetchone()
-                    thumbnail = thumbnail_row[0] if thumbnail_row else None
+                    selected = self._select_thumbnail(cursor, image_id)
+                    thumbnail = selected[0] if selected else None
                     
                     return {
                         "id": image_id,
@@ -118,6 +144,70 @@ class ImageManager(BaseDB):
                 details={"file_path": file_path}
             )
     
+    def get_path_index(self, directory_path: str = None,
+                       recursive: bool = False) -> Dict[str, Tuple[int, int, float, Optional[str]]]:
+        """一次查询加载扫描用的路径索引
+        
+        只读取变化检测需要的列，不读取缩略图和EXIF。
+        
+        Args:
+            directory_path: 只加载该目录下的记录，为None时加载全部
+            recursive: 是否包含子目录中的记录
+        
+        Returns:
+            file_path -> (id, file_size, modified_at, fingerprint) 的映射
+        """
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                query = 'SELECT file_path, id, file_size, modified_at, fingerprint FROM image_metadata'
+                params = []
+                if directory_path is not None:
+                    if recursive:
+                        prefix = directory_path.rstrip(os.sep) + os.sep
+                        query += ' WHERE directory_path = ? OR substr(directory_path, 1, ?) = ?'
+                        params = [directory_path, len(prefix), prefix]
+                    else:
+                        query += ' WHERE directory_path = ?'
+                        params = [directory_path]
+                cursor.execute(query, params)
+                return {
+                    row[0]: (row[1], row[2] or 0, row[3] or 0, row[4])
+                    for row in cursor.fetchall()
+                }
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="get_path_index",
+                message=f"加载路径索引失败: {str(e)}"
+            )
+    
+    def update_file_stats(self, rows: List[Tuple[int, float, str]]) -> int:
+        """批量刷新内容未变化文件的大小和修改时间
+        
+        Args:
+            rows: (file_size, modified_at, file_path) 列表
+        
+        Returns:
+            更新的记录数量
+        """
+        if not rows:
+            return 0
+        try:
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    'UPDATE image_metadata SET file_size = ?, modified_at = ? WHERE file_path = ?',
+                    rows
+                )
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="update_file_stats",
+                message=f"刷新文件状态失败: {str(e)}",
+                details={"count": len(rows)}
+            )
+    
     def get_images_in_directory(self, directory_path: str, limit: int = None, offset: int = 0,
                                sort_by: str = "modified_at", sort_order: str = "desc") -> List[Dict[str, Any]]:
         """获取指定目录下的所有图片（不包括子目录） - 支持分页和排序
@@ -133,11 +223,8 @@ class ImageManager(BaseDB):
         )
 
     def get_image_count_in_directory(self, directory_path: str) -> int:
-        """获取指定目录下的图片总数（不包括子目录）
-        
-        注意：此方法已重构为使用count_images通用计数函数
-        """
-        return self.count_images(directory_path=directory_path)
+        """获取指定目录下的图片总数（不包括子目录），读取触发器维护的计数"""
+        return self.get_counter(SCOPE_DIRECTORY, directory_path)
     
     def get_all_images(self, limit: int = None, offset: int = 0,
                       sort_by: str = "modified_at", sort_order: str = "desc") -> List[Dict[str, Any]]:
@@ -153,16 +240,43 @@ class ImageManager(BaseDB):
         )
 
     def get_total_image_count(self) -> int:
-        """获取所有图片的总数
+        """获取所有图片的总数，读取触发器维护的计数"""
+        return self.get_counter(SCOPE_TOTAL)
+    
+    def get_image_counters(self) -> Dict[str, Any]:
+        """一次读取全部计数：总数、收藏数，以及按目录、评分、相册的图片数
+        
+        计数由触发器随写入同步更新（见db/counters.py），读取开销与图库大小无关。
         
-        注意：此方法已重构为使用count_images通用计数函数
+        Returns:
+            {"total", "favorites", "directories": {路径: 数量}, "ratings": {评分: 数量}, "albums": {相册ID: 数量}}
         """
-        return self.count_images()
+        counters = {"total": 0, "favorites": 0, "directories": {}, "ratings": {}, "albums": {}}
+        groups = {SCOPE_DIRECTORY: "directories", SCOPE_RATING: "ratings", SCOPE_ALBUM: "albums"}
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT scope, key, count FROM {COUNTERS_TABLE} WHERE count != 0")
+                for scope, key, count in cursor.fetchall():
+                    if scope == SCOPE_TOTAL:
+                        counters["total"] = count
+                    elif scope == SCOPE_FAVORITE:
+                        counters["favorites"] = count
+                    elif scope in groups:
+                        if scope == SCOPE_RATING and float(key).is_integer():
+                            key = int(key)
+                        counters[groups[scope]][key] = count
+            return counters
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="get_image_counters",
+                message=f"读取图片计数失败: {str(e)}"
+            )
     
     def delete_image(self, file_path: str) -> bool:
         """从数据库中删除图片"""
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 
                 # 先获取图片ID
@@ -174,13 +288,14 @@ class ImageManager(BaseDB):
                 image_id = row[0]
                 
                 # 删除缩略图
-                cursor.execute("DELETE FROM image_thumbnails WHERE image_id = ?", (image_id,))
+                released = self._delete_thumbnails(cursor, [image_id])
                 
                 # 删除基础信息
                 cursor.execute("DELETE FROM image_metadata WHERE id = ?", (image_id,))
                 
                 conn.commit()
-                return True
+            self._release_thumbnails(released, [image_id])
+            return True
         except sqlite3.Error as e:
             raise DatabaseException(
                 operation="delete_image",
@@ -188,10 +303,71 @@ class ImageManager(BaseDB):
                 details={"file_path": file_path}
             )
     
+    def delete_images_by_ids(self, image_ids: List[int], chunk_size: int = 500) -> int:
+        """批量删除图片记录及其缩略图和相册关联，在单个事务内完成
+        
+        Args:
+            image_ids: 要删除的图片ID列表
+            chunk_size: 每条 DELETE ... WHERE id IN (...) 语句的参数数量
+        
+        Returns:
+            删除的图片记录数量
+        """
+        if not image_ids:
+            return 0
+        
+        try:
+            removed = 0
+            released = {}
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                for i in range(0, len(image_ids), chunk_size):
+                    chunk = list(image_ids[i:i + chunk_size])
+                    placeholders = ','.join('?' * len(chunk))
+                    self._merge_released(released, self._delete_thumbnails(cursor, chunk))
+                    cursor.execute(f"DELETE FROM album_images WHERE image_id IN ({placeholders})", chunk)
+                    cursor.execute(
+                        f"UPDATE albums SET cover_image_id = NULL WHERE cover_image_id IN ({placeholders})",
+                        chunk
+                    )
+                    cursor.execute(f"DELETE FROM image_metadata WHERE id IN ({placeholders})", chunk)
+                    removed += cursor.rowcount
+                conn.commit()
+            self._release_thumbnails(released, image_ids)
+            return removed
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="delete_images_by_ids",
+                message=f"批量删除图片失败: {str(e)}",
+                details={"count": len(image_ids)}
+            )
+    
+    def find_image_ids_by_paths(self, paths: List[str]) -> List[int]:
+        """查找路径对应的图片ID，路径为目录时包含其下（含子目录）的所有图片"""
+        try:
+            image_ids = []
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                for path in paths:
+                    prefix = path.rstrip(os.sep) + os.sep
+                    cursor.execute('''
+                        SELECT id FROM image_metadata
+                        WHERE file_path = ? OR directory_path = ?
+                           OR substr(directory_path, 1, ?) = ?
+                    ''', (path, path, len(prefix), prefix))
+                    image_ids.extend(row[0] for row in cursor.fetchall())
+            return image_ids
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="find_image_ids_by_paths",
+                message=f"按路径查找图片失败: {str(e)}",
+                details={"count": len(paths)}
+            )
+    
     def update_image_favorite(self, image_id: int, is_favorite: bool) -> bool:
         """更新图片收藏状态"""
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('UPDATE image_metadata SET is_favorite = ? WHERE id = ?', (int(is_favorite), image_id))
                 conn.commit()
@@ -206,7 +382,7 @@ class ImageManager(BaseDB):
     def toggle_favorite(self, image_id: int) -> bool:
         """切换图片收藏状态"""
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 # 先获取当前收藏状态
                 cursor.execute('SELECT is_favorite FROM image_metadata WHERE id = ?', (image_id,))
@@ -230,7 +406,7 @@ class ImageManager(BaseDB):
         """更新图片评分（仅更新数据库）"""
         try:
             # 更新数据库
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('UPDATE image_metadata SET rating = ? WHERE id = ?', (rating, image_id))
                 conn.commit()
@@ -252,7 +428,7 @@ class ImageManager(BaseDB):
     def update_image(self, file_path: str, image_data: Dict[str, Any]) -> bool:
         """更新图片信息"""
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 cursor = conn.cursor()
                 exif_json = json.dumps(image_data.get('exif_data', {})) if image_data.get('exif_data') else None
                 
@@ -306,15 +482,16 @@ class ImageManager(BaseDB):
                     image_id
                 ))
                 
-                # 更新缩略图（如果提供了新的缩略图）
+                # 更新缩略图（如果提供了新的缩略图），旧的多尺寸缩略图随之失效
+                released = {}
                 if image_data.get('thumbnail'):
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO image_thumbnails (image_id, thumbnail)
-                        VALUES (?, ?)
-                    ''', (image_id, image_data.get('thumbnail')))
+                    released = self._save_thumbnails(
+                        cursor, [(image_id, LEGACY_THUMBNAIL_SIZE, image_data.get('thumbnail'))]
+                    )
                 
                 conn.commit()
-                return True
+            self._release_thumbnails(released, [image_id])
+            return True
         except sqlite3.Error as e:
             raise DatabaseException(
                 operation="update_image",
@@ -328,6 +505,106 @@ class ImageManager(BaseDB):
                 details={"file_path": file_path}
             )
     
+    def bulk_upsert_images(self, records: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+        """批量插入或更新图片及其缩略图，在单个事务内完成
+        
+        已存在的记录按file_path原地更新，保留id、收藏状态和评分；
+        记录中未提供缩略图时保留数据库中已有的缩略图。
+        
+        Args:
+            records: 图片数据列表，字段与add_image参数一致，
+                     多尺寸缩略图放在thumbnails字段（{边长: JPEG数据}）
+            chunk_size: 按路径回查图片ID时每条IN语句的参数数量
+        
+        Returns:
+            写入的记录数量
+        """
+        if not records:
+            return 0
+        
+        try:
+            metadata_rows = [
+                (
+                    record.get('filename'),
+                    record['file_path'],
+                    record.get('file_size'),
+                    record.get('created_at'),
+                    record.get('modified_at'),
+                    json.dumps(record['exif_data']) if record.get('exif_data') else None,
+                    record.get('directory_path'),
+                    record.get('width'),
+                    record.get('height'),
+                    record.get('format'),
+                    record.get('fingerprint')
+                )
+                for record in records
+            ]
+            thumbnails = {record['file_path']: record['thumbnail'] for record in records if record.get('thumbnail')}
+            variants = {record['file_path']: record['thumbnails'] for record in records if record.get('thumbnails')}
+            
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO image_metadata
+                    (filename, file_path, file_size, created_at, modified_at,
+                     exif_data, directory_path, width, height, format, fingerprint)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(file_path) DO UPDATE SET
+                        filename = excluded.filename,
+                        file_size = excluded.file_size,
+                        created_at = excluded.created_at,
+                        modified_at = excluded.modified_at,
+                        exif_data = excluded.exif_data,
+                        directory_path = excluded.directory_path,
+                        width = excluded.width,
+                        height = excluded.height,
+                        format = excluded.format,
+                        fingerprint = excluded.fingerprint
+                ''', metadata_rows)
+                
+                # 回查图片ID后批量写入缩略图
+                released = {}
+                thumbnail_rows = []
+                if thumbnails or variants:
+                    paths = list(thumbnails.keys() | variants.keys())
+                    path_ids = {}
+                    for i in range(0, len(paths), chunk_size):
+                        chunk = paths[i:i + chunk_size]
+                        placeholders = ','.join('?' * len(chunk))
+                        cursor.execute(
+                            f"SELECT id, file_path FROM image_metadata WHERE file_path IN ({placeholders})",
+                            chunk
+                        )
+                        path_ids.update((row[1], row[0]) for row in cursor.fetchall())
+                    
+                    # 多尺寸缩略图整体替换，只有旧版单张缩略图的记录按其生成时的边长存储
+                    thumbnail_rows = [
+                        (path_ids[path], size, data)
+                        for path, sizes in variants.items() if path in path_ids
+                        for size, data in sizes.items()
+                    ]
+                    thumbnail_rows.extend(
+                        (path_ids[path], LEGACY_THUMBNAIL_SIZE, data)
+                        for path, data in thumbnails.items() if path in path_ids and path not in variants
+                    )
+                    released = self._save_thumbnails(cursor, thumbnail_rows)
+                
+                conn.commit()
+            self._release_thumbnails(released, {row[0] for row in thumbnail_rows})
+            return len(records)
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="bulk_upsert_images",
+                message=f"批量写入图片失败: {str(e)}",
+                details={"count": len(records)}
+            )
+        except (TypeError, ValueError) as e:
+            raise ImageProcessingException(
+                operation="serialize_exif",
+                message=f"EXIF数据序列化失败: {str(e)}",
+                details={"count": len(records)}
+            )
+    
     def get_favorite_images(self) -> List[Dict[str, Any]]:
         """获取收藏的图片
         
@@ -349,7 +626,8 @@ class ImageManager(BaseDB):
                     sort_order: str = "desc",
                     min_rating: int = None,
                     max_rating: int = None,
-                    format_filter: str = None) -> List[Dict[str, Any]]:
+                    format_filter: str = None,
+                    cursor: str = None) -> List[Dict[str, Any]]:
         """通用图片查询函数 - 支持多种筛选条件
         
         Args:
@@ -357,36 +635,95 @@ class ImageManager(BaseDB):
             is_favorite: 收藏状态筛选，为None时不限制
             album_id: 相册ID筛选，为None时不限制
             limit: 返回数量限制，为None时不限制
-            offset: 偏移量，默认为0
-            sort_by: 排序字段，默认为modified_at
+            offset: 偏移量，默认为0（传入cursor时忽略）
+            sort_by: 排序字段，默认为modified_at，可选字段见IMAGE_SORT_FIELDS/ALBUM_SORT_FIELDS
             sort_order: 排序顺序，默认为desc
             min_rating: 最小评分筛选，为None时不限制
             max_rating: 最大评分筛选，为None时不限制
             format_filter: 图片格式筛选，为None时不限制
+            cursor: 上一页返回的next_cursor，传入时从该位置继续
             
         Returns:
             符合条件的图片列表
         """
+        return self.query_images_page(
+            directory_path=directory_path, is_favorite=is_favorite, album_id=album_id,
+            limit=limit, offset=offset, sort_by=sort_by, sort_order=sort_order,
+            min_rating=min_rating, max_rating=max_rating, format_filter=format_filter,
+            cursor=cursor
+        )["images"]
+    
+    def query_images_page(self, 
+                          directory_path: str = None,
+                          is_favorite: bool = None,
+                          album_id: int = None,
+                          limit: int = None,
+                          offset: int = 0,
+                          sort_by: str = "modified_at",
+                          sort_order: str = "desc",
+                          min_rating: int = None,
+                          max_rating: int = None,
+                          format_filter: str = None,
+                          cursor: str = None) -> Dict[str, Any]:
+        """分页查询图片，参数同query_images，额外返回下一页的游标
+        
+        按 (排序字段, id) 排序，传入cursor时用 (排序值, id) 直接定位到上一页末尾（keyset分页），
+        翻到多深都只读取当页的行；不传cursor时仍按offset分页，用于第一页和兼容旧调用。
+        
+        Returns:
+            {"images": 图片列表, "next_cursor": 下一页游标，没有更多数据或未设置limit时为None}
+        """
+        sort_order = (sort_order or "desc").lower()
+        if sort_order not in ("asc", "desc"):
+            raise ValidationException(
+                field="sort_order",
+                message="排序顺序只能是asc或desc",
+                details={"sort_order": sort_order}
+            )
+        if album_id is not None and sort_by in ALBUM_SORT_FIELDS:
+            # 当查询相册图片时，支持相册特定的排序字段；次排序键用ai.image_id（与m.id相等），顺序由相册索引直接给出
+            order_field = ALBUM_SORT_FIELDS[sort_by]
+            id_field = "ai.image_id"
+        elif sort_by in IMAGE_SORT_FIELDS:
+            # 默认使用image_metadata表的字段排序
+            order_field = IMAGE_SORT_FIELDS[sort_by]
+            id_field = "m.id"
+        else:
+            raise ValidationException(
+                field="sort_by",
+                message="不支持的排序字段",
+                details={"sort_by": sort_by, "allowed": sorted(IMAGE_SORT_FIELDS)}
+            )
+        scope = query_scope(
+            directory_path=directory_path,
+            is_favorite=None if is_favorite is None else int(is_favorite),
+            album_id=album_id,
+            min_rating=min_rating,
+            max_rating=max_rating,
+            format_filter=format_filter
+        )
+        seek = decode_cursor(cursor, sort_by, sort_order, scope) if cursor else None
+        
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor()
+                db_cursor = conn.cursor()
                 
-                # 基础查询
+                # 基础查询，末列为排序值，用于生成游标
                 if album_id is not None:
-                    query = '''
+                    query = f'''
                         SELECT m.id, m.filename, m.file_path, m.file_size, m.created_at, m.modified_at,
                                m.exif_data, m.directory_path, m.width, m.height,
-                               m.format, m.is_favorite, m.rating, m.added_at,
-                               ai.added_at as album_added_at, ai.sort_order
+                               m.format, m.is_favorite, m.rating, m.added_at, m.thumbnail_version,
+                               ai.added_at as album_added_at, ai.sort_order, {order_field}
                         FROM image_metadata m
                         JOIN album_images ai ON m.id = ai.image_id
                     '''
                 else:
-                    query = '''
+                    query = f'''
                         SELECT m.id, m.filename, m.file_path, m.file_size, m.created_at, m.modified_at,
                                m.exif_data, m.directory_path, m.width, m.height,
-                               m.format, m.is_favorite, m.rating, m.added_at,
-                               NULL as album_added_at, NULL as sort_order
+                               m.format, m.is_favorite, m.rating, m.added_at, m.thumbnail_version,
+                               NULL as album_added_at, NULL as sort_order, {order_field}
                         FROM image_metadata m
                     '''
                 
@@ -406,45 +743,56 @@ class ImageManager(BaseDB):
                     conditions.append("m.is_favorite = ?")
                     params.append(int(is_favorite))
                 
+                # 评分范围用一元+号排除评分索引：评分只有0-5几个取值，范围筛选命中大量行，
+                # 沿排序索引取页再逐行过滤比按评分索引取出全部匹配行后临时排序快得多
                 if min_rating is not None:
-                    conditions.append("m.rating >= ?")
+                    conditions.append("+m.rating >= ?")
                     params.append(min_rating)
                 
                 if max_rating is not None:
-                    conditions.append("m.rating <= ?")
+                    conditions.append("+m.rating <= ?")
                     params.append(max_rating)
                 
                 if format_filter is not None:
                     conditions.append("m.format = ?")
                     params.append(format_filter)
                 
-                if conditions:
-                    query += " WHERE " + " AND ".join(conditions)
+                # id作为第二排序键，保证排序值相同的行顺序稳定，游标位置唯一
+                order_by = f" ORDER BY {order_field} {sort_order.upper()}, {id_field} {sort_order.upper()}"
                 
-                # 添加排序
-                if album_id is not None and sort_by in ["sort_order", "album_added_at"]:
-                    # 当查询相册图片时，支持相册特定的排序字段
-                    if sort_by == "sort_order":
-                        order_field = "ai.sort_order"
-                    elif sort_by == "album_added_at":
-                        order_field = "ai.added_at"
-                    else:
-                        order_field = f"m.{sort_by}"
+                rows = []
+                if seek is None:
+                    sql = query + (" WHERE " + " AND ".join(conditions) if conditions else "") + order_by
+                    page_params = list(params)
+                    if limit is not None and limit > 0:
+                        sql += " LIMIT ? OFFSET ?"
+                        page_params.extend([limit, offset])
+                    db_cursor.execute(sql, page_params)
+                    rows = db_cursor.fetchall()
                 else:
-                    # 默认使用image_metadata表的字段排序
-                    order_field = f"m.{sort_by}"
-                
-                query += f" ORDER BY {order_field} {sort_order.upper()}"
-                
-                # 添加分页
-                if limit is not None and limit > 0:
-                    query += " LIMIT ? OFFSET ?"
-                    params.extend([limit, offset])
-                
-                cursor.execute(query, params)
+                    # SQLite中NULL小于任何值：升序时NULL段在前，降序时在后。
+                    # 两段分别查询，每段都是索引上的一次范围扫描，当前段不够一页时再接着查下一段
+                    value, last_id = seek
+                    op = '<' if sort_order == 'desc' else '>'
+                    if value is None:
+                        segments = [(f"{order_field} IS NULL AND {id_field} {op} ?", [last_id])]
+                        if sort_order == 'asc':
+                            segments.append((f"{order_field} IS NOT NULL", []))
+                    else:
+                        segments = [(f"({order_field}, {id_field}) {op} (?, ?)", [value, last_id])]
+                        if sort_order == 'desc':
+                            segments.append((f"{order_field} IS NULL", []))
+                    
+                    for condition, seek_params in segments:
+                        remaining = limit - len(rows) if limit is not None and limit > 0 else -1
+                        if remaining == 0:
+                            break
+                        sql = query + " WHERE " + " AND ".join(conditions + [condition]) + order_by + " LIMIT ?"
+                        db_cursor.execute(sql, params + seek_params + [remaining])
+                        rows.extend(db_cursor.fetchall())
                 
                 images = []
-                for row in cursor.fetchall():
+                for row in rows:
                     image_data = {
                         "id": row[0],
                         "filename": row[1], 
@@ -452,7 +800,8 @@ class ImageManager(BaseDB):
                         "file_size": row[3],
                         "created_at": row[4], 
                         "modified_at": row[5], 
-                        "thumbnail_url": f"/api/thumbnail/{row[0]}",
+                        "thumbnail_url": f"/api/thumbnail/{row[0]}?v={row[14] or 0}",
+                        "thumbnail_version": row[14] or 0,
                         "exif_data": json.loads(row[6]) if row[6] else {},
                         "directory_path": row[7], 
                         "width": row[8], 
@@ -466,13 +815,17 @@ class ImageManager(BaseDB):
                     # 如果查询的是相册图片，添加相册相关信息
                     if album_id is not None:
                         image_data.update({
-                            "album_added_at": row[14],
-                            "sort_order": row[15]
+                            "album_added_at": row[15],
+                            "sort_order": row[16]
                         })
                     
                     images.append(image_data)
                 
-                return images
+                next_cursor = None
+                if limit is not None and limit > 0 and len(rows) == limit:
+                    next_cursor = encode_cursor(sort_by, sort_order, scope, rows[-1][17], rows[-1][0])
+                
+                return {"images": images, "next_cursor": next_cursor}
                 
         except sqlite3.Error as e:
             details = {
@@ -480,6 +833,7 @@ class ImageManager(BaseDB):
                 "is_favorite": is_favorite,
                 "limit": limit,
                 "offset": offset,
+                "cursor": cursor,
                 "sort_by": sort_by,
                 "sort_order": sort_order
             }
@@ -508,7 +862,7 @@ class ImageManager(BaseDB):
         Args:
             directory_path: 指定目录路径，为None时不限制
             is_favorite: 收藏状态筛选，为None时不限制
-            album_id: 相册ID筛选，为None时不限制（预留参数，当前版本未实现）
+            album_id: 相册ID筛选，为None时不限制
             min_rating: 最小评分筛选，为None时不限制
             max_rating: 最大评分筛选，为None时不限制
             format_filter: 图片格式筛选，为None时不限制
@@ -530,6 +884,11 @@ class ImageManager(BaseDB):
                 conditions = []
                 params = []
                 
+                if album_id is not None:
+                    query += " JOIN album_images ai ON m.id = ai.image_id"
+                    conditions.append("ai.album_id = ?")
+                    params.append(album_id)
+                
                 if directory_path is not None:
                     conditions.append("m.directory_path = ?")
                     params.append(directory_path)
@@ -578,7 +937,7 @@ class ImageManager(BaseDB):
                 cursor.execute('''
                     SELECT id, filename, file_path, file_size, created_at, modified_at, 
                            exif_data, directory_path, width, height, 
-                           format, is_favorite, rating, added_at
+                           format, is_favorite, rating, added_at, thumbnail_version
                     FROM image_metadata WHERE id = ?
                 ''', (image_id,))
                 
@@ -588,7 +947,8 @@ class ImageManager(BaseDB):
                         "id": row[0],
                         "filename": row[1], "file_path": row[2], "file_size": row[3],
                         "created_at": row[4], "modified_at": row[5],
-                        "thumbnail_url": f"/api/thumbnail/{row[0]}",
+                        "thumbnail_url": f"/api/thumbnail/{row[0]}?v={row[14] or 0}",
+                        "thumbnail_version": row[14] or 0,
                         "exif_data": json.loads(row[6]) if row[6] else {},
                         "directory_path": row[7], "width": row[8], "height": row[9],
                         "format": row[10], "is_favorite": bool(row[11]),
@@ -607,37 +967,282 @@ class ImageManager(BaseDB):
                 message=f"EXIF数据解析失败: {str(e)}"
             )
 
-    def get_thumbnail(self, image_id: int) -> Optional[bytes]:
+    def _select_thumbnail(self, cursor, image_id: int, size: int = None) -> Optional[Tuple[bytes, int]]:
+        """选出与请求边长最接近的缩略图，返回 (data, 该级边长)
+        
+        优先取不小于size的最小一级（避免放大），都比size小时取最大一级；
+        当前后端没有时依次查其他后端，迁移中途或切换后端后旧数据仍可读。
+        """
+        size = size or DEFAULT_THUMBNAIL_SIZE
+        active = self.thumbnail_stores[self.thumbnail_backend]
+        selected = active.select(cursor, image_id, size)
+        if selected:
+            return selected
+        for store in self.thumbnail_stores.values():
+            if store is not active:
+                selected = store.select(cursor, image_id, size)
+                if selected:
+                    return selected
+        return None
+    
+    def _save_thumbnails(self, cursor, rows: List[Tuple[int, int, bytes]]) -> Dict[str, set]:
+        """把缩略图写入当前后端，并清掉这些图片在其他后端的旧缩略图
+        
+        Returns:
+            各后端待清理的内容标识，提交事务后交给_release_thumbnails
+        """
+        if not rows:
+            return {}
+        image_ids = list({row[0] for row in rows})
+        released = {}
+        for name, store in self.thumbnail_stores.items():
+            if name != self.thumbnail_backend:
+                released[name] = store.delete(cursor, image_ids)
+        released[self.thumbnail_backend] = self.thumbnail_stores[self.thumbnail_backend].save(cursor, rows)
+        # 缩略图版本号随每次替换递增，用于带版本的缩略图URL和HTTP缓存校验；写入时间用作Last-Modified
+        updated_at = datetime.now().timestamp()
+        cursor.executemany('''
+            UPDATE image_metadata
+            SET thumbnail_version = COALESCE(thumbnail_version, 0) + 1, thumbnail_updated_at = ?
+            WHERE id = ?
+        ''', [(updated_at, image_id) for image_id in image_ids])
+        return released
+    
+    def _delete_thumbnails(self, cursor, image_ids: List[int]) -> Dict[str, set]:
+        """从所有后端删除图片的缩略图"""
+        return {name: store.delete(cursor, image_ids) for name, store in self.thumbnail_stores.items()}
+    
+    @staticmethod
+    def _merge_released(target: Dict[str, set], released: Dict[str, set]):
+        for name, keys in released.items():
+            target.setdefault(name, set()).update(keys)
+    
+    def add_thumbnail_listener(self, callback: Callable[[List[int]], None]):
+        """注册缩略图变化的监听器，图片的缩略图被替换或删除并提交后以图片ID列表回调（用于缓存失效）"""
+        self._thumbnail_listeners.append(callback)
+    
+    def _release_thumbnails(self, released: Dict[str, set], image_ids: Iterable[int] = ()):
+        """事务提交后通知监听器，并清理不再被引用的缩略图内容
+        
+        清理失败只记录日志，留给collect_thumbnail_garbage。
+        """
+        image_ids = list(image_ids)
+        if image_ids:
+            self.preview_store.invalidate(image_ids)
+            for callback in self._thumbnail_listeners:
+                try:
+                    callback(image_ids)
+                except Exception as e:
+                    logging.getLogger(__name__).warning(f"缩略图变化通知失败: {str(e)}")
+        
+        if not any(released.values()):
+            return
+        try:
+            # 引用检查和删除文件必须在写锁内完成：其他写入者可能正要复用同一内容（文件已存在时save不再写入），
+            # 在读连接上检查会在它提交引用之前把文件删掉
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                self._lock_for_release(conn)
+                for name, keys in released.items():
+                    if keys:
+                        self.thumbnail_stores[name].release(cursor, keys)
+        except (sqlite3.Error, OSError) as e:
+            logging.getLogger(__name__).warning(f"清理缩略图失败: {str(e)}")
+    
+    def save_thumbnails(self, image_id: int, thumbnails: Dict[int, bytes]) -> bool:
+        """替换一张图片的全部缩略图
+        
+        Args:
+            image_id: 图片ID
+            thumbnails: {边长: JPEG数据}
+        """
+        if not thumbnails:
+            return False
+        try:
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1 FROM image_metadata WHERE id = ?", (image_id,))
+                if not cursor.fetchone():
+                    return False
+                released = self._save_thumbnails(
+                    cursor, [(image_id, size, data) for size, data in thumbnails.items()]
+                )
+                conn.commit()
+            self._release_thumbnails(released, [image_id])
+            return True
+        except (sqlite3.Error, OSError) as e:
+            raise DatabaseException(
+                operation="save_thumbnails",
+                message=f"保存缩略图失败: {str(e)}",
+                details={"image_id": image_id}
+            )
+    
+    def get_preview_path(self, image_id: int, version: int) -> Optional[str]:
+        """获取已生成的显示预览图路径，version为图片记录中的thumbnail_version"""
+        return self.preview_store.get(image_id, version)
+    
+    def save_preview(self, image_id: int, version: int, data: bytes) -> str:
+        """保存显示预览图，返回文件路径"""
+        try:
+            return self.preview_store.save(image_id, version, data)
+        except OSError as e:
+            raise DatabaseException(
+                operation="save_preview",
+                message=f"保存预览图失败: {str(e)}",
+                details={"image_id": image_id, "version": version}
+            )
+    
+    def migrate_thumbnails(self, target: str, batch_size: int = 200,
+                           progress_callback: Callable[[int], None] = None) -> int:
+        """把所有缩略图迁移到target后端，并将其设为当前后端
+        
+        先切换当前后端，新写入直接进入target；之后分批搬运，每批在一个事务内
+        写入target并从原后端删除，中途中断可再次执行，已搬运的部分不会重复。
+        
+        Args:
+            target: 目标后端名称（sqlite或filesystem）
+            batch_size: 每个事务搬运的图片数量
+            progress_callback: 每批完成后以累计迁移的图片数量回调
+        
+        Returns:
+            迁移的图片数量
+        """
+        if target not in self.thumbnail_stores:
+            raise ValidationException(
+                field="target",
+                message="不支持的缩略图存储后端",
+                details={"target": target, "supported": list(self.thumbnail_stores)}
+            )
+        
+        try:
+            self.set_setting('thumbnail_backend', target)
+            self.thumbnail_backend = target
+            target_store = self.thumbnail_stores[target]
+            
+            migrated = 0
+            for name, source in self.thumbnail_stores.items():
+                if source is target_store:
+                    continue
+                after_id = 0
+                while True:
+                    released = {}
+                    with self.get_write_connection() as conn:
+                        cursor = conn.cursor()
+                        image_ids = source.list_image_ids(cursor, after_id, batch_size)
+                        if not image_ids:
+                            break
+                        rows = source.load(cursor, image_ids)
+                        released[name] = source.delete(cursor, image_ids)
+                        released[target] = target_store.save(cursor, rows)
+                        conn.commit()
+                    self._release_thumbnails(released)
+                    after_id = image_ids[-1]
+                    migrated += len(image_ids)
+                    if progress_callback:
+                        progress_callback(migrated)
+            return migrated
+        except (sqlite3.Error, OSError) as e:
+            raise DatabaseException(
+                operation="migrate_thumbnails",
+                message=f"迁移缩略图失败: {str(e)}",
+                details={"target": target}
+            )
+    
+    @staticmethod
+    def _lock_for_release(conn):
+        """开启立即写事务，连同其他进程的写入一起挡在引用检查和删除文件之外"""
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+    
+    def collect_thumbnail_garbage(self) -> int:
+        """清理所有后端中不再被引用的缩略图内容，返回清理数量"""
+        try:
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                self._lock_for_release(conn)
+                return sum(store.collect_garbage(cursor) for store in self.thumbnail_stores.values())
+        except (sqlite3.Error, OSError) as e:
+            raise DatabaseException(
+                operation="collect_thumbnail_garbage",
+                message=f"清理缩略图失败: {str(e)}"
+            )
+    
+    def get_thumbnail(self, image_id: int, size: int = None) -> Optional[bytes]:
         """获取图片缩略图"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('SELECT thumbnail FROM image_thumbnails WHERE image_id = ?', (image_id,))
-                row = cursor.fetchone()
-                return row[0] if row else None
+                selected = self._select_thumbnail(cursor, image_id, size)
+                return selected[0] if selected else None
         except sqlite3.Error as e:
             raise DatabaseException(
                 operation="get_thumbnail",
                 message=f"获取缩略图失败: {str(e)}",
-                details={"image_id": image_id}
+                details={"image_id": image_id, "size": size}
             )
 
-    def get_thumbnail_by_id(self, image_id: int) -> Optional[bytes]:
-        """根据ID获取缩略图bytes数据"""
+    def get_thumbnail_by_id(self, image_id: int, size: int = None) -> Optional[bytes]:
+        """根据ID获取缩略图bytes数据，size为期望的边长，返回最接近的一级"""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT thumbnail FROM image_thumbnails WHERE image_id = ?
-                ''', (image_id,))
-                
-                row = cursor.fetchone()
-                if row and row[0]:
-                    return row[0]  # 直接返回bytes数据
-                return None
+                selected = self._select_thumbnail(cursor, image_id, size)
+                return selected[0] if selected else None  # 直接返回bytes数据
         except sqlite3.Error as e:
             raise DatabaseException(
                 operation="get_thumbnail_by_id",
                 message=f"获取缩略图失败: {str(e)}",
-                details={"image_id": image_id}
-            )
\ No newline at end of file
+                details={"image_id": image_id, "size": size}
+            )
+    
+    def get_thumbnail_variant(self, image_id: int, size: int = None) -> Optional[Dict[str, Any]]:
+        """获取与size最接近的缩略图及其完整性
+        
+        入库时可能只生成了部分级别（例如只用内嵌预览图生成了小尺寸），
+        complete为False表示存在比当前更合适的级别尚未生成，调用方可按需补生成。
+        
+        Returns:
+            {"data": bytes, "size": 该级边长, "complete": bool, "version": 缩略图版本号,
+             "modified_at": 原图修改时间, "updated_at": 缩略图写入时间（旧数据为None）}，
+            没有任何缩略图时返回None
+        """
+        try:
+            with self.get_connection() as conn:
+                return self._thumbnail_variant(conn.cursor(), image_id, size)
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="get_thumbnail_variant",
+                message=f"获取缩略图失败: {str(e)}",
+                details={"image_id": image_id, "size": size}
+            )
+    
+    def get_thumbnail_variants(self, image_ids: List[int], size: int = None) -> List[Optional[Dict[str, Any]]]:
+        """用一个连接批量获取缩略图，结果与image_ids一一对应，缺失的位置为None"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                return [self._thumbnail_variant(cursor, image_id, size) for image_id in image_ids]
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="get_thumbnail_variants",
+                message=f"批量获取缩略图失败: {str(e)}",
+                details={"count": len(image_ids), "size": size}
+            )
+    
+    def _thumbnail_variant(self, cursor, image_id: int, size: int = None) -> Optional[Dict[str, Any]]:
+        selected = self._select_thumbnail(cursor, image_id, size)
+        if not selected:
+            return None
+        data, stored_size = selected
+        cursor.execute(
+            "SELECT width, height, modified_at, thumbnail_version, thumbnail_updated_at FROM image_metadata WHERE id = ?",
+            (image_id,)
+        )
+        row = cursor.fetchone() or (None, None, None, 0, None)
+        requested = size or DEFAULT_THUMBNAIL_SIZE
+        # 原图本身不比已存的级别大时，已经是能给出的最大尺寸
+        complete = stored_size >= requested or not row[0] or not row[1] or max(row[0], row[1]) <= stored_size
+        return {
+            "data": data, "size": stored_size, "complete": complete,
+            "version": row[3] or 0, "modified_at": row[2], "updated_at": row[4]
+        }
@@ -0,0 +1,64 @@
+"""
+游标分页 - 用 (排序值, 图片ID) 定位下一页，避免OFFSET逐行跳过前面的所有记录
+
+游标对客户端不透明：base64编码的JSON，记录生成它时的排序字段、方向、查询范围摘要和最后一行的位置，
+只能用于同一排序方式、同一目录/相册和筛选条件的后续请求。
+"""
+import base64
+import binascii
+import hashlib
+import json
+from typing import Any, Tuple
+
+from exceptions import ValidationException
+
+
+def query_scope(**filters: Any) -> str:
+    """查询范围（目录、相册和各筛选条件）的摘要，写入游标后用于校验续页请求的范围是否一致"""
+    payload = json.dumps(filters, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+def encode_cursor(sort_by: str, sort_order: str, scope: str, value: Any, image_id: int) -> str:
+    """把最后一行的排序值和ID编码为游标，scope为query_scope的结果"""
+    payload = json.dumps(
+        {"s": sort_by, "o": sort_order, "q": scope, "v": value, "id": image_id},
+        separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str, scope: str) -> Tuple[Any, int]:
+    """解析游标，返回 (排序值, 图片ID)
+    
+    Raises:
+        ValidationException: 游标格式错误，或与当前请求的排序方式、查询范围不一致
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, image_id = payload["v"], int(payload["id"])
+        cursor_sort = (payload["s"], payload["o"])
+        cursor_scope = payload.get("q")
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+        raise ValidationException(
+            field="cursor",
+            message="分页游标无效",
+            details={"cursor": cursor}
+        )
+    
+    if cursor_sort != (sort_by, sort_order):
+        raise ValidationException(
+            field="cursor",
+            message="分页游标与当前排序方式不一致",
+            details={"cursor_sort": list(cursor_sort), "sort_by": sort_by, "sort_order": sort_order}
+        )
+    
+    # 游标只记录位置，换了目录、相册或筛选条件后同一位置没有意义
+    if cursor_scope != scope:
+        raise ValidationException(
+            field="cursor",
+            message="分页游标与当前查询范围不一致",
+            details={"cursor_scope": cursor_scope, "scope": scope}
+        )
+    return value, image_id
@@ -0,0 +1,60 @@
+"""
+显示预览存储 - 查看器使用的中等分辨率预览图（长边PREVIEW_SIZE）缓存在磁盘上
+
+预览图是可再生的派生数据，按需生成后存为 root/<分片>/<image_id>-<缩略图版本号>.jpg，不进入数据库。
+原图重新扫描后缩略图版本号递增，旧版本的预览随缩略图变化通知删除，文件名中的版本号保证不会读到旧预览。
+"""
+import logging
+import os
+from typing import Iterable, Optional
+
+from .thumbnail_store import write_file_atomic
+
+logger = logging.getLogger(__name__)
+
+
+class PreviewStore:
+    """预览图文件存储"""
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    def _directory(self, image_id: int) -> str:
+        return os.path.join(self.root, f"{image_id % 256:02x}")
+    
+    def path_for(self, image_id: int, version: int) -> str:
+        return os.path.join(self._directory(image_id), f"{image_id}-{version}.jpg")
+    
+    def get(self, image_id: int, version: int) -> Optional[str]:
+        """返回已生成的预览图路径，不存在时返回None"""
+        path = self.path_for(image_id, version)
+        return path if os.path.isfile(path) else None
+    
+    def save(self, image_id: int, version: int, data: bytes) -> str:
+        """写入预览图并删除该图片其他版本的预览"""
+        path = self.path_for(image_id, version)
+        write_file_atomic(path, data)
+        self._remove(image_id, keep=os.path.basename(path))
+        return path
+    
+    def invalidate(self, image_ids: Iterable[int]):
+        """删除图片的全部预览"""
+        for image_id in image_ids:
+            self._remove(image_id)
+    
+    def _remove(self, image_id: int, keep: str = None):
+        directory = self._directory(image_id)
+        prefix = f"{image_id}-"
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name == keep or not name.startswith(prefix):
+                continue
+            try:
+                os.unlink(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除预览图失败: {name} - {e}")
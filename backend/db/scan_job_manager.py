@@ -0,0 +1,167 @@
+import json
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from .base import BaseDB
+from exceptions import DatabaseException
+
+# 扫描任务状态
+JOB_RUNNING = "running"
+JOB_CANCELLED = "cancelled"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class ScanJobManager(BaseDB):
+    """扫描任务管理类 - 持久化全量扫描的进度检查点，支持取消和断点续扫"""
+    
+    def __init__(self, db_path: str = None):
+        super().__init__(db_path)
+        self.init_scan_job_tables()
+    
+    def init_scan_job_tables(self):
+        """初始化扫描任务表"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        # 检查点为 (current_root, last_path)：文件按路径排序处理，续扫时跳过不大于last_path的文件
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                roots TEXT NOT NULL,
+                current_root TEXT,
+                last_path TEXT,
+                scanned INTEGER DEFAULT 0,
+                processed INTEGER DEFAULT 0,
+                total INTEGER DEFAULT 0,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_scan_jobs_status ON scan_jobs(status)')
+        
+        conn.commit()
+        conn.close()
+    
+    def create_scan_job(self, job_id: str, roots: List[str]) -> bool:
+        """创建扫描任务
+        
+        Args:
+            job_id: 任务ID
+            roots: 要扫描的根目录列表（按处理顺序）
+        """
+        try:
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO scan_jobs (id, status, roots)
+                    VALUES (?, ?, ?)
+                ''', (job_id, JOB_RUNNING, json.dumps(roots)))
+                conn.commit()
+            return True
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="create_scan_job",
+                message=f"创建扫描任务失败: {str(e)}",
+                details={"job_id": job_id}
+            )
+    
+    def update_scan_job(self, job_id: str, **fields) -> bool:
+        """更新扫描任务字段（状态、检查点、计数等）"""
+        allowed = {'status', 'current_root', 'last_path', 'scanned', 'processed', 'total', 'error'}
+        updates = []
+        params = []
+        for key, value in fields.items():
+            if key not in allowed:
+                continue
+            updates.append(f"{key} = ?")
+            params.append(value)
+        
+        if not updates:
+            return False
+        
+        updates.append("updated_at = CURRENT_TIMESTAMP")
+        if fields.get('status') in (JOB_COMPLETED, JOB_CANCELLED, JOB_FAILED):
+            updates.append("finished_at = CURRENT_TIMESTAMP")
+        
+        try:
+            with self.get_write_connection() as conn:
+                cursor = conn.cursor()
+                params.append(job_id)
+                cursor.execute(f"UPDATE scan_jobs SET {', '.join(updates)} WHERE id = ?", params)
+                conn.commit()
+                return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="update_scan_job",
+                message=f"更新扫描任务失败: {str(e)}",
+                details={"job_id": job_id}
+            )
+    
+    def get_scan_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """根据ID获取扫描任务"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, status, roots, current_root, last_path, scanned, processed,
+                           total, error, created_at, updated_at, finished_at
+                    FROM scan_jobs WHERE id = ?
+                ''', (job_id,))
+                row = cursor.fetchone()
+                return self._row_to_job(row) if row else None
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="get_scan_job",
+                message=f"获取扫描任务失败: {str(e)}",
+                details={"job_id": job_id}
+            )
+    
+    def get_scan_jobs(self, status: str = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """获取扫描任务列表，按创建时间倒序"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                query = '''
+                    SELECT id, status, roots, current_root, last_path, scanned, processed,
+                           total, error, created_at, updated_at, finished_at
+                    FROM scan_jobs
+                '''
+                params = []
+                if status is not None:
+                    query += " WHERE status = ?"
+                    params.append(status)
+                query += " ORDER BY created_at DESC, rowid DESC LIMIT ?"
+                params.append(limit)
+                cursor.execute(query, params)
+                return [self._row_to_job(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            raise DatabaseException(
+                operation="get_scan_jobs",
+                message=f"获取扫描任务列表失败: {str(e)}",
+                details={"status": status}
+            )
+    
+    @staticmethod
+    def _row_to_job(row) -> Dict[str, Any]:
+        total = row[7] or 0
+        scanned = row[5] or 0
+        return {
+            "id": row[0],
+            "status": row[1],
+            "roots": json.loads(row[2]) if row[2] else [],
+            "current_root": row[3],
+            "last_path": row[4],
+            "scanned": scanned,
+            "processed": row[6] or 0,
+            "total": total,
+            "progress": round(scanned / total, 4) if total else 0.0,
+            "error": row[8],
+            "created_at": row[9],
+            "updated_at": row[10],
+            "finished_at": row[11]
+        }
@@ -0,0 +1,283 @@
+"""
+缩略图存储后端
+
+sqlite: 缩略图以BLOB存放在数据库中（image_thumbnail_variants，旧数据在image_thumbnails）。
+filesystem: 缩略图按内容哈希存放在分片目录中，数据库里只保存引用（thumbnail_refs），
+            相同内容只存一份，元数据库保持小巧，VACUUM和备份不再受缩略图拖累。
+
+所有方法都使用调用方传入的cursor，与图片元数据的写入处于同一个事务。
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from typing import List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+BACKEND_SQLITE = 'sqlite'
+BACKEND_FILESYSTEM = 'filesystem'
+
+# 旧版image_thumbnails中单张缩略图的边长
+LEGACY_THUMBNAIL_SIZE = 400
+
+# 选出不小于size的最小一级（避免放大），都比size小时取最大一级
+CLOSEST_SIZE_ORDER = "ORDER BY size < ?, CASE WHEN size >= ? THEN size ELSE -size END LIMIT 1"
+
+
+def write_file_atomic(path: str, data: bytes):
+    """写临时文件后原子替换，读取方不会读到半个文件"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ThumbnailStore:
+    """缩略图存储后端基类
+    
+    save和delete返回可能已不再被引用的内容标识，调用方在事务提交后交给release清理。
+    release和collect_garbage需在持有写锁的事务中调用，检查引用与删除内容之间不能有其他写入。
+    """
+    
+    name = None
+    
+    def save(self, cursor, rows: List[Tuple[int, int, bytes]]) -> Set[str]:
+        """写入缩略图，rows为 (image_id, size, data)，涉及图片的旧缩略图整体替换"""
+        raise NotImplementedError
+    
+    def select(self, cursor, image_id: int, size: int) -> Optional[Tuple[bytes, int]]:
+        """读取与size最接近的一级缩略图，返回 (data, 该级边长)"""
+        raise NotImplementedError
+    
+    def delete(self, cursor, image_ids: List[int]) -> Set[str]:
+        """删除图片的全部缩略图"""
+        raise NotImplementedError
+    
+    def list_image_ids(self, cursor, after_id: int, limit: int) -> List[int]:
+        """按ID顺序列出有缩略图的图片，用于分批迁移"""
+        raise NotImplementedError
+    
+    def load(self, cursor, image_ids: List[int]) -> List[Tuple[int, int, bytes]]:
+        """读取图片的全部缩略图，返回 (image_id, size, data)"""
+        raise NotImplementedError
+    
+    def release(self, cursor, keys: Set[str]) -> int:
+        """清理事务提交后不再被引用的内容，返回清理数量"""
+        return 0
+    
+    def collect_garbage(self, cursor) -> int:
+        """全量清理不再被引用的内容，返回清理数量"""
+        return 0
+
+
+class SQLiteThumbnailStore(ThumbnailStore):
+    """缩略图以BLOB形式存放在数据库中"""
+    
+    name = BACKEND_SQLITE
+    
+    def save(self, cursor, rows: List[Tuple[int, int, bytes]]) -> Set[str]:
+        image_ids = [(image_id,) for image_id in {row[0] for row in rows}]
+        cursor.executemany("DELETE FROM image_thumbnail_variants WHERE image_id = ?", image_ids)
+        cursor.executemany("DELETE FROM image_thumbnails WHERE image_id = ?", image_ids)
+        cursor.executemany('''
+            INSERT INTO image_thumbnail_variants (image_id, size, thumbnail)
+            VALUES (?, ?, ?)
+        ''', rows)
+        return set()
+    
+    def select(self, cursor, image_id: int, size: int) -> Optional[Tuple[bytes, int]]:
+        cursor.execute(f'''
+            SELECT thumbnail, size FROM image_thumbnail_variants
+            WHERE image_id = ?
+            {CLOSEST_SIZE_ORDER}
+        ''', (image_id, size, size))
+        row = cursor.fetchone()
+        if row and row[0]:
+            return row[0], row[1]
+        
+        # 没有多尺寸缩略图的旧数据回退到image_thumbnails
+        cursor.execute('SELECT thumbnail FROM image_thumbnails WHERE image_id = ?', (image_id,))
+        row = cursor.fetchone()
+        return (row[0], LEGACY_THUMBNAIL_SIZE) if row and row[0] else None
+    
+    def delete(self, cursor, image_ids: List[int]) -> Set[str]:
+        placeholders = ','.join('?' * len(image_ids))
+        cursor.execute(f"DELETE FROM image_thumbnail_variants WHERE image_id IN ({placeholders})", image_ids)
+        cursor.execute(f"DELETE FROM image_thumbnails WHERE image_id IN ({placeholders})", image_ids)
+        return set()
+    
+    def list_image_ids(self, cursor, after_id: int, limit: int) -> List[int]:
+        cursor.execute('''
+            SELECT image_id FROM (
+                SELECT DISTINCT image_id FROM image_thumbnail_variants WHERE image_id > ?
+                UNION
+                SELECT image_id FROM image_thumbnails WHERE image_id > ? AND thumbnail IS NOT NULL
+            )
+            ORDER BY image_id LIMIT ?
+        ''', (after_id, after_id, limit))
+        return [row[0] for row in cursor.fetchall()]
+    
+    def load(self, cursor, image_ids: List[int]) -> List[Tuple[int, int, bytes]]:
+        placeholders = ','.join('?' * len(image_ids))
+        cursor.execute(f'''
+            SELECT image_id, size, thumbnail FROM image_thumbnail_variants
+            WHERE image_id IN ({placeholders})
+        ''', image_ids)
+        rows = cursor.fetchall()
+        
+        # 旧版单张缩略图按其生成时的边长迁移
+        covered = {row[0] for row in rows}
+        cursor.execute(f'''
+            SELECT image_id, thumbnail FROM image_thumbnails
+            WHERE image_id IN ({placeholders}) AND thumbnail IS NOT NULL
+        ''', image_ids)
+        rows.extend(
+            (image_id, LEGACY_THUMBNAIL_SIZE, data)
+            for image_id, data in cursor.fetchall() if image_id not in covered
+        )
+        return rows
+
+
+class FileSystemThumbnailStore(ThumbnailStore):
+    """缩略图按内容哈希存放在 root/ab/cd/<digest>.jpg，数据库只保存引用"""
+    
+    name = BACKEND_FILESYSTEM
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+    
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.jpg")
+    
+    def _write(self, digest: str, data: bytes):
+        """内容寻址：文件已存在即内容相同，直接复用；写临时文件后原子替换，避免读到半个文件"""
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            return
+        write_file_atomic(path, data)
+    
+    def _read(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self.path_for(digest), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            logger.warning(f"缩略图文件缺失: {digest}")
+            return None
+    
+    def save(self, cursor, rows: List[Tuple[int, int, bytes]]) -> Set[str]:
+        released = self.delete(cursor, list({row[0] for row in rows})) if rows else set()
+        refs = []
+        for image_id, size, data in rows:
+            digest = self.digest(data)
+            self._write(digest, data)
+            refs.append((image_id, size, digest))
+        cursor.executemany('''
+            INSERT OR REPLACE INTO thumbnail_refs (image_id, size, digest)
+            VALUES (?, ?, ?)
+        ''', refs)
+        return released - {ref[2] for ref in refs}
+    
+    def select(self, cursor, image_id: int, size: int) -> Optional[Tuple[bytes, int]]:
+        cursor.execute(f'''
+            SELECT digest, size FROM thumbnail_refs
+            WHERE image_id = ?
+            {CLOSEST_SIZE_ORDER}
+        ''', (image_id, size, size))
+        row = cursor.fetchone()
+        data = self._read(row[0]) if row else None
+        return (data, row[1]) if data else None
+    
+    def delete(self, cursor, image_ids: List[int]) -> Set[str]:
+        placeholders = ','.join('?' * len(image_ids))
+        cursor.execute(f"SELECT DISTINCT digest FROM thumbnail_refs WHERE image_id IN ({placeholders})", image_ids)
+        digests = {row[0] for row in cursor.fetchall()}
+        cursor.execute(f"DELETE FROM thumbnail_refs WHERE image_id IN ({placeholders})", image_ids)
+        return digests
+    
+    def list_image_ids(self, cursor, after_id: int, limit: int) -> List[int]:
+        cursor.execute('''
+            SELECT DISTINCT image_id FROM thumbnail_refs
+            WHERE image_id > ? ORDER BY image_id LIMIT ?
+        ''', (after_id, limit))
+        return [row[0] for row in cursor.fetchall()]
+    
+    def load(self, cursor, image_ids: List[int]) -> List[Tuple[int, int, bytes]]:
+        placeholders = ','.join('?' * len(image_ids))
+        cursor.execute(f'''
+            SELECT image_id, size, digest FROM thumbnail_refs
+            WHERE image_id IN ({placeholders})
+        ''', image_ids)
+        rows = []
+        for image_id, size, digest in cursor.fetchall():
+            data = self._read(digest)
+            if data:
+                rows.append((image_id, size, data))
+        return rows
+    
+    def release(self, cursor, keys: Set[str]) -> int:
+        """删除已无引用的文件，提交后在写事务中再检查一次引用，避免误删刚被复用的内容
+        
+        save在写事务中先检查文件是否存在再写入引用，release同样持有写锁，
+        因此检查到无引用的文件在删除之前不会被其他写入者复用。
+        """
+        if not keys:
+            return 0
+        keys = list(keys)
+        removed = 0
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"SELECT DISTINCT digest FROM thumbnail_refs WHERE digest IN ({placeholders})", chunk)
+            referenced = {row[0] for row in cursor.fetchall()}
+            for digest in chunk:
+                if digest in referenced:
+                    continue
+                try:
+                    os.unlink(self.path_for(digest))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"删除缩略图文件失败: {digest} - {e}")
+        return removed
+    
+    def collect_garbage(self, cursor) -> int:
+        """扫描分片目录，删除数据库中没有引用的文件和残留的临时文件"""
+        if not os.path.isdir(self.root):
+            return 0
+        cursor.execute("SELECT DISTINCT digest FROM thumbnail_refs")
+        referenced = {row[0] for row in cursor.fetchall()}
+        removed = 0
+        for dir_path, _, files in os.walk(self.root):
+            for name in files:
+                digest, ext = os.path.splitext(name)
+                if ext == '.jpg' and digest in referenced:
+                    continue
+                try:
+                    os.unlink(os.path.join(dir_path, name))
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"删除缩略图文件失败: {name} - {e}")
+        return removed
+
+
+def create_thumbnail_stores(root: str) -> dict:
+    """创建全部缩略图存储后端，按名称索引"""
+    return {
+        BACKEND_SQLITE: SQLiteThumbnailStore(),
+        BACKEND_FILESYSTEM: FileSystemThumbnailStore(root)
+    }
@@ -1,23 +1,31 @@
+import asyncio
+import hashlib
 import os
+import struct
 import threading
 import urllib.parse
 import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
 import uvicorn
 
 from container import dependencies
 from exceptions import DatabaseException, ImageProcessingException, format_error_response
+from thumbnail_cache import DEFAULT_THUMBNAIL_CACHE_BYTES, ThumbnailCache
+from thumbnail_generator import ThumbnailGenerator
+from image_utils import PREVIEW_SIZE
 
 
-def read_file_safely(file_path: str) -> bytes:
-    """安全地读取文件内容"""
+def stat_file_safely(file_path: str) -> os.stat_result:
+    """检查文件可读并返回文件状态，文件内容由FileResponse分块流式发送，不整体读入内存"""
     try:
-        if not os.path.exists(file_path):
+        if not os.path.isfile(file_path):
             raise ImageProcessingException(
                 operation="read_file",
                 message="文件不存在",
@@ -31,8 +39,7 @@ def read_file_safely(file_path: str) -> bytes:
                 details={"file_path": file_path, "error": "权限不足"}
             )
             
-        with open(file_path, 'rb') as f:
-            return f.read()
+        return os.stat(file_path)
     except ImageProcessingException as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -44,6 +51,58 @@ def get_media_type(file_path: str) -> str:
     media_type, _ = mimetypes.guess_type(file_path)
     return media_type or "application/octet-stream"
 
+
+# 浏览器可直接显示的原图格式，这类原图不大于预览尺寸时直接作为预览返回
+BROWSER_DISPLAYABLE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# 带版本号（?v=）的缩略图URL对应的内容不会再变，允许客户端长期缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 其余图片每次使用前向服务器验证，未变化时只返回304
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def thumbnail_last_modified(variant: dict) -> Optional[float]:
+    """缩略图的最后修改时间：缩略图写入时间，旧数据没有记录时退回原图修改时间（时间戳），都没有时返回None"""
+    value = variant.get('updated_at') or variant.get('modified_at')
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def thumbnail_etag(image_id: int, variant: dict) -> str:
+    """缩略图的强ETag：由图片ID、原图修改时间、缩略图版本号和所取级别决定"""
+    token = f"{variant.get('modified_at')}:{variant.get('version', 0)}:{variant['size']}"
+    return f'"t{image_id}-{hashlib.blake2b(token.encode(), digest_size=8).hexdigest()}"'
+
+
+def file_etag(image_id: int, stat: os.stat_result) -> str:
+    """原图的强ETag：由图片ID、文件修改时间（纳秒）和文件大小决定，无需读取文件内容"""
+    return f'"i{image_id}-{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def is_not_modified(request: Request, etag: str, last_modified: float = None) -> bool:
+    """按If-None-Match/If-Modified-Since判断客户端缓存是否仍然有效
+    
+    两者同时存在时以If-None-Match为准（RFC 7232）。
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match使用弱比较，忽略W/前缀
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP日期只精确到秒
+        return int(last_modified) <= since
+    return False
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
 app = FastAPI(title="Image Manager API", version="1.0.0")
 
 # 配置CORS
@@ -53,13 +112,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 批量缩略图接口用响应头报告缺失和未完整的图片，跨域的前端需要能读到
+    expose_headers=["X-Thumbnail-Count", "X-Thumbnail-Misses", "X-Thumbnail-Incomplete"],
 )
 
 image_manager = dependencies.get_db_manager()
+# 缺失的缩略图在请求时按需生成，同一图片的并发请求共享一次生成
+thumbnail_generator = ThumbnailGenerator(image_manager)
+
+
+def _thumbnail_cache_budget() -> int:
+    """读取缩略图缓存的字节预算，未配置或配置无效时使用默认值"""
+    try:
+        return int(image_manager.get_setting('thumbnail_cache_bytes', DEFAULT_THUMBNAIL_CACHE_BYTES))
+    except (DatabaseException, TypeError, ValueError):
+        return DEFAULT_THUMBNAIL_CACHE_BYTES
+
+
+# 热点缩略图的内存缓存，缩略图被扫描器或按需生成替换、或图片被删除后由数据库管理器回调失效
+thumbnail_cache = ThumbnailCache(_thumbnail_cache_budget())
+image_manager.add_thumbnail_listener(thumbnail_cache.invalidate)
 
 @app.get("/api/image/{image_id}")
-async def get_image(image_id: int):
-    """获取原始图片数据"""
+async def get_image(image_id: int, request: Request):
+    """获取原始图片数据，支持ETag/Last-Modified条件请求和Range分段请求
+    
+    文件按64KB分块流式发送，单个请求的内存占用与文件大小无关，查看器可以边下载边渲染。
+    """
     try:
         if not image_id or image_id <= 0:
             raise HTTPException(status_code=400, detail="无效的图片ID")
@@ -72,32 +151,193 @@ async def get_image(image_id: int):
         if not file_path:
             raise HTTPException(status_code=404, detail="图片文件路径未找到")
         
-        image_data = read_file_safely(file_path)
-        media_type = get_media_type(file_path)
+        # 先用文件状态做缓存校验，命中时无需读取文件
+        stat = stat_file_safely(file_path)
+        headers = {
+            "Cache-Control": REVALIDATE_CACHE_CONTROL,
+            "ETag": file_etag(image_id, stat),
+            "Last-Modified": formatdate(stat.st_mtime, usegmt=True)
+        }
+        if is_not_modified(request, headers["ETag"], stat.st_mtime):
+            return not_modified_response(headers)
         
-        return Response(content=image_data, media_type=media_type)
+        # Content-Length、Range/If-Range（206/416）由FileResponse按传入的文件状态处理
+        return FileResponse(file_path, media_type=get_media_type(file_path), headers=headers, stat_result=stat)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取图片时发生错误: {str(e)}")
 
+@app.get("/api/preview/{image_id}")
+async def get_preview(request: Request, image_id: int, v: Optional[str] = None):
+    """获取查看器使用的显示预览图（长边不超过PREVIEW_SIZE的JPEG）
+    
+    预览图与缩略图走同一解码流程，首次请求时在线程池中生成并缓存到磁盘，之后直接按文件流式返回；
+    原图本身不大于预览尺寸且浏览器可直接显示时返回原图。需要原图时仍使用/api/image。
+    v为图片记录中的thumbnail_version，与当前版本一致时响应可被长期缓存。
+    """
+    try:
+        if not image_id or image_id <= 0:
+            raise HTTPException(status_code=400, detail="无效的图片ID")
+        
+        image = image_manager.get_image_by_id(image_id)
+        if not image:
+            raise HTTPException(status_code=404, detail="图片不存在")
+        
+        version = image['thumbnail_version']
+        headers = {
+            "ETag": f'"p{image_id}-{version}"',
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if v == str(version) else REVALIDATE_CACHE_CONTROL
+        }
+        
+        width, height = image.get('width') or 0, image.get('height') or 0
+        if image.get('format') in BROWSER_DISPLAYABLE_FORMATS and 0 < max(width, height) <= PREVIEW_SIZE:
+            # 原图本身就是合适的预览，校验器沿用原图的
+            stat = stat_file_safely(image['file_path'])
+            headers.update({"ETag": file_etag(image_id, stat), "Cache-Control": REVALIDATE_CACHE_CONTROL})
+            if is_not_modified(request, headers["ETag"], stat.st_mtime):
+                return not_modified_response(headers)
+            return FileResponse(image['file_path'], media_type=get_media_type(image['file_path']),
+                                headers=headers, stat_result=stat)
+        
+        if is_not_modified(request, headers["ETag"]):
+            return not_modified_response(headers)
+        
+        path = image_manager.get_preview_path(image_id, version)
+        if path is None:
+            # 与缩略图一样，客户端断开只取消本请求的等待，共享的生成继续进行
+            future = thumbnail_generator.submit_preview(image_id)
+            if future is None or not await asyncio.shield(asyncio.wrap_future(future)):
+                raise HTTPException(status_code=404, detail="预览图生成失败")
+            # 生成期间原图可能被重新扫描，以生成后的版本为准
+            image = image_manager.get_image_by_id(image_id)
+            version = image['thumbnail_version'] if image else version
+            path = image_manager.get_preview_path(image_id, version)
+            if path is None:
+                raise HTTPException(status_code=404, detail="预览图不存在")
+            headers["ETag"] = f'"p{image_id}-{version}"'
+            if v != str(version):
+                headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        
+        return FileResponse(path, media_type="image/jpeg", headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取预览图时发生错误: {str(e)}")
+
 @app.get("/api/thumbnail/{image_id}")
-async def get_thumbnail(image_id: int):
-    """获取图片缩略图"""
+async def get_thumbnail(request: Request, image_id: int, size: int = Query(None, ge=1, le=4096),
+                        v: Optional[str] = None):
+    """获取图片缩略图，size为期望的边长，返回最接近的已存储尺寸
+    
+    v为图片记录中的thumbnail_version，与当前版本一致且尺寸合适时响应可被长期缓存；
+    缩略图替换后版本号递增，客户端随之换用新URL。
+    """
     try:
         if not image_id or image_id <= 0:
             raise HTTPException(status_code=400, detail="无效的图片ID")
             
-        thumbnail_data = image_manager.get_thumbnail_by_id(image_id)
-        if not thumbnail_data:
-            raise HTTPException(status_code=404, detail="缩略图不存在")
+        variant = thumbnail_cache.get(image_id, size)
+        if variant is None:
+            epoch = thumbnail_cache.epoch
+            variant = image_manager.get_thumbnail_variant(image_id, size)
+            if variant is None or not variant['complete']:
+                # 尚未扫描到、生成失败或入库时只生成了小尺寸的图片：在线程池中现场生成，不阻塞事件循环。
+                # 同一Future由所有并发请求共享，客户端断开时只取消本请求的等待，不能取消生成本身
+                future = thumbnail_generator.submit(image_id)
+                if future is not None and await asyncio.shield(asyncio.wrap_future(future)):
+                    epoch = thumbnail_cache.epoch
+                    variant = image_manager.get_thumbnail_variant(image_id, size)
+            if not variant:
+                raise HTTPException(status_code=404, detail="缩略图不存在")
+            
+            # 只缓存尺寸合适的级别，较小的回退级别等补生成后再缓存
+            if variant['complete']:
+                thumbnail_cache.put(image_id, size, variant, epoch)
         
-        return Response(content=thumbnail_data, media_type="image/jpeg")
+        # 回退的较小级别稍后会被替换，不能让客户端长期缓存
+        immutable = variant['complete'] and v is not None and v == str(variant['version'])
+        headers = {
+            "ETag": thumbnail_etag(image_id, variant),
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        }
+        last_modified = thumbnail_last_modified(variant)
+        if last_modified is not None:
+            headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+        if is_not_modified(request, headers["ETag"], last_modified):
+            return not_modified_response(headers)
+        return Response(content=variant['data'], media_type="image/jpeg", headers=headers)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取缩略图时发生错误: {str(e)}")
 
+# 批量缩略图接口单次请求的最大图片数
+MAX_THUMBNAIL_BATCH = 500
+# 批量响应中每项前的长度前缀：4字节无符号大端整数，0表示缺失
+THUMBNAIL_LENGTH_PREFIX = struct.Struct('>I')
+
+
+class ThumbnailBatchRequest(BaseModel):
+    ids: List[int] = Field(..., max_length=MAX_THUMBNAIL_BATCH)
+    size: Optional[int] = Field(None, ge=1, le=4096)
+
+
+@app.post("/api/thumbnails/batch")
+def get_thumbnail_batch(request: ThumbnailBatchRequest):
+    """批量获取缩略图，用于网格页面一次取回整页
+    
+    响应体按请求中ids的顺序依次排列，每项为4字节大端长度加JPEG数据，长度为0表示缺失，
+    客户端对缺失项回退到单张接口（会触发按需生成）。同步函数由FastAPI放到线程池执行。
+    只有比请求尺寸小的回退级别的图片列在X-Thumbnail-Incomplete（逗号分隔的ID）中，
+    其数据仅供占位，客户端应改用单张接口取得合适尺寸（补生成已在后台开始）。
+    """
+    try:
+        # 先查内存缓存，只有未命中的图片才查库
+        found = {}
+        for image_id in request.ids:
+            cached = thumbnail_cache.get(image_id, request.size)
+            if cached is not None:
+                found[image_id] = cached['data']
+        
+        pending = [image_id for image_id in dict.fromkeys(request.ids) if image_id not in found]
+        incomplete = []
+        if pending:
+            epoch = thumbnail_cache.epoch
+            for image_id, variant in zip(pending, image_manager.get_thumbnail_variants(pending, request.size)):
+                if variant is None:
+                    continue
+                if variant['complete']:
+                    thumbnail_cache.put(image_id, request.size, variant, epoch)
+                else:
+                    # 先返回已有的较小级别，后台补生成，并告知客户端改用单张接口取合适的尺寸
+                    thumbnail_generator.submit(image_id)
+                    incomplete.append(image_id)
+                found[image_id] = variant['data']
+        
+        parts = []
+        misses = 0
+        for image_id in request.ids:
+            data = found.get(image_id)
+            if data is None:
+                misses += 1
+                parts.append(THUMBNAIL_LENGTH_PREFIX.pack(0))
+                continue
+            parts.append(THUMBNAIL_LENGTH_PREFIX.pack(len(data)))
+            parts.append(data)
+        
+        return Response(
+            content=b''.join(parts),
+            media_type="application/octet-stream",
+            headers={
+                "X-Thumbnail-Count": str(len(request.ids)),
+                "X-Thumbnail-Misses": str(misses),
+                "X-Thumbnail-Incomplete": ",".join(map(str, incomplete))
+            }
+        )
+    except DatabaseException as e:
+        raise HTTPException(status_code=500, detail=f"批量获取缩略图时发生错误: {str(e)}")
+
 class FastAPIServer:
     def __init__(self, host="127.0.0.1", port=8324):
         self.host = host
@@ -128,6 +368,7 @@ class FastAPIServer:
         """停止FastAPI服务器"""
         # 由于uvicorn没有简单的停止方法，这里只是标记状态
         self.is_running = False
+        thumbnail_generator.shutdown()
         print("FastAPI server stopped")
     
     def get_base_url(self):
@@ -0,0 +1,284 @@
+"""
+文件系统监控 - 基于Linux inotify的实时目录监控
+
+不依赖第三方库，通过ctypes直接调用libc的inotify接口。
+事件在短时间窗口内去抖、合并后再一次性回调，非Linux平台不可用，由调用方回退到轮询。
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# inotify事件常量（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    """加载libc并确认inotify接口可用"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+INOTIFY_AVAILABLE = _libc is not None
+
+
+class InotifyWatcher:
+    """递归监控一组根目录，去抖合并后回调变化和删除的文件路径"""
+
+    def __init__(self, on_changes: Callable[[Set[str], Set[str]], None],
+                 extensions: Iterable[str],
+                 on_overflow: Optional[Callable[[], None]] = None,
+                 debounce: float = 1.0,
+                 max_delay: float = 5.0):
+        """初始化监控器
+
+        Args:
+            on_changes: 回调 (changed_paths, deleted_paths)，在监控线程中调用
+            extensions: 关注的文件扩展名（小写，含点号）
+            on_overflow: 事件队列溢出或监控失效时的回调，调用方应执行一次完整对账
+            debounce: 最后一个事件之后静默多少秒再回调
+            max_delay: 持续有事件时，最早的事件最多延迟多少秒回调
+        """
+        if not INOTIFY_AVAILABLE:
+            raise OSError("当前平台不支持inotify")
+
+        self.on_changes = on_changes
+        self.on_overflow = on_overflow
+        self.extensions = set(extensions)
+        self.debounce = debounce
+        self.max_delay = max_delay
+
+        self.fd = -1
+        self.roots: Set[str] = set()
+        self.watches: Dict[int, str] = {}  # wd -> 目录路径
+        self.watch_paths: Dict[str, int] = {}  # 目录路径 -> wd
+        self.is_running = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+        self._changed: Set[str] = set()
+        self._deleted: Set[str] = set()
+        self._first_event_at = 0.0
+        self._last_event_at = 0.0
+
+    def start(self):
+        """创建inotify实例并启动监控线程"""
+        if self.is_running:
+            return
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1失败: {os.strerror(err)}")
+        self.fd = fd
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止监控并释放inotify实例"""
+        self.is_running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        with self.lock:
+            if self.fd >= 0:
+                os.close(self.fd)
+                self.fd = -1
+            self.watches.clear()
+            self.watch_paths.clear()
+            self.roots.clear()
+
+    def set_roots(self, roots: Iterable[str]):
+        """同步监控的根目录集合：添加新根目录，移除已删除的根目录"""
+        roots = {os.path.normpath(root) for root in roots if os.path.isdir(root)}
+        for root in roots - self.roots:
+            self.roots.add(root)
+            self._add_watch_tree(root)
+        for root in self.roots - roots:
+            self.roots.discard(root)
+            self._remove_watch_tree(root)
+
+    def _add_watch_tree(self, top: str, collect_files: bool = False) -> Set[str]:
+        """为目录树中的所有目录添加监控，可同时收集其中的图片文件"""
+        files = set()
+        stack = [top]
+        while stack:
+            dir_path = stack.pop()
+            if not self._add_watch(dir_path):
+                continue
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif collect_files and self._is_watched_file(entry.name):
+                            files.add(entry.path)
+            except OSError as e:
+                logger.debug(f"列出目录失败: {dir_path} - {e}")
+        return files
+
+    def _add_watch(self, dir_path: str) -> bool:
+        with self.lock:
+            if self.fd < 0:
+                return False
+            wd = _libc.inotify_add_watch(self.fd, os.fsencode(dir_path), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    logger.warning(f"inotify监控数量已达上限(fs.inotify.max_user_watches)，{dir_path} 将依赖轮询")
+                    overflow = True
+                else:
+                    logger.debug(f"添加监控失败: {dir_path} - {os.strerror(err)}")
+                    overflow = False
+            else:
+                old_path = self.watches.get(wd)
+                if old_path is not None and old_path != dir_path:
+                    self.watch_paths.pop(old_path, None)
+                self.watches[wd] = dir_path
+                self.watch_paths[dir_path] = wd
+                return True
+        if overflow and self.on_overflow:
+            self.on_overflow()
+        return False
+
+    def _remove_watch_tree(self, top: str):
+        """移除目录树下所有目录的监控"""
+        prefix = top.rstrip(os.sep) + os.sep
+        with self.lock:
+            for path in [p for p in self.watch_paths if p == top or p.startswith(prefix)]:
+                wd = self.watch_paths.pop(path)
+                self.watches.pop(wd, None)
+                if self.fd >= 0:
+                    _libc.inotify_rm_watch(self.fd, wd)
+
+    def _is_watched_file(self, name: str) -> bool:
+        return os.path.splitext(name)[1].lower() in self.extensions
+
+    def _run(self):
+        """监控线程：读取事件，按去抖窗口合并后回调"""
+        while self.is_running:
+            timeout = self.debounce if (self._changed or self._deleted) else 1.0
+            try:
+                readable, _, _ = select.select([self.fd], [], [], timeout)
+            except (OSError, ValueError):
+                break
+
+            if readable:
+                self._read_events()
+
+            now = time.monotonic()
+            if (self._changed or self._deleted) and (
+                    now - self._last_event_at >= self.debounce or
+                    now - self._first_event_at >= self.max_delay):
+                self._flush()
+
+    def _read_events(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.error(f"读取inotify事件失败: {e}")
+            return
+
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b'\0'))
+            offset += name_len
+            self._handle_event(wd, mask, name)
+
+    def _handle_event(self, wd: int, mask: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            logger.warning("inotify事件队列溢出，触发完整对账")
+            if self.on_overflow:
+                self.on_overflow()
+            return
+
+        with self.lock:
+            dir_path = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                if dir_path is not None:
+                    self.watches.pop(wd, None)
+                    if self.watch_paths.get(dir_path) == wd:
+                        self.watch_paths.pop(dir_path, None)
+                return
+        if dir_path is None or not name:
+            return
+
+        path = os.path.join(dir_path, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                # 新建或移入的目录：补充监控并把其中已有的图片视为新增
+                for file_path in self._add_watch_tree(path, collect_files=True):
+                    self._record(file_path, deleted=False)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._remove_watch_tree(path)
+                self._record(path, deleted=True)
+            return
+
+        if not self._is_watched_file(name):
+            return
+        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self._record(path, deleted=False)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            self._record(path, deleted=True)
+
+    def _record(self, path: str, deleted: bool):
+        """合并同一路径的事件，以最后一次为准"""
+        now = time.monotonic()
+        if not self._changed and not self._deleted:
+            self._first_event_at = now
+        self._last_event_at = now
+        if deleted:
+            self._changed.discard(path)
+            self._deleted.add(path)
+        else:
+            self._deleted.discard(path)
+            self._changed.add(path)
+
+    def _flush(self):
+        changed, self._changed = self._changed, set()
+        deleted, self._deleted = self._deleted, set()
+        try:
+            self.on_changes(changed, deleted)
+        except Exception as e:
+            logger.error(f"处理文件变化事件失败: {e}")
@@ -1,7 +1,9 @@
+import hashlib
 import logging
 import os
+import time
 from io import BytesIO
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Optional
 
 try:
     from PIL import Image
@@ -12,8 +14,40 @@ try:
 except ImportError:
     PIL_AVAILABLE = False
 
+try:
+    import pyexiv2
+    PYEXIV2_AVAILABLE = True
+    # exiv2对不认识的标签会输出大量警告，只保留错误
+    pyexiv2.set_log_level(3)
+except ImportError:
+    PYEXIV2_AVAILABLE = False
+
 from exceptions import ImageProcessingException, ValidationException
 
+# 扫描入库支持的图片格式（Pillow识别出的format）
+SUPPORTED_FORMATS = ('JPEG', 'PNG', 'GIF', 'BMP', 'TIFF', 'WEBP')
+# 单个文件大小上限，超过则视为异常文件跳过
+MAX_FILE_SIZE = 100 * 1024 * 1024
+# 内容指纹读取文件头尾的字节数
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+
+# EXIF方向标签 (Orientation)
+ORIENTATION_TAG = 0x0112
+# 快速解码时先缩小到目标尺寸的多少倍，再用LANCZOS做最终重采样，倍数越大质量越接近全尺寸解码
+THUMBNAIL_REDUCING_GAP = 2.0
+# 缩略图金字塔的各级边长，对应前端网格的小/中/大/特大档位（已考虑高分屏）
+THUMBNAIL_SIZES = (128, 256, 512, 1024)
+# 请求未指定尺寸时返回的缩略图边长
+DEFAULT_THUMBNAIL_SIZE = 256
+THUMBNAIL_QUALITY = 90
+# 查看器显示预览图的最大边长
+PREVIEW_SIZE = 2048
+# 可能带有EXIF内嵌预览图的格式
+EMBEDDED_PREVIEW_FORMATS = ('JPEG', 'TIFF')
+# 内嵌预览图与原图宽高比的最大相对偏差，超过时按原图比例裁掉预览图的黑边
+EMBEDDED_PREVIEW_RATIO_TOLERANCE = 0.01
+
+
 class ImageProcessor:
     @staticmethod
     def generate_thumbnail(image_path: str, max_size: tuple = (200, 200)) -> bytes:
@@ -27,38 +61,16 @@ class ImageProcessor:
             
             with Image.open(image_path) as img:
                 # 处理EXIF方向信息
+                orientation = 1
                 try:
-                    # 获取EXIF数据
                     exif = img._getexif()
                     if exif is not None:
-                        # EXIF方向标签 (Orientation)
-                        orientation_tag = 0x0112
-                        orientation = exif.get(orientation_tag, 1)
-                        
-                        # 根据方向旋转图片
-                        if orientation == 3:
-                            img = img.rotate(180, expand=True)
-                        elif orientation == 6:
-                            img = img.rotate(270, expand=True)
-                        elif orientation == 8:
-                            img = img.rotate(90, expand=True)
+                        orientation = exif.get(ORIENTATION_TAG, 1)
                 except (AttributeError, KeyError, TypeError):
                     # 如果没有EXIF数据或出错，跳过旋转处理
                     pass
                 
-                # 转换为RGB模式（处理RGBA或其他模式）
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 计算缩略图尺寸，保持宽高比，最大尺寸不超过max_size
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                
-                # 将缩略图保存到内存缓冲区
-                buffer = BytesIO()
-                img.save(buffer, format='JPEG', quality=90)  # 提高质量到90
-                buffer.seek(0)
-                
-                return buffer.getvalue()
+                return ImageProcessor._render_thumbnail(img, max_size, orientation)
                 
         except ValidationException as e:
             logging.getLogger(__name__).error(f"验证错误 - 生成缩略图失败: {str(e)}")
@@ -70,8 +82,277 @@ class ImageProcessor:
             logging.getLogger(__name__).error(f"生成缩略图失败: {str(e)}")
             return None
     
-
+    @staticmethod
+    def generate_thumbnails(image_path: str, sizes: Iterable[int] = THUMBNAIL_SIZES) -> Dict[int, bytes]:
+        """一次解码生成多级缩略图，用于按需补生成；失败时返回空字典"""
+        if not PIL_AVAILABLE:
+            return {}
+        
+        try:
+            if not os.path.exists(image_path):
+                return {}
+            
+            with Image.open(image_path) as img:
+                if img.format not in SUPPORTED_FORMATS:
+                    return {}
+                orientation = 1
+                try:
+                    exif = img._getexif()
+                    if exif is not None:
+                        orientation = int(exif.get(ORIENTATION_TAG, 1))
+                except (AttributeError, KeyError, TypeError, ValueError):
+                    pass
+                
+                return ImageProcessor._render_thumbnails(img, sizes, orientation)
+        
+        except Exception as e:
+            logging.getLogger(__name__).error(f"生成缩略图失败: {image_path} - {str(e)}")
+            return {}
+    
+    @staticmethod
+    def generate_preview(image_path: str, size: int = PREVIEW_SIZE) -> Optional[bytes]:
+        """生成查看器使用的显示预览图，与缩略图走同一解码流程；失败时返回None"""
+        return ImageProcessor.generate_thumbnails(image_path, (size,)).get(size)
+    
+    @staticmethod
+    def _render_thumbnail(img, max_size: tuple, orientation: int = 1, fast: bool = True) -> bytes:
+        """将已打开的图片按方向校正后编码为JPEG缩略图
+        
+        fast为True时先缩小再旋转：JPEG利用DCT缩放直接解码到接近目标的尺寸，
+        其他格式用reduce做整数倍缩小，最后再做LANCZOS重采样。img必须尚未load。
+        fast为False时保留旧流程（全尺寸解码、旋转后再缩放），仅用于基准对比。
+        """
+        if fast:
+            # 方向6、8需要旋转90度，缩放目标按旋转前的宽高计算
+            if orientation in (6, 8):
+                target = (max_size[1], max_size[0])
+            else:
+                target = tuple(max_size)
+            img = ImageProcessor._reduce_for_thumbnail(img, target)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            img.thumbnail(target, Image.Resampling.LANCZOS, reducing_gap=None)
+            
+            # 缩小后再旋转，transpose为无损的像素重排
+            if orientation == 3:
+                img = img.transpose(Image.Transpose.ROTATE_180)
+            elif orientation == 6:
+                img = img.transpose(Image.Transpose.ROTATE_270)
+            elif orientation == 8:
+                img = img.transpose(Image.Transpose.ROTATE_90)
+        else:
+            # 根据方向旋转图片
+            if orientation == 3:
+                img = img.rotate(180, expand=True)
+            elif orientation == 6:
+                img = img.rotate(270, expand=True)
+            elif orientation == 8:
+                img = img.rotate(90, expand=True)
+            
+            # 转换为RGB模式（处理RGBA或其他模式）
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            
+            # 计算缩略图尺寸，保持宽高比，最大尺寸不超过max_size
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+        
+        # 将缩略图保存到内存缓冲区
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG', quality=THUMBNAIL_QUALITY)  # 提高质量到90
+        return buffer.getvalue()
+    
+    @staticmethod
+    def _render_thumbnails(img, sizes: Iterable[int], orientation: int = 1) -> Dict[int, bytes]:
+        """一次解码生成多级缩略图，img必须尚未load
+        
+        按最大一级做draft/reduce，之后由大到小逐级缩放：每一级都从上一级结果缩放，
+        相邻级别相差2倍，和THUMBNAIL_REDUCING_GAP一致，质量与单独生成相当。
+        原图不够大的级别与更小一级完全相同，不再重复存储。
+        
+        Returns:
+            {边长: JPEG数据}
+        """
+        sizes = sorted(set(sizes))
+        if not sizes:
+            return {}
+        
+        swap = orientation in (6, 8)
+        largest = sizes[-1]
+        img = ImageProcessor._reduce_for_thumbnail(img, (largest, largest))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        # 原图不大于某一级时，更大的级别都会与它相同
+        for index, size in enumerate(sizes):
+            if max(img.size) <= size:
+                sizes = sizes[:index + 1]
+                break
+        
+        thumbnails = {}
+        current = img
+        for size in reversed(sizes):
+            current = current.copy()
+            current.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=None)
+            variant = current
+            if orientation == 3:
+                variant = variant.transpose(Image.Transpose.ROTATE_180)
+            elif swap:
+                variant = variant.transpose(
+                    Image.Transpose.ROTATE_270 if orientation == 6 else Image.Transpose.ROTATE_90
+                )
+            buffer = BytesIO()
+            variant.save(buffer, format='JPEG', quality=THUMBNAIL_QUALITY)
+            thumbnails[size] = buffer.getvalue()
+        return thumbnails
+    
+    @staticmethod
+    def _reduce_for_thumbnail(img, target: tuple):
+        """在解码阶段把图片缩小到不小于 target * THUMBNAIL_REDUCING_GAP 的尺寸
+        
+        JPEG通过draft让libjpeg按1/2、1/4、1/8的比例解码，不再解出完整像素；
+        其余格式解码后用reduce做整数倍的盒式缩小，比直接LANCZOS全图便宜得多。
+        """
+        scale = min(target[0] / img.width, target[1] / img.height)
+        if scale >= 1:
+            return img
+        min_size = (max(int(img.width * scale * THUMBNAIL_REDUCING_GAP), 1),
+                    max(int(img.height * scale * THUMBNAIL_REDUCING_GAP), 1))
+        
+        if img.format == 'JPEG' and img.mode in ('RGB', 'L', 'CMYK'):
+            try:
+                img.draft(img.mode, min_size)
+            except (OSError, ValueError):
+                pass
+        
+        factor = min(img.width // min_size[0], img.height // min_size[1])
+        if factor >= 2:
+            # reduce不支持调色板模式，先转换为RGB
+            if img.mode in ('P', '1'):
+                img = img.convert('RGB')
+            try:
+                return img.reduce(factor)
+            except ValueError:
+                # 个别模式（如I;16）不支持reduce，交给最终的LANCZOS重采样
+                return img
+        return img
     
+    @staticmethod
+    def open_embedded_preview(image_path: str, width: int, height: int):
+        """读取EXIF中内嵌的预览图（不解码主图），返回按原图宽高比校正后的PIL图片
+        
+        很多相机的内嵌预览固定为160x120，3:2的照片会带上下黑边，这里按原图比例居中裁剪。
+        方向与主图相同，由调用方按主图的EXIF方向旋转。
+        
+        Returns:
+            PIL图片，没有内嵌预览或读取失败时返回None
+        """
+        if not PYEXIV2_AVAILABLE or not width or not height:
+            return None
+        
+        try:
+            exiv_image = pyexiv2.Image(image_path)
+            try:
+                data = exiv_image.read_thumbnail()
+            finally:
+                exiv_image.close()
+            if not data:
+                return None
+            
+            preview = Image.open(BytesIO(data))
+            preview_width, preview_height = preview.size
+            ratio = width / height
+            if abs(preview_width / preview_height - ratio) / ratio > EMBEDDED_PREVIEW_RATIO_TOLERANCE:
+                if preview_width / preview_height > ratio:
+                    crop_width = round(preview_height * ratio)
+                    left = (preview_width - crop_width) // 2
+                    preview = preview.crop((left, 0, left + crop_width, preview_height))
+                else:
+                    crop_height = round(preview_width / ratio)
+                    top = (preview_height - crop_height) // 2
+                    preview = preview.crop((0, top, preview_width, top + crop_height))
+            return preview
+        except Exception as e:
+            logging.getLogger(__name__).debug(f"读取内嵌预览图失败: {image_path} - {str(e)}")
+            return None
+    
+    @staticmethod
+    def analyze_image(image_path: str, thumbnail_sizes: Iterable[int] = THUMBNAIL_SIZES,
+                      embedded_preview: bool = False) -> Dict[str, Any]:
+        """只打开一次文件，同时获取尺寸、格式、EXIF、方向和各级缩略图
+        
+        Args:
+            image_path: 图片文件路径
+            thumbnail_sizes: 缩略图各级边长，为空时不生成缩略图
+            embedded_preview: 优先使用EXIF内嵌预览图生成它足够大的那些级别，完全跳过主图解码；
+                              更大的级别留给按需生成，预览图不够最小一级时回退到完整解码
+            
+        Returns:
+            包含width、height、format、mode、exif、orientation、thumbnails的字典，
+            thumbnails为 {边长: JPEG数据}
+        """
+        if not PIL_AVAILABLE:
+            raise ImageProcessingException(
+                operation="analyze_image",
+                message="PIL库未安装，无法分析图片",
+                details={"image_path": image_path}
+            )
+        
+        with Image.open(image_path) as img:
+            width, height = img.size
+            format_name = img.format
+            mode = img.mode
+            
+            # EXIF只解析一次，方向信息和EXIF字典共用
+            raw_exif = None
+            try:
+                if hasattr(img, '_getexif'):
+                    raw_exif = img._getexif()
+            except Exception:
+                raw_exif = None
+            
+            exif_data = {}
+            orientation = 1
+            if raw_exif:
+                for tag_id, value in raw_exif.items():
+                    tag = TAGS.get(tag_id, tag_id)
+                    exif_data[tag] = str(value)
+                try:
+                    orientation = int(raw_exif.get(ORIENTATION_TAG, 1))
+                except (TypeError, ValueError):
+                    orientation = 1
+            
+            # 添加基本图片信息
+            exif_data.update({
+                "Width": width,
+                "Height": height,
+                "Format": format_name,
+                "Mode": mode
+            })
+            
+            thumbnails = {}
+            if thumbnail_sizes and format_name in SUPPORTED_FORMATS:
+                try:
+                    preview = None
+                    if embedded_preview and format_name in EMBEDDED_PREVIEW_FORMATS:
+                        preview = ImageProcessor.open_embedded_preview(image_path, width, height)
+                    covered = [size for size in thumbnail_sizes if preview is not None and max(preview.size) >= size]
+                    if covered:
+                        thumbnails = ImageProcessor._render_thumbnails(preview, covered, orientation)
+                    else:
+                        thumbnails = ImageProcessor._render_thumbnails(img, thumbnail_sizes, orientation)
+                except Exception as e:
+                    logging.getLogger(__name__).error(f"生成缩略图失败: {str(e)}")
+            
+            return {
+                "width": width,
+                "height": height,
+                "format": format_name,
+                "mode": mode,
+                "exif": exif_data,
+                "orientation": orientation,
+                "thumbnails": thumbnails
+            }
+
     @staticmethod
     def get_exif_data(image_path: str) -> Dict[str, Any]:
         """获取图片的EXIF信息"""
@@ -119,9 +400,84 @@ class ImageProcessor:
         except Exception as e:
             return {"error": f"获取EXIF信息失败: {str(e)}"}
     
+    @staticmethod
+    def compute_fingerprint(file_path: str, file_size: int = None) -> str:
+        """计算快速内容指纹：文件大小 + 文件头尾各64KB的哈希
+        
+        Args:
+            file_path: 文件路径
+            file_size: 已知的文件大小，为None时通过stat获取
+        
+        Returns:
+            形如 "<size>:<hash>" 的指纹字符串
+        """
+        if file_size is None:
+            file_size = os.path.getsize(file_path)
+        
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            hasher.update(f.read(FINGERPRINT_BLOCK_SIZE))
+            if file_size > FINGERPRINT_BLOCK_SIZE * 2:
+                f.seek(-FINGERPRINT_BLOCK_SIZE, os.SEEK_END)
+                hasher.update(f.read(FINGERPRINT_BLOCK_SIZE))
+            elif file_size > FINGERPRINT_BLOCK_SIZE:
+                hasher.update(f.read())
+        return f"{file_size}:{hasher.hexdigest()}"
+    
     @staticmethod
     def is_image_file(file_path: str) -> bool:
         """检查文件是否为图片"""
         image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp', '.raw', '.heic', '.heif'}
         file_ext = os.path.splitext(file_path)[1].lower()
-        return file_ext in image_extensions
\ No newline at end of file
+        return file_ext in image_extensions
+
+
+def analyze_image_file(file_path: str, thumbnail_sizes: Iterable[int] = THUMBNAIL_SIZES,
+                       embedded_preview: bool = False) -> Optional[Dict[str, Any]]:
+    """分析单个图片文件，返回入库所需的全部数据（不访问数据库）
+
+    该函数为模块级函数，可被进程池序列化后在子进程中执行，
+    负责解码、EXIF读取和缩略图生成等CPU密集型工作。
+
+    Returns:
+        图片数据字典，文件不存在、大小异常或格式不支持时返回None
+    """
+    start_time = time.perf_counter()
+    try:
+        if not os.path.exists(file_path):
+            return None
+
+        stat = os.stat(file_path)
+
+        # 检查文件大小，跳过异常大的文件（可能损坏或不是图片）
+        if stat.st_size == 0 or stat.st_size > MAX_FILE_SIZE:
+            return None
+
+        # 单次打开文件，同时获取尺寸、格式、EXIF和缩略图
+        analysis = ImageProcessor.analyze_image(file_path, thumbnail_sizes, embedded_preview)
+        width, height = analysis['width'], analysis['height']
+        format_name = analysis['format']
+
+        # 验证图片格式
+        if format_name not in SUPPORTED_FORMATS:
+            return None
+
+        return {
+            'filename': os.path.basename(file_path),
+            'file_path': file_path,
+            'file_size': stat.st_size,
+            'created_at': stat.st_ctime,
+            'modified_at': stat.st_mtime,
+            'directory_path': os.path.dirname(file_path),
+            'width': width,
+            'height': height,
+            'format': format_name,
+            'thumbnails': analysis['thumbnails'],
+            'exif_data': analysis['exif'],
+            'fingerprint': ImageProcessor.compute_fingerprint(file_path, stat.st_size),
+            'worker_pid': os.getpid(),
+            'elapsed': time.perf_counter() - start_time
+        }
+    except Exception as e:
+        logging.getLogger(__name__).debug(f"跳过文件 {file_path}: {str(e)}")
+        return None
@@ -0,0 +1,54 @@
+"""
+缩略图存储迁移工具 - 在sqlite和filesystem两种缩略图存储后端之间搬运数据
+
+用法（在backend目录下运行，建议先关闭应用）:
+    python migrate_thumbnails.py filesystem [--db ../directories.db] [--batch-size 200] [--vacuum]
+    python migrate_thumbnails.py sqlite
+    python migrate_thumbnails.py gc
+
+迁移完成后目标后端即成为当前后端；从sqlite迁出后可加 --vacuum 回收数据库空间。
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from db import DatabaseManager
+from db.thumbnail_store import BACKEND_FILESYSTEM, BACKEND_SQLITE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缩略图存储迁移工具")
+    parser.add_argument('target', choices=[BACKEND_SQLITE, BACKEND_FILESYSTEM, 'gc'],
+                        help="目标后端，gc表示只清理不再被引用的缩略图文件")
+    parser.add_argument('--db', default=None, help="数据库路径，默认使用项目根目录的directories.db")
+    parser.add_argument('--batch-size', type=int, default=200, help="每个事务搬运的图片数量")
+    parser.add_argument('--vacuum', action='store_true', help="迁移完成后执行VACUUM")
+    args = parser.parse_args()
+    
+    db_path = args.db or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'directories.db')
+    manager = DatabaseManager(db_path)
+    
+    if args.target == 'gc':
+        removed = manager.collect_thumbnail_garbage()
+        print(f"已清理 {removed} 个无引用的缩略图文件")
+        return
+    
+    def report(count):
+        print(f"\r已迁移 {count} 张图片的缩略图", end='', flush=True)
+    
+    migrated = manager.migrate_thumbnails(args.target, batch_size=args.batch_size, progress_callback=report)
+    print(f"\n迁移完成，共 {migrated} 张图片，当前缩略图后端: {args.target}")
+    
+    if args.vacuum:
+        print("正在执行VACUUM...")
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        print("VACUUM完成")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+扫描任务优先级队列 - 让用户正在浏览的目录优先入库
+"""
+import heapq
+import itertools
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+# 优先级数值越小越先处理
+PRIORITY_HIGH = 0  # 用户正在浏览或刚添加的目录
+PRIORITY_NORMAL = 10  # 增量扫描和实时监控发现的变化
+PRIORITY_LOW = 20  # 全量扫描
+
+
+class ScanTicket:
+    """一次提交的完成情况，提交方可以等待其中所有文件处理完毕"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.remaining = total
+        self.processed = 0
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        if total == 0:
+            self._event.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待所有文件处理完毕，超时返回False"""
+        return self._event.wait(timeout)
+
+    def _done(self, success: bool):
+        with self._lock:
+            self.remaining -= 1
+            if success:
+                self.processed += 1
+            if self.remaining <= 0:
+                self._event.set()
+
+
+class ScanQueue:
+    """按优先级出队的文件队列，同一路径只排队一次，可整体提升某个目录的优先级"""
+
+    def __init__(self):
+        self._heap = []  # (priority, seq, path)，提升优先级时旧条目留在堆中，出队时跳过
+        self._pending: Dict[str, list] = {}  # path -> [priority, tickets]
+        self._in_flight: Dict[str, list] = {}  # 已出队未完成的 path -> tickets
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._woken = False
+
+    def push_many(self, paths: Iterable[str], priority: int = PRIORITY_NORMAL) -> ScanTicket:
+        """提交一批文件，已在队列中的文件只会提升优先级，不会重复排队"""
+        paths = list(dict.fromkeys(paths))
+        ticket = ScanTicket(len(paths))
+        with self._cond:
+            for path in paths:
+                entry = self._pending.get(path)
+                if entry is None:
+                    self._pending[path] = [priority, [ticket]]
+                    heapq.heappush(self._heap, (priority, next(self._seq), path))
+                else:
+                    entry[1].append(ticket)
+                    if priority < entry[0]:
+                        entry[0] = priority
+                        heapq.heappush(self._heap, (priority, next(self._seq), path))
+            self._cond.notify_all()
+        return ticket
+
+    def boost_directory(self, directory_path: str, recursive: bool = False,
+                        priority: int = PRIORITY_HIGH) -> int:
+        """提升目录下已排队文件的优先级
+
+        Returns:
+            被提升的文件数量
+        """
+        prefix = directory_path.rstrip(os.sep) + os.sep
+        boosted = 0
+        with self._cond:
+            for path, entry in self._pending.items():
+                if entry[0] <= priority:
+                    continue
+                parent = os.path.dirname(path)
+                if parent == directory_path or (recursive and parent.startswith(prefix)):
+                    entry[0] = priority
+                    heapq.heappush(self._heap, (priority, next(self._seq), path))
+                    boosted += 1
+            if boosted:
+                self._cond.notify_all()
+        return boosted
+
+    def pop_batch(self, max_items: int, timeout: Optional[float] = None) -> List[str]:
+        """按优先级取出最多max_items个文件，队列为空时最多等待timeout秒"""
+        with self._cond:
+            if not self._pending and not self._woken:
+                self._cond.wait(timeout)
+            self._woken = False
+
+            batch = []
+            while self._heap and len(batch) < max_items:
+                priority, _, path = heapq.heappop(self._heap)
+                entry = self._pending.get(path)
+                if entry is None or entry[0] != priority:
+                    continue  # 已被提升或已出队的旧条目
+                del self._pending[path]
+                self._in_flight[path] = entry[1]
+                batch.append(path)
+            return batch
+
+    def task_done(self, path: str, success: bool):
+        """标记文件处理完毕，通知相关的提交方"""
+        with self._cond:
+            tickets = self._in_flight.pop(path, [])
+        for ticket in tickets:
+            ticket._done(success)
+
+    def wake(self):
+        """唤醒正在等待出队的消费者"""
+        with self._cond:
+            self._woken = True
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取队列状态"""
+        with self._cond:
+            stats = {'pending': len(self._pending), 'in_flight': len(self._in_flight), 'high_priority': 0}
+            for priority, _ in self._pending.values():
+                if priority <= PRIORITY_HIGH:
+                    stats['high_priority'] += 1
+            return stats
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
@@ -259,7 +259,8 @@ class AlbumService:
             return {"success": False, "error": f"未知错误: {str(e)}"}
     
     def get_album_images(self, album_id: int, limit: int = 50, offset: int = 0,
-                        sort_by: str = "added_at", sort_order: str = "asc") -> Dict[str, Any]:
+                        sort_by: str = "added_at", sort_order: str = "asc",
+                        cursor: str = None) -> Dict[str, Any]:
         """获取相册中的图片
         
         Args:
@@ -268,6 +269,7 @@ class AlbumService:
             offset: 偏移量
             sort_by: 排序字段
             sort_order: 排序顺序
+            cursor: 上一页返回的next_cursor，传入时从该位置继续并忽略offset
             
         Returns:
             相册中的图片列表
@@ -286,19 +288,22 @@ class AlbumService:
             if sort_order.lower() not in ["asc", "desc"]:
                 sort_order = "asc"
             
-            images = self.album_manager.get_album_images(
-                album_id, limit, offset, sort_by, sort_order
+            page = self.album_manager.get_album_images_page(
+                album_id, limit, offset, sort_by, sort_order.lower(), cursor
             )
             
             total_count = self.album_manager.get_album_image_count(album_id)
             
             return {
                 "success": True,
-                "images": images,
+                "images": page["images"],
+                "next_cursor": page["next_cursor"],
                 "total": total_count,
                 "album_info": album
             }
             
+        except ValidationException as e:
+            return {"success": False, "error": str(e)}
         except DatabaseException as e:
             return {"success": False, "error": f"获取相册图片失败: {str(e)}"}
         except Exception as e:
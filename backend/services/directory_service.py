@@ -1,4 +1,5 @@
 """目录服务模块"""
+import logging
 import os
 import webview
 from typing import Dict, Any
@@ -6,6 +7,8 @@ from typing import Dict, Any
 from container import dependencies
 from exceptions import DatabaseException, ValidationException, format_error_response
 
+logger = logging.getLogger(__name__)
+
 class DirectoryService:
     def __init__(self):
         self.db_manager = dependencies.get_db_manager()
@@ -52,6 +55,9 @@ class DirectoryService:
             # 截取目录的最终名字作为名字
             dir_name = os.path.basename(directory_path)
             self.db_manager.save_directory(directory_path, dir_name)
+            
+            # 新添加的目录优先入库，无需等待下一轮全局扫描
+            self._boost_scan(directory_path)
             return {"success": True, "message": "目录添加成功", "path": directory_path}
             
         except ValidationException as e:
@@ -63,6 +69,14 @@ class DirectoryService:
                 details={"error": str(e)}
             ))
     
+    def _boost_scan(self, directory_path: str):
+        """请求后台扫描器优先入库整个目录树，失败不影响添加目录"""
+        try:
+            from background_scanner import background_scanner
+            background_scanner.boost_directory(directory_path, recursive=True)
+        except Exception as e:
+            logger.warning(f"请求优先扫描目录失败: {directory_path} - {str(e)}")
+    
     def remove_directory(self, directory_path: str) -> Dict[str, Any]:
         """删除指定的目录"""
         try:
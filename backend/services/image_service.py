@@ -1,21 +1,29 @@
 """图片服务模块"""
+import logging
 import os
 from typing import Dict, Any
 
 from container import dependencies
-from exceptions import DatabaseException, ValidationException, format_error_response
+from exceptions import DatabaseException, ImageProcessingException, ValidationException, format_error_response
+
+logger = logging.getLogger(__name__)
 
 class ImageService:
     def __init__(self):
         self.db_manager = dependencies.get_db_manager()
     
-    def get_all_images(self, limit: int = None, offset: int = 0) -> Dict[str, Any]:
-        """获取所有图片 - 支持分页"""
+    def get_all_images(self, limit: int = None, offset: int = 0, cursor: str = None) -> Dict[str, Any]:
+        """获取所有图片 - 支持分页，传入上一页的next_cursor时按游标续页"""
         try:
-            images = self.db_manager.get_all_images(limit=int(limit) if limit else None, offset=int(offset))
+            page = self.db_manager.query_images_page(
+                limit=int(limit) if limit else None, offset=int(offset), cursor=cursor or None
+            )
             total = self.db_manager.get_total_image_count()
             
-            return {"success": True, "images": images, "total": total, "offset": int(offset)}
+            return {"success": True, "images": page["images"], "next_cursor": page["next_cursor"],
+                    "total": total, "offset": int(offset)}
+        except ValidationException as e:
+            return format_error_response(e)
         except Exception as e:
             return format_error_response(DatabaseException(
                 operation="get_all_images",
@@ -23,8 +31,9 @@ class ImageService:
                 details={"error": str(e), "limit": limit, "offset": offset}
             ))
 
-    def get_images_in_directory(self, directory_path: str, limit: int = None, offset: int = 0) -> Dict[str, Any]:
-        """获取指定目录下的所有图片 - 支持分页"""
+    def get_images_in_directory(self, directory_path: str, limit: int = None, offset: int = 0,
+                                cursor: str = None) -> Dict[str, Any]:
+        """获取指定目录下的所有图片 - 支持分页，传入上一页的next_cursor时按游标续页"""
         try:
             if not directory_path:
                 raise ValidationException(
@@ -32,11 +41,17 @@ class ImageService:
                     message="目录路径不能为空",
                     details={"path": directory_path}
                 )
+            
+            # 用户正在浏览该目录，让其中尚未入库的文件优先处理
+            self._boost_scan(directory_path)
                 
-            images = self.db_manager.get_images_in_directory(directory_path, limit=limit, offset=offset)
+            page = self.db_manager.query_images_page(
+                directory_path=directory_path, limit=limit, offset=offset, cursor=cursor or None
+            )
             total = self.db_manager.get_image_count_in_directory(directory_path)
             
-            return {"success": True, "images": images, "total": total, "offset": int(offset)}
+            return {"success": True, "images": page["images"], "next_cursor": page["next_cursor"],
+                    "total": total, "offset": int(offset)}
         except ValidationException as e:
             return format_error_response(e)
         except Exception as e:
@@ -48,6 +63,14 @@ class ImageService:
     
 
     
+    def _boost_scan(self, directory_path: str):
+        """请求后台扫描器优先入库指定目录，失败不影响查询"""
+        try:
+            from background_scanner import background_scanner
+            background_scanner.boost_directory(directory_path)
+        except Exception as e:
+            logger.warning(f"请求优先扫描目录失败: {directory_path} - {str(e)}")
+    
     def delete_image(self, file_path: str) -> Dict[str, Any]:
         """删除图片记录"""
         try:
@@ -98,22 +121,18 @@ class ImageService:
             ))
     
     def get_photo_counts(self) -> Dict[str, Any]:
-        """获取各类照片计数"""
+        """获取各类照片计数，全部来自触发器维护的计数表，一次读取"""
         try:
-            # 获取所有图片总数
-            all_photos = self.db_manager.get_total_image_count()
-            
-            # 获取收藏图片数量
-            favorites = len(self.db_manager.get_favorite_images())
+            counters = self.db_manager.get_image_counters()
+            all_photos = counters["total"]
+            favorites = counters["favorites"]
             
             # 获取目录图片计数（当前目录，不包含子目录）
             directories = {}
             all_dirs = self.db_manager.get_directories()
             for dir_info in all_dirs:
                 dir_path = dir_info["path"]
-                # 使用单个目录计数，不包含子目录
-                count = self.db_manager.get_image_count_in_directory(dir_path)
-                directories[dir_path] = count
+                directories[dir_path] = counters["directories"].get(dir_path, 0)
             
             # TODO: 后续可以根据标签或EXIF数据获取分类计数
             travel = 0
@@ -126,6 +145,8 @@ class ImageService:
                 "all_photos": all_photos,
                 "favorites": favorites,
                 "directories": directories,
+                "ratings": counters["ratings"],
+                "albums": counters["albums"],
                 "travel": travel,
                 "food": food,
                 "birthday": birthday,
@@ -137,3 +158,19 @@ class ImageService:
                 message="获取照片计数失败",
                 details={"error": str(e)}
             ))
+    
+    def get_thumbnail_cache_stats(self) -> Dict[str, Any]:
+        """获取缩略图内存缓存和按需生成的统计（命中、未命中、淘汰等），用于性能监控"""
+        try:
+            from fastapi_server import thumbnail_cache, thumbnail_generator
+            return {
+                "success": True,
+                "cache": thumbnail_cache.get_stats(),
+                "generator": thumbnail_generator.get_stats()
+            }
+        except Exception as e:
+            return format_error_response(ImageProcessingException(
+                operation="get_thumbnail_cache_stats",
+                message="获取缩略图缓存统计失败",
+                details={"error": str(e)}
+            ))
@@ -0,0 +1,84 @@
+"""扫描服务模块"""
+from typing import Dict, Any
+
+from exceptions import ScanException, ValidationException, format_error_response
+
+class ScanService:
+    def __init__(self):
+        # 延迟导入，避免在仅使用数据库服务时创建扫描器
+        from background_scanner import background_scanner
+        self.scanner = background_scanner
+    
+    def start_full_scan(self) -> Dict[str, Any]:
+        """以后台任务方式启动全量扫描，立即返回任务ID"""
+        try:
+            job_id = self.scanner.start_full_scan_job()
+            return {"success": True, "job_id": job_id, "job": self.scanner.get_full_scan_job(job_id)}
+        except Exception as e:
+            return format_error_response(ScanException(
+                directory="*",
+                message="启动全量扫描失败",
+                details={"error": str(e)}
+            ))
+    
+    def get_scan_job_progress(self, job_id: str = None) -> Dict[str, Any]:
+        """获取扫描任务进度，未指定任务ID时返回最近的任务"""
+        try:
+            job = self.scanner.get_full_scan_job(job_id)
+            if job_id and not job:
+                raise ValidationException(
+                    field="job_id",
+                    message="扫描任务不存在",
+                    details={"job_id": job_id}
+                )
+            return {"success": True, "job": job}
+        except ValidationException as e:
+            return format_error_response(e)
+        except Exception as e:
+            return format_error_response(ScanException(
+                directory="*",
+                message="获取扫描进度失败",
+                details={"job_id": job_id, "error": str(e)}
+            ))
+    
+    def cancel_scan_job(self, job_id: str) -> Dict[str, Any]:
+        """取消扫描任务，检查点保留以便之后继续"""
+        try:
+            if not job_id:
+                raise ValidationException(field="job_id", message="任务ID不能为空")
+            if not self.scanner.cancel_full_scan_job(job_id):
+                raise ValidationException(
+                    field="job_id",
+                    message="扫描任务不存在或未在运行",
+                    details={"job_id": job_id}
+                )
+            return {"success": True, "message": "扫描任务已取消"}
+        except ValidationException as e:
+            return format_error_response(e)
+        except Exception as e:
+            return format_error_response(ScanException(
+                directory="*",
+                message="取消扫描任务失败",
+                details={"job_id": job_id, "error": str(e)}
+            ))
+    
+    def resume_scan_job(self, job_id: str) -> Dict[str, Any]:
+        """从检查点继续扫描任务"""
+        try:
+            if not job_id:
+                raise ValidationException(field="job_id", message="任务ID不能为空")
+            if not self.scanner.resume_full_scan_job(job_id):
+                raise ValidationException(
+                    field="job_id",
+                    message="扫描任务不存在、已完成或有其他任务正在运行",
+                    details={"job_id": job_id}
+                )
+            return {"success": True, "job_id": job_id, "job": self.scanner.get_full_scan_job(job_id)}
+        except ValidationException as e:
+            return format_error_response(e)
+        except Exception as e:
+            return format_error_response(ScanException(
+                directory="*",
+                message="继续扫描任务失败",
+                details={"job_id": job_id, "error": str(e)}
+            ))
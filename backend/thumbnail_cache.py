@@ -0,0 +1,123 @@
+"""
+缩略图内存缓存 - 按字节预算淘汰的LRU缓存，网格滚动时热点缩略图不再反复查库读文件
+
+缓存的失效由数据库管理器在缩略图被替换或删除后回调invalidate完成；
+查库期间发生的失效通过版本号识别，过期的结果不会写回缓存。
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+# 默认缓存预算（字节），可通过app_settings中的thumbnail_cache_bytes覆盖
+DEFAULT_THUMBNAIL_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ThumbnailCache:
+    """按字节预算淘汰的缩略图LRU缓存，线程安全
+    
+    键为 (image_id, 请求尺寸)，值为get_thumbnail_variant返回的缩略图记录（数据、实际边长、版本号等）。
+    """
+    
+    def __init__(self, max_bytes: int = DEFAULT_THUMBNAIL_CACHE_BYTES):
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries: "OrderedDict[Tuple[int, Hashable], Dict[str, Any]]" = OrderedDict()
+        self._keys_by_image: Dict[int, Set[Tuple[int, Hashable]]] = {}
+        self._bytes = 0
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+    
+    @property
+    def epoch(self) -> int:
+        """失效版本号，查库前记下，写回时传给put"""
+        return self._epoch
+    
+    def get(self, image_id: int, size) -> Optional[Dict[str, Any]]:
+        """读取缓存，命中时返回缩略图记录并移到最近使用端"""
+        key = (image_id, size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+    
+    def put(self, image_id: int, size, variant: Dict[str, Any], epoch: int = None) -> bool:
+        """写入缓存
+        
+        Args:
+            epoch: 查库前读取的版本号，期间发生过失效时放弃写入，避免旧数据回到缓存
+        
+        Returns:
+            是否写入
+        """
+        length = len(variant['data'])
+        key = (image_id, size)
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return False
+            if length > self.max_bytes:
+                return False
+            
+            self._remove(key)
+            self._entries[key] = variant
+            self._keys_by_image.setdefault(image_id, set()).add(key)
+            self._bytes += length
+            self._evict()
+            return True
+    
+    def invalidate(self, image_ids: Iterable[int]):
+        """移除图片的全部缓存尺寸，数据库管理器在缩略图变化后回调"""
+        with self._lock:
+            self._epoch += 1
+            for image_id in image_ids:
+                keys = self._keys_by_image.pop(image_id, None)
+                if not keys:
+                    continue
+                for key in keys:
+                    self._bytes -= len(self._entries.pop(key)['data'])
+                self.stats['invalidations'] += len(keys)
+    
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._keys_by_image.clear()
+            self._bytes = 0
+    
+    def resize(self, max_bytes: int):
+        """调整字节预算，缩小时立即淘汰超出部分"""
+        with self._lock:
+            self.max_bytes = max(0, int(max_bytes))
+            self._evict()
+    
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry['data'])
+        keys = self._keys_by_image.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_image[key[0]]
+    
+    def _evict(self):
+        """从最久未使用端淘汰，直到总字节数回到预算内"""
+        while self._bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.stats['evictions'] += 1
+    
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,124 @@
+"""
+按需缩略图生成 - 请求到缺失的缩略图或显示预览图时现场生成并入库
+
+同一张图片的并发请求共享一次生成（single-flight），生成在有界线程池中执行，
+不占用FastAPI的事件循环；生成失败的图片在一段时间内不再重试，避免损坏文件被反复解码。
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional
+
+from image_utils import ImageProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class ThumbnailGenerator:
+    """缩略图按需生成器"""
+    
+    def __init__(self, db_manager, max_workers: int = None, retry_after: float = 60.0):
+        """初始化生成器
+        
+        Args:
+            db_manager: 数据库管理器
+            max_workers: 生成线程数，默认不超过4，避免与后台扫描争抢CPU
+            retry_after: 生成失败后多少秒内不再重试
+        """
+        self.db_manager = db_manager
+        self.max_workers = max_workers or max(1, min(4, os.cpu_count() or 1))
+        self.retry_after = retry_after
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._failed: Dict[Hashable, float] = {}
+        self.stats = {'generated': 0, 'previews': 0, 'failed': 0, 'deduplicated': 0}
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='thumbnail')
+        return self._executor
+    
+    def submit(self, image_id: int) -> Optional[Future]:
+        """提交一张图片的缩略图生成，已在生成中的直接返回同一个Future
+        
+        Returns:
+            结果为bool（是否生成成功）的Future；近期失败过的图片返回None
+        """
+        return self._submit(image_id, self._generate, image_id, 'generated')
+    
+    def submit_preview(self, image_id: int) -> Optional[Future]:
+        """提交一张图片的显示预览图生成，与缩略图生成共用线程池，按图片单独去重"""
+        return self._submit(('preview', image_id), self._generate_preview, image_id, 'previews')
+    
+    def _submit(self, key: Hashable, func: Callable[[int], bool], image_id: int, counter: str) -> Optional[Future]:
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats['deduplicated'] += 1
+                return future
+            
+            failed_at = self._failed.get(key)
+            if failed_at is not None:
+                if time.monotonic() - failed_at < self.retry_after:
+                    return None
+                del self._failed[key]
+            
+            future = self._get_executor().submit(func, image_id)
+            self._in_flight[key] = future
+        
+        # 回调可能在当前线程同步执行，必须在释放锁之后注册
+        future.add_done_callback(lambda done: self._finish(key, done, counter))
+        return future
+    
+    def _finish(self, key: Hashable, future: Future, counter: str):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            # 被取消的任务（关闭线程池时丢弃）不说明图片有问题，不记为失败，下次请求照常生成
+            if future.cancelled():
+                return
+            success = future.exception() is None and future.result()
+            if success:
+                self.stats[counter] += 1
+            else:
+                self.stats['failed'] += 1
+                self._failed[key] = time.monotonic()
+    
+    def _generate(self, image_id: int) -> bool:
+        """在线程池中执行：读取原图、生成各级缩略图并写入当前存储后端"""
+        image = self.db_manager.get_image_by_id(image_id)
+        if not image or not image.get('file_path'):
+            return False
+        
+        thumbnails = ImageProcessor.generate_thumbnails(image['file_path'])
+        if not thumbnails:
+            logger.warning(f"按需生成缩略图失败: {image['file_path']}")
+            return False
+        return self.db_manager.save_thumbnails(image_id, thumbnails)
+    
+    def _generate_preview(self, image_id: int) -> bool:
+        """在线程池中执行：按原图生成显示预览图，文件名使用当前的缩略图版本号"""
+        image = self.db_manager.get_image_by_id(image_id)
+        if not image or not image.get('file_path'):
+            return False
+        
+        preview = ImageProcessor.generate_preview(image['file_path'])
+        if not preview:
+            logger.warning(f"生成预览图失败: {image['file_path']}")
+            return False
+        self.db_manager.save_preview(image_id, image['thumbnail_version'], preview)
+        return True
+    
+    def shutdown(self):
+        """停止线程池，丢弃尚未开始的任务"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, 'in_flight': len(self._in_flight), 'max_workers': self.max_workers}
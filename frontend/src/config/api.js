@@ -1,8 +1,105 @@
 const API_BASE = 'http://localhost:8324/api'
 
 export const API_URLS = {
-  thumbnail: (id) => `${API_BASE}/thumbnail/${id}`,
+  thumbnailBatch: `${API_BASE}/thumbnails/batch`,
+  // version 为图片记录中的 thumbnail_version，带上后缩略图响应可被浏览器长期缓存
+  thumbnail: (id, size, version) => {
+    const params = new URLSearchParams()
+    if (size) params.set('size', size)
+    if (version !== undefined && version !== null) params.set('v', version)
+    const query = params.toString()
+    return query ? `${API_BASE}/thumbnail/${id}?${query}` : `${API_BASE}/thumbnail/${id}`
+  },
   image: (id) => `${API_BASE}/image/${id}`,
+  // 查看器使用的显示预览图（长边2048），需要原图时再用 image
+  preview: (id, version) => version !== undefined && version !== null
+    ? `${API_BASE}/preview/${id}?v=${version}`
+    : `${API_BASE}/preview/${id}`,
   imagePath: (path) => `${API_BASE}/image/path?file_path=${encodeURIComponent(path)}`,
   imageDetails: (id) => `${API_BASE}/image/details/${id}`
-}
\ No newline at end of file
+}
+
+// 后端缩略图金字塔的各级边长（与 backend/image_utils.py 中的 THUMBNAIL_SIZES 一致）
+export const THUMBNAIL_SIZES = [128, 256, 512, 1024]
+
+// 按网格的显示尺寸挑选缩略图级别：网格列会被拉伸到约1.5倍，高分屏再乘以设备像素比
+export const pickThumbnailSize = (displaySize) => {
+  const needed = displaySize * 1.5 * (window.devicePixelRatio || 1)
+  return THUMBNAIL_SIZES.find(size => size >= needed) || THUMBNAIL_SIZES[THUMBNAIL_SIZES.length - 1]
+}
+
+// 单次批量请求的最大图片数（与后端 MAX_THUMBNAIL_BATCH 一致）
+export const THUMBNAIL_BATCH_LIMIT = 500
+
+// 批量取回的缩略图 blob URL，按 id:尺寸:版本号 缓存并跨页面复用。
+// blob URL 用不上带版本号缩略图的HTTP长期缓存，不缓存的话每次回到同一页都要重新下载整批
+const THUMBNAIL_URL_CACHE_LIMIT = 2000
+const thumbnailUrlCache = new Map()
+
+const thumbnailCacheKey = (id, size, version) => `${id}:${size}:${version ?? ''}`
+
+const getCachedThumbnailUrl = (key) => {
+  const url = thumbnailUrlCache.get(key)
+  if (url) {
+    // Map按插入顺序迭代，重新插入即移到最近使用的一端
+    thumbnailUrlCache.delete(key)
+    thumbnailUrlCache.set(key, url)
+  }
+  return url
+}
+
+const cacheThumbnailUrl = (key, blob) => {
+  const url = URL.createObjectURL(blob)
+  thumbnailUrlCache.set(key, url)
+  while (thumbnailUrlCache.size > THUMBNAIL_URL_CACHE_LIMIT) {
+    const [oldestKey, oldestUrl] = thumbnailUrlCache.entries().next().value
+    thumbnailUrlCache.delete(oldestKey)
+    URL.revokeObjectURL(oldestUrl)
+  }
+  return url
+}
+
+// 批量获取缩略图，images 为带 id 和 thumbnail_version 的图片记录，返回 Map<id, blob URL>
+// 响应按请求顺序排列，每项为4字节大端长度加JPEG数据，长度为0表示缺失。
+// 缺失的图片和只拿到较小回退级别的图片（X-Thumbnail-Incomplete）不在结果中，调用方对它们使用单张接口，
+// 由单张接口等待补生成后返回合适的尺寸，并可按版本号被浏览器长期缓存
+export const fetchThumbnailBatch = async (images, size) => {
+  const result = new Map()
+  const uncached = []
+  for (const image of images) {
+    const url = getCachedThumbnailUrl(thumbnailCacheKey(image.id, size, image.thumbnail_version))
+    if (url) {
+      result.set(image.id, url)
+    } else {
+      uncached.push(image)
+    }
+  }
+  
+  for (let start = 0; start < uncached.length; start += THUMBNAIL_BATCH_LIMIT) {
+    const chunk = uncached.slice(start, start + THUMBNAIL_BATCH_LIMIT)
+    const response = await fetch(API_URLS.thumbnailBatch, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ids: chunk.map(image => image.id), size })
+    })
+    if (!response.ok) {
+      throw new Error(`批量获取缩略图失败: ${response.status}`)
+    }
+    const incomplete = new Set(
+      (response.headers.get('X-Thumbnail-Incomplete') || '').split(',').filter(Boolean).map(Number)
+    )
+    const buffer = await response.arrayBuffer()
+    const view = new DataView(buffer)
+    let offset = 0
+    for (const image of chunk) {
+      const length = view.getUint32(offset)
+      offset += 4
+      if (length > 0 && !incomplete.has(image.id)) {
+        const blob = new Blob([buffer.slice(offset, offset + length)], { type: 'image/jpeg' })
+        result.set(image.id, cacheThumbnailUrl(thumbnailCacheKey(image.id, size, image.thumbnail_version), blob))
+      }
+      offset += length
+    }
+  }
+  return result
+}